@@ -0,0 +1,349 @@
+"""
+Ridership anomaly detection for the CTA L analysis app.
+
+Flags station days whose ridership collapses or spikes: outages, events
+and data-feed errors. A station's days of one Type_of_Day form a series,
+and each day is scored against the window days of the same series
+before it:
+
+    score = (riders - median) / max(1.4826 * MAD, minSpread * median + 1)
+
+where median and MAD (median absolute deviation) are those of the window.
+1.4826 * MAD estimates the standard deviation of normal data, so the
+score reads like a z-score that a few earlier outliers cannot skew; the
+floor keeps a very steady series from flagging ordinary wobble. Days
+with |score| >= threshold are stored in the Anomalies table as a 'drop'
+or a 'spike'. The first window days of a series have no full window and
+are not scored.
+
+A full scan reads Ridership once and computes the rolling statistics
+with NumPy over whole arrays of windows. An incremental scan rescores
+each series from its earliest row appended since the last scan (by
+rowid) on, reading just the window days before it, and gives the same
+flags as a full scan would. Usually that is only the new rows; a
+backfilled older day also rescores the later days whose windows it
+falls in. ingest.py runs it after loading new data
+once the table exists. If rows were updated or deleted, or the window or
+threshold changed, the scan starts over.
+
+    python anomalies.py                     # incremental; full the first time
+    python anomalies.py --full --window 28 --threshold 6
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import database
+import indexes
+import rollups
+import timeseries
+
+# Earlier days of the same series each day is scored against
+defaultWindow = 28
+
+# |score| from which a day is flagged
+defaultThreshold = 5.0
+
+# Fraction of the median the spread is never taken to be below
+minSpread = 0.05
+
+# Scales the MAD to the standard deviation of normally distributed data
+madScale = 1.4826
+
+# Days scored per block of windows, bounding the memory of a scan
+scoreChunk = 65536
+
+createAnomalies_SQL = """
+                      CREATE TABLE IF NOT EXISTS Anomalies (
+                          Station_ID INTEGER NOT NULL,
+                          Ride_Date TEXT NOT NULL,
+                          Type_of_Day TEXT NOT NULL,
+                          Num_Riders INTEGER NOT NULL,
+                          Expected REAL NOT NULL,
+                          Spread REAL NOT NULL,
+                          Score REAL NOT NULL,
+                          Kind TEXT NOT NULL,
+                          PRIMARY KEY (Station_ID, Ride_Date)
+                      )
+                      """
+
+# Records the Ridership fingerprint and the settings Anomalies reflects
+createAnomalyState_SQL = """
+                         CREATE TABLE IF NOT EXISTS AnomalyState (
+                             Name TEXT PRIMARY KEY,
+                             Num_Rows INTEGER NOT NULL,
+                             Max_Row INTEGER NOT NULL,
+                             Rewrites INTEGER NOT NULL,
+                             Window INTEGER NOT NULL,
+                             Threshold REAL NOT NULL
+                         )
+                         """
+
+# Series (station and day type) with rows past a rowid, and the rows an
+# incremental scan reads: from the window-th earlier day of each series on.
+# NOT INDEXED keeps the new rows a rowid range rather than a walk of the
+# day type index, and MATERIALIZED looks each series' start up once
+# instead of once per row joined against it.
+incrementalRows_SQL = f"""
+                      WITH NewSeries AS (
+                          SELECT Station_ID, Type_of_Day, MIN(Ride_Date) AS First_Date
+                          FROM Ridership NOT INDEXED WHERE rowid > ?
+                          GROUP BY Station_ID, Type_of_Day
+                      ),
+                      Bounds AS MATERIALIZED (
+                          SELECT Station_ID, Type_of_Day, IFNULL(
+                              (SELECT Ride_Date FROM Ridership AS Earlier
+                               WHERE Earlier.Station_ID = NewSeries.Station_ID
+                               AND Earlier.Ride_Date < NewSeries.First_Date
+                               AND Earlier.Type_of_Day = NewSeries.Type_of_Day
+                               ORDER BY Earlier.Ride_Date DESC
+                               LIMIT 1 OFFSET ?), '') AS Start_Date
+                          FROM NewSeries
+                      )
+                      SELECT {timeseries.seriesColumns_SQL}
+                      FROM Bounds JOIN Ridership
+                      ON Ridership.Station_ID = Bounds.Station_ID
+                      AND Ridership.Ride_Date >= Bounds.Start_Date
+                      AND Ridership.Type_of_Day = Bounds.Type_of_Day
+                      """
+
+
+class ScanReport:
+    """
+    What an anomaly scan did, and how fast.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.rowsRead = 0
+        self.rowsScored = 0
+        self.flagged = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        if self.mode == "current":
+            return "Anomalies are up to date"
+        return (
+            f"{self.mode} scan: {self.rowsRead:,} rows read, {self.rowsScored:,} scored, "
+            f"{self.flagged:,} flagged in {self.seconds:.2f} s"
+        )
+
+
+def _rowMedians(block) -> np.ndarray:
+    """
+    Median of each row of a 2-D array; partitioning around the middle
+    one or two columns is quicker than np.median's general path.
+    """
+
+    width = block.shape[1]
+    middle = sorted({(width - 1) // 2, width // 2})
+    parted = np.partition(block, middle, axis=1)
+    return parted[:, middle].mean(axis=1)
+
+
+def rollingMedianMad(values, seriesStarts, window):
+    """
+    Median and MAD of the window values before each value of its series.
+
+    Args:
+    values (np.ndarray): Values of consecutive series, each in date order.
+    seriesStarts (np.ndarray): Index of the first value of each value's series.
+    window (int): Earlier values each window holds.
+
+    Returns:
+    tuple: (indexes of the values with a full window, their medians,
+    their MADs).
+    """
+
+    positions = np.arange(len(values))
+    scored = positions[positions - seriesStarts >= window]
+    medians = np.empty(len(scored))
+    mads = np.empty(len(scored))
+    if not len(scored):
+        return scored, medians, mads
+
+    # windows[i] holds values[i : i + window], the window of value i + window
+    windows = np.lib.stride_tricks.sliding_window_view(values.astype(np.float64), window)
+    for first in range(0, len(scored), scoreChunk):
+        block = windows[scored[first:first + scoreChunk] - window]
+        blockMedians = _rowMedians(block)
+        medians[first:first + scoreChunk] = blockMedians
+        mads[first:first + scoreChunk] = _rowMedians(np.abs(block - blockMedians[:, None]))
+
+    return scored, medians, mads
+
+
+def scoreRows(data, window, threshold, afterRow=0) -> tuple:
+    """
+    Score sorted rows and return the flagged ones.
+
+    Args:
+    data (np.ndarray): Rows from timeseries.readSeriesRows().
+    window (int): Earlier days each day is scored against.
+    threshold (float): |score| from which a day is flagged.
+    afterRow (int): Only keep the rows of a series from its first row
+                    with a larger rowid on, by date.
+
+    Returns:
+    tuple: (number of rows scored, Anomalies rows of the flagged days).
+    """
+
+    if not len(data):
+        return 0, []
+
+    boundaries = timeseries.seriesBoundaries(data)
+    seriesStarts = np.maximum.accumulate(np.where(boundaries, np.arange(len(data)), 0))
+
+    scored, medians, mads = rollingMedianMad(data[:, 4], seriesStarts, window)
+    # Days on or after a series' first appended day; for rows appended in
+    # date order these are just the new rows
+    series = np.cumsum(boundaries) - 1
+    appended = data[:, 0] > afterRow
+    firstDays = np.full(series[-1] + 1, np.iinfo(np.int64).max)
+    np.minimum.at(firstDays, series[appended], data[appended, 3])
+    keep = data[scored, 3] >= firstDays[series[scored]]
+    scored, medians, mads = scored[keep], medians[keep], mads[keep]
+
+    spreads = np.maximum(madScale * mads, minSpread * medians + 1)
+    scores = (data[scored, 4] - medians) / spreads
+    flagged = np.abs(scores) >= threshold
+
+    rows = data[scored[flagged]]
+    dates = np.datetime_as_string(rows[:, 3].astype("datetime64[D]")).tolist()
+    return len(scored), [
+        (stationId, date, chr(dayType), riders, expected, spread, score, "spike" if score > 0 else "drop")
+        for (stationId, dayType, riders), date, expected, spread, score in zip(
+            rows[:, [1, 2, 4]].tolist(),
+            dates,
+            medians[flagged].tolist(),
+            spreads[flagged].tolist(),
+            np.round(scores[flagged], 3).tolist(),
+        )
+    ]
+
+
+def scan(dbConn, full=False, window=defaultWindow, threshold=defaultThreshold) -> ScanReport:
+    """
+    Bring the Anomalies table up to date with Ridership.
+
+    Args:
+    dbConn (sqlite3.Connection): Writable connection to the ridership database.
+    full (bool): Rescore every day, even if an incremental scan would do.
+    window (int): Earlier days of the same station and day type each day
+                  is scored against.
+    threshold (float): |score| from which a day is flagged.
+
+    Returns:
+    ScanReport: Mode ("full", "incremental" or "current"), counts and timing.
+
+    Raises:
+    ValueError: If the connection is read-only, or window is below 2.
+    """
+
+    if database.isReadOnly(dbConn):
+        raise ValueError("cannot scan for anomalies through a read-only connection")
+    if window < 2:
+        raise ValueError(f"window must be at least 2 days, not {window}")
+
+    started = time.perf_counter()
+
+    # Incremental scans look back along (Station_ID, Ride_Date)
+    indexes.ensureIndexes(dbConn)
+    if not dbConn.in_transaction:
+        rollups.ensureRewriteTracking(dbConn)
+
+    dbCursor = dbConn.cursor()
+    if not dbConn.in_transaction:
+        dbCursor.execute("BEGIN IMMEDIATE;")
+    try:
+        dbCursor.execute(createAnomalies_SQL)
+
+        # State saved before rewrites were counted cannot be trusted
+        dbCursor.execute("PRAGMA table_info(AnomalyState);")
+        if "Rewrites" not in [column[1] for column in dbCursor.fetchall()]:
+            dbCursor.execute("DROP TABLE IF EXISTS AnomalyState;")
+        dbCursor.execute(createAnomalyState_SQL)
+
+        version = rollups.ridershipVersion(dbCursor)
+        dbCursor.execute(
+            "SELECT Num_Rows, Max_Row, Rewrites, Window, Threshold FROM AnomalyState WHERE Name = 'Ridership';"
+        )
+        state = dbCursor.fetchone()
+
+        mode = "full"
+        if not full and state is not None and tuple(state[2:]) == (version[2], window, threshold):
+            if version == tuple(state[:3]):
+                mode = "current"
+            else:
+                # Only appended rows can be scored alone; a deleted or
+                # updated row shifts the windows of the days after it
+                dbCursor.execute("SELECT COUNT(*) FROM Ridership WHERE rowid > ?;", [state[1]])
+                if state[0] + dbCursor.fetchone()[0] == version[0]:
+                    mode = "incremental"
+
+        report = ScanReport(mode)
+        if mode == "full":
+            data = timeseries.readSeriesRows(dbCursor, f"SELECT {timeseries.seriesColumns_SQL} FROM Ridership")
+            report.rowsScored, flagged = scoreRows(data, window, threshold)
+            dbCursor.execute("DELETE FROM Anomalies;")
+        elif mode == "incremental":
+            data = timeseries.readSeriesRows(dbCursor, incrementalRows_SQL, [state[1], window - 1])
+            report.rowsScored, flagged = scoreRows(data, window, threshold, state[1])
+            # The rescored days lose their old flags; a backfilled day can
+            # change the windows of later days enough to clear them
+            appended = data[data[:, 0] > state[1]]
+            firsts = appended[timeseries.seriesBoundaries(appended)]
+            dbCursor.executemany(
+                "DELETE FROM Anomalies WHERE Station_ID = ? AND Type_of_Day = ? AND Ride_Date >= ?;",
+                [
+                    (stationId, chr(dayType), date)
+                    for (stationId, dayType), date in zip(
+                        firsts[:, [1, 2]].tolist(),
+                        np.datetime_as_string(firsts[:, 3].astype("datetime64[D]")).tolist(),
+                    )
+                ],
+            )
+        else:
+            data, flagged = (), []
+
+        report.rowsRead = len(data)
+        report.flagged = len(flagged)
+        dbCursor.executemany("INSERT OR REPLACE INTO Anomalies VALUES (?, ?, ?, ?, ?, ?, ?, ?);", flagged)
+        dbCursor.execute(
+            "INSERT OR REPLACE INTO AnomalyState VALUES ('Ridership', ?, ?, ?, ?, ?);",
+            [*version, window, threshold],
+        )
+        dbConn.commit()
+    except BaseException:
+        dbConn.rollback()
+        raise
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag station days with unusual ridership.")
+    parser.add_argument("--full", action="store_true", help="rescore every day")
+    parser.add_argument(
+        "--window", type=int, default=defaultWindow, help=f"earlier days scored against (default: {defaultWindow})"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=defaultThreshold, help=f"score to flag from (default: {defaultThreshold})"
+    )
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    try:
+        print(scan(database.getConnection(), args.full, args.window, args.threshold))
+    except ValueError as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Query benchmark for the CTA L analysis app.
+
+Times every public function in functions.py against synthetic databases
+(see syntheticdb.py) of several sizes, and saves the results as JSON so
+runs can be compared, e.g. before and after a change:
+
+    python benchmarks/queries.py --scale 150x25 --scale 1500x25
+    python benchmarks/queries.py --compare benchmarks/results/run-20240101-120000.json
+
+A scale is STATIONSxYEARS. The databases are generated once into
+--data-dir and reused. Each scale runs in a fresh interpreter, so every
+function's first call is cold (lazy imports, catalog and index loading);
+it is then called --repeat more times. The result cache is switched off
+unless --cache is given, so the repeats time the queries themselves.
+"""
+
+import argparse
+import datetime
+import inspect
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+appDir = os.path.dirname(benchDir)
+
+defaultScales = ["150x25", "1500x25"]
+
+# Where the downtown searches are centred (the Loop)
+loopLatitude = 41.8781
+loopLongitude = -87.6298
+
+
+def parseScale(scale) -> tuple:
+    """
+    Split a 'STATIONSxYEARS' scale into (stations, years).
+
+    Raises:
+    ValueError: If the scale is not two positive whole numbers.
+    """
+
+    stations, _, years = scale.lower().partition("x")
+    if not (stations.isdigit() and years.isdigit() and int(stations) > 0 and int(years) > 0):
+        raise ValueError(f"scale must look like 150x25, not {scale!r}")
+    return int(stations), int(years)
+
+
+def databaseFor(scale, dataDir, seed) -> str:
+    """
+    Path of the synthetic database of a scale, generating it if missing.
+    """
+
+    import syntheticdb
+
+    stations, years = parseScale(scale)
+    path = os.path.join(dataDir, f"synthetic-{stations}x{years}-seed{seed}.db")
+    if not os.path.exists(path):
+        os.makedirs(dataDir, exist_ok=True)
+        print(f"Generating {path} ...", file=sys.stderr)
+        syntheticdb.generate(path, stations, years, seed=seed)
+    return path
+
+
+def benchmarkCalls(functions, stationNames, year):
+    """
+    The call to time for each public function in functions.py.
+
+    Args:
+    functions (module): The functions module.
+    stationNames (list): Two station names with ridership.
+    year (str): A year with ridership.
+
+    Returns:
+    dict: Function name to a function of no arguments that calls it.
+    """
+
+    first, second = stationNames
+    start, end = f"{year}-01-01", f"{int(year) + 1}-01-01"
+
+    return {
+        "getConnection": lambda: functions.getConnection(),
+        "generalStats": lambda: functions.generalStats(),
+        "findStations": lambda: functions.findStations("%a%"),
+        "iterFindStations": lambda: sum(1 for _ in functions.iterFindStations("%a%")),
+        "columnStore": lambda: functions.columnStore(functions.getConnection()),
+        "resolveStation": lambda: functions.resolveStation(first),
+        "dayTypeBreakdown": lambda: functions.dayTypeBreakdown(),
+        "findPercentageRiders": lambda: functions.findPercentageRiders(first),
+        "stationRidershipWeekdays": lambda: functions.stationRidershipWeekdays(),
+        "iterStationRidershipWeekdays": lambda: sum(1 for _ in functions.iterStationRidershipWeekdays()),
+        "checkIfLineExists": lambda: functions.checkIfLineExists("Red"),
+        "lineStops": lambda: functions.lineStops("Red", "N"),
+        "iterLineStops": lambda: sum(1 for _ in functions.iterLineStops("Red", "N")),
+        "numStopsEachLine": lambda: functions.numStopsEachLine(),
+        "lineRidership": lambda: functions.lineRidership(year),
+        "lineYearlyRidership": lambda: functions.lineYearlyRidership("Red"),
+        "lineMonthlyRidership": lambda: functions.lineMonthlyRidership("Red", year),
+        "totalRidershipYear": lambda: functions.totalRidershipYear(first),
+        "monthlyRidership": lambda: functions.monthlyRidership(first, year),
+        "lineStationIds": lambda: functions.lineStationIds("Red"),
+        "ridershipTrend": lambda: functions.ridershipTrend(start, end, "weekly", station=first),
+        "ridershipAnomalies": lambda: functions.ridershipAnomalies(start=start, end=end),
+        "forecastRidership": lambda: functions.forecastRidership(first, 28),
+        "ridershipPanel": lambda: functions.ridershipPanel([first, second], start, end),
+        "dailyRidership": lambda: functions.dailyRidership(first, year),
+        "compareRidership": lambda: functions.compareRidership(first, second, year),
+        "stationNameMatches": lambda: functions.stationNameMatches("%a%"),
+        "checkIfStationExists": lambda: functions.checkIfStationExists(first),
+        "findNearbyStations": lambda: functions.findNearbyStations(loopLatitude, loopLongitude),
+        "findNearestStations": lambda: functions.findNearestStations(loopLatitude, loopLongitude, 5),
+    }
+
+
+def runScale(dbPath, repeat) -> dict:
+    """
+    Time every public function in functions.py against one database.
+    Runs in the child interpreter of its scale.
+
+    Args:
+    dbPath (str): The database.
+    repeat (int): Timed calls after the first, cold one.
+
+    Returns:
+    dict: rows, setupMs, functions (name to firstMs, medianMs, minMs,
+          maxMs) and untimed (public functions with no benchmark call).
+    """
+
+    sys.path.insert(0, appDir)
+    import database
+
+    database.configure(path=dbPath, column_store="")
+
+    import functions
+    import rollups
+
+    # Index and rollup creation, paid once per database
+    started = time.perf_counter()
+    dbConn = functions.getConnection()
+    rollups.ensureLineRollups(dbConn)
+    setupMs = (time.perf_counter() - started) * 1000
+
+    numRows = dbConn.execute("SELECT COUNT(*) FROM Ridership;").fetchone()[0]
+    # Two stations that report from the first year, and a year mid-range
+    firstYear, lastYear = dbConn.execute(
+        "SELECT MIN(Year), MAX(Year) FROM RidershipRollup;"
+    ).fetchone()
+    stationNames = [
+        row[0]
+        for row in dbConn.execute(
+            """
+            SELECT Station_Name FROM Stations
+            JOIN RidershipRollup ON RidershipRollup.Station_ID = Stations.Station_ID
+            WHERE Year = ?
+            GROUP BY Station_Name HAVING COUNT(DISTINCT Stations.Station_ID) = 1
+            ORDER BY Station_Name LIMIT 2
+            """,
+            [firstYear],
+        )
+    ]
+    year = str((firstYear + lastYear) // 2)
+
+    calls = benchmarkCalls(functions, stationNames, year)
+    public = [
+        name
+        for name, value in inspect.getmembers(functions, inspect.isfunction)
+        if not name.startswith("_") and getattr(value, "__module__", None) == functions.__name__
+    ]
+
+    timings = {}
+    for name in public:
+        call = calls.get(name)
+        if call is None:
+            continue
+
+        times = []
+        for _ in range(repeat + 1):
+            started = time.perf_counter()
+            call()
+            times.append((time.perf_counter() - started) * 1000)
+
+        repeats = times[1:] or times
+        timings[name] = {
+            "firstMs": round(times[0], 3),
+            "medianMs": round(statistics.median(repeats), 3),
+            "minMs": round(min(repeats), 3),
+            "maxMs": round(max(repeats), 3),
+        }
+
+    return {
+        "rows": numRows,
+        "setupMs": round(setupMs, 1),
+        "functions": timings,
+        "untimed": sorted(set(public) - set(calls)),
+    }
+
+
+def gitCommit():
+    """
+    Short hash of the checked-out commit, or None outside a git checkout.
+    """
+
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=appDir, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def runBenchmark(scales, dataDir, repeat, seed=0, useCache=False) -> dict:
+    """
+    Benchmark each scale in its own interpreter.
+
+    Returns:
+    dict: Run details (date, commit, python, sqlite, platform, repeat,
+          cache) and scales: scale to the runScale() results plus
+          stations, years and dbBytes.
+    """
+
+    env = dict(os.environ)
+    if not useCache:
+        env["CTA_CACHE_SIZE"] = "0"
+    # Only the code under test should change between runs
+    env.pop("CTA_TRACE", None)
+
+    run = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "cache": useCache,
+        "scales": {},
+    }
+
+    for scale in scales:
+        stations, years = parseScale(scale)
+        dbPath = databaseFor(scale, dataDir, seed)
+        print(f"Benchmarking {scale} ...", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-one", dbPath, "--repeat", str(repeat)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        result = json.loads(proc.stdout)
+        result.update(stations=stations, years=years, dbBytes=os.path.getsize(dbPath))
+        run["scales"][scale] = result
+
+    return run
+
+
+def printRun(run, previous=None):
+    """
+    Print each scale's timings, with the change from a previous run's
+    median where it has the same function at the same scale.
+    """
+
+    for scale, result in run["scales"].items():
+        print(f"\n{scale}: {result['rows']:,} rows, setup {result['setupMs']:,.1f} ms")
+        before = (previous or {}).get("scales", {}).get(scale, {}).get("functions", {})
+
+        header = f"  {'function':<30} {'first':>10} {'median':>10} {'min':>10}"
+        print(header + (f" {'previous':>10} {'change':>8}" if before else ""))
+        for name, timing in result["functions"].items():
+            line = (
+                f"  {name:<30} {timing['firstMs']:10.3f} "
+                f"{timing['medianMs']:10.3f} {timing['minMs']:10.3f}"
+            )
+            if name in before:
+                old = before[name]["medianMs"]
+                change = f"{(timing['medianMs'] / old - 1) * 100:+7.1f}%" if old else "    n/a"
+                line += f" {old:10.3f} {change}"
+            print(line)
+
+        if result["untimed"]:
+            print("  not timed (no benchmark call):", ", ".join(result["untimed"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scale",
+        action="append",
+        help=f"STATIONSxYEARS to benchmark, repeatable (default: {' '.join(defaultScales)})",
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="timed calls per function after the first")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic databases")
+    parser.add_argument("--cache", action="store_true", help="leave the result cache on")
+    parser.add_argument(
+        "--data-dir", default=os.path.join(benchDir, "data"), help="where the synthetic databases are kept"
+    )
+    parser.add_argument("--output", help="results file (default: results/run-DATE-TIME.json)")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results file to compare against")
+    parser.add_argument("--run-one", metavar="DB", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        json.dump(runScale(args.run_one, args.repeat), sys.stdout)
+        return
+
+    scales = args.scale or defaultScales
+    for scale in scales:
+        try:
+            parseScale(scale)
+        except ValueError as error:
+            parser.error(str(error))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as previousFile:
+            previous = json.load(previousFile)
+
+    run = runBenchmark(scales, args.data_dir, args.repeat, args.seed, args.cache)
+    printRun(run, previous)
+
+    output = args.output or os.path.join(
+        benchDir, "results", datetime.datetime.now().strftime("run-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as outputFile:
+        json.dump(run, outputFile, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
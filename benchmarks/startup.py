@@ -0,0 +1,116 @@
+"""
+Startup benchmark for the CTA L analysis app.
+
+Measures two things for main.py, each over several fresh interpreter runs:
+
+- import cost, from `python -X importtime`, for the app's own modules and
+  for the heaviest third-party imports (matplotlib should not appear);
+- time to first prompt, from process start until the command prompt is
+  printed.
+
+Run from the directory holding the database:
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+appDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+mainScript = os.path.join(appDir, "main.py")
+prompt = b"Please enter a command"
+
+
+def importTimes(runs) -> dict:
+    """
+    Collect cumulative import times of top-level modules when main.py starts.
+
+    Args:
+    runs (int): Number of interpreter runs to take the median over.
+
+    Returns:
+    dict: Top-level module name to median cumulative import time in ms.
+    """
+
+    samples = {}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", mainScript],
+            input=b"x\n",
+            capture_output=True,
+        )
+        for line in proc.stderr.decode().splitlines():
+            # "import time:      self [us] |    cumulative | imported package"
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            fields = line[len("import time:"):].split("|")
+            if not fields[1].strip().isdigit():
+                continue
+            name = fields[2]
+            # Nested imports are indented; keep only the top level
+            if name.startswith("  "):
+                continue
+            samples.setdefault(name.strip(), []).append(int(fields[1]) / 1000)
+
+    return {name: statistics.median(times) for name, times in samples.items()}
+
+
+def timeToFirstPrompt(runs) -> list:
+    """
+    Time how long main.py takes to print its first command prompt.
+
+    Args:
+    runs (int): Number of interpreter runs.
+
+    Returns:
+    list: Time to first prompt of each run, in ms.
+    """
+
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, mainScript],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+        output = b""
+        while prompt not in output:
+            chunk = proc.stdout.read1(4096)
+            if not chunk:
+                break
+            output += chunk
+        times.append((time.perf_counter() - start) * 1000)
+
+        proc.communicate(b"x\n")
+
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5, help="interpreter runs per measurement")
+    parser.add_argument("--top", type=int, default=10, help="number of imports to list")
+    args = parser.parse_args()
+
+    print(f"Slowest top-level imports (median of {args.runs} runs)")
+    ranked = sorted(importTimes(args.runs).items(), key=lambda item: -item[1])
+    for name, ms in ranked[: args.top]:
+        print(f"  {name:<30} {ms:8.1f} ms")
+
+    times = timeToFirstPrompt(args.runs)
+    print(
+        "Time to first prompt:",
+        f"median {statistics.median(times):.1f} ms,",
+        f"min {min(times):.1f} ms,",
+        f"max {max(times):.1f} ms",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+Synthetic CTA-shaped database for the CTA L analysis app's benchmarks.
+
+Builds a database with the same tables as CTA2_L_daily_ridership.db
+(Stations, Stops, StopDetails, Lines, Ridership) at any scale, so the
+queries can be timed without the real download and at sizes beyond it.
+The data is random but shaped like the real thing:
+
+- stations spread over the map of Chicago, each on one line and some on
+  two, with two directional stops each; a few names are shared by more
+  than one Station_ID, as with the real Kedzie or Harlem stations;
+- one Ridership row per station and day, Type_of_Day W, A or U (Sundays
+  and holidays), in the stored 'YYYY-MM-DDT00:00:00.000' date format;
+- riders following a per-station level, weekday/weekend split, annual
+  seasonality, a yearly trend and noise, with stations opening late and
+  the odd day missing.
+
+The same arguments and seed always give the same database.
+
+    python benchmarks/syntheticdb.py synthetic.db --stations 1500 --years 25
+"""
+
+import argparse
+import datetime
+import math
+import os
+import random
+import sqlite3
+import time
+
+colors = ["Red", "Blue", "Brown", "Green", "Orange", "Pink", "Purple", "Purple-Express", "Yellow"]
+
+streets = [
+    "Addison", "Armitage", "Ashland", "Austin", "Belmont", "Berwyn", "Bryn Mawr",
+    "California", "Central", "Cermak", "Chicago", "Cicero", "Clark/Lake", "Damen",
+    "Davis", "Division", "Diversey", "Foster", "Fullerton", "Garfield", "Grand",
+    "Halsted", "Harlem", "Harrison", "Howard", "Irving Park", "Jackson", "Jarvis",
+    "Kedzie", "Kostner", "Laramie", "Lawrence", "Logan Square", "Loyola", "Madison",
+    "Main", "Monroe", "Montrose", "Morse", "Noyes", "Oak Park", "Paulina", "Pulaski",
+    "Quincy", "Racine", "Randolph", "Rockwell", "Roosevelt", "Sedgwick", "Sheridan",
+    "Southport", "State", "Thorndale", "Washington", "Wellington", "Western", "Wilson",
+]
+
+# Latitude and longitude range the stations are placed in
+latitudeRange = (41.72, 42.07)
+longitudeRange = (-87.90, -87.60)
+
+# Riders on Saturdays ('A') and Sundays/holidays ('U') relative to weekdays
+dayTypeFactors = {"W": 1.0, "A": 0.55, "U": 0.4}
+
+schema_SQL = """
+             CREATE TABLE Stations (
+                 Station_ID INTEGER PRIMARY KEY,
+                 Station_Name TEXT
+             );
+             CREATE TABLE Stops (
+                 Stop_ID INTEGER PRIMARY KEY,
+                 Station_ID INTEGER,
+                 Stop_Name TEXT,
+                 Direction TEXT,
+                 ADA INTEGER,
+                 Latitude REAL,
+                 Longitude REAL
+             );
+             CREATE TABLE Lines (
+                 Line_ID INTEGER PRIMARY KEY,
+                 Color TEXT
+             );
+             CREATE TABLE StopDetails (
+                 Stop_ID INTEGER,
+                 Line_ID INTEGER
+             );
+             CREATE TABLE Ridership (
+                 Station_ID INTEGER,
+                 Ride_Date TEXT,
+                 Type_of_Day TEXT,
+                 Num_Riders INTEGER
+             );
+             """
+
+
+def dayTypeOf(date) -> str:
+    """
+    Type_of_Day of a date: 'U' for Sundays and the fixed-date holidays,
+    'A' for Saturdays, 'W' otherwise.
+    """
+
+    if date.weekday() == 6 or (date.month, date.day) in ((1, 1), (7, 4), (12, 25)):
+        return "U"
+    return "A" if date.weekday() == 5 else "W"
+
+
+def stationNames(count, rng) -> list:
+    """
+    Names for count stations: street names, then street names with a line
+    color, then numbered. About one in twenty repeats the previous name.
+    """
+
+    names = []
+    for index in range(count):
+        if names and rng.random() < 0.05:
+            names.append(names[-1])
+            continue
+        street = streets[index % len(streets)]
+        rank = index // len(streets)
+        if rank == 0:
+            names.append(street)
+        elif rank <= len(colors):
+            names.append(f"{street}-{colors[rank - 1]}")
+        else:
+            names.append(f"{street}-{rank}")
+    return names
+
+
+def generate(path, stations=150, years=25, startYear=2001, seed=0) -> int:
+    """
+    Write a synthetic ridership database, replacing any file at path.
+
+    Args:
+    path (str): The database file to write.
+    stations (int): Number of stations.
+    years (int): Number of whole years of daily ridership.
+    startYear (int): First year of ridership.
+    seed (int): Random seed.
+
+    Returns:
+    int: Number of Ridership rows written.
+    """
+
+    rng = random.Random(seed)
+
+    # Build next to the target and move it into place when complete
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    dbConn = sqlite3.connect(partial)
+    dbConn.execute("PRAGMA journal_mode = OFF;")
+    dbConn.execute("PRAGMA synchronous = OFF;")
+    dbConn.executescript(schema_SQL)
+
+    dbConn.executemany(
+        "INSERT INTO Lines VALUES (?, ?);",
+        [(lineId, color) for lineId, color in enumerate(colors, start=1)],
+    )
+
+    stationIds = [40000 + 10 * index for index in range(stations)]
+    names = stationNames(stations, rng)
+    dbConn.executemany("INSERT INTO Stations VALUES (?, ?);", zip(stationIds, names))
+
+    stops = []
+    stopDetails = []
+    stopId = 30000
+    for stationId, name in zip(stationIds, names):
+        lineId = rng.randrange(len(colors)) + 1
+        lineIds = [lineId]
+        if rng.random() < 0.1:
+            lineIds.append(lineId % len(colors) + 1)
+
+        latitude = rng.uniform(*latitudeRange)
+        longitude = rng.uniform(*longitudeRange)
+        directions = "NS" if colors[lineId - 1] in ("Red", "Purple", "Purple-Express", "Yellow") else "EW"
+        ada = int(rng.random() < 0.7)
+        for direction in directions:
+            stops.append((
+                stopId, stationId, f"{name} ({colors[lineId - 1]} Line)", direction, ada,
+                round(latitude + rng.uniform(-0.0005, 0.0005), 6),
+                round(longitude + rng.uniform(-0.0005, 0.0005), 6),
+            ))
+            stopDetails.extend((stopId, line) for line in lineIds)
+            stopId += 1
+
+    dbConn.executemany("INSERT INTO Stops VALUES (?, ?, ?, ?, ?, ?, ?);", stops)
+    dbConn.executemany("INSERT INTO StopDetails VALUES (?, ?);", stopDetails)
+
+    # Per station: weekday level, yearly growth and the first year it reports
+    profiles = [
+        (
+            rng.lognormvariate(math.log(2500), 0.8),
+            rng.uniform(-0.02, 0.03),
+            startYear if rng.random() < 0.8 else startYear + rng.randrange(years),
+        )
+        for _ in range(stations)
+    ]
+
+    def rows():
+        day = datetime.date(startYear, 1, 1)
+        end = datetime.date(startYear + years, 1, 1)
+        while day < end:
+            rideDate = day.isoformat() + "T00:00:00.000"
+            dayType = dayTypeOf(day)
+            season = 1 + 0.12 * math.sin(2 * math.pi * (day.timetuple().tm_yday - 100) / 365.25)
+            base = dayTypeFactors[dayType] * season
+            elapsed = day.year - startYear
+            for stationId, (level, growth, opened) in zip(stationIds, profiles):
+                if day.year < opened or rng.random() < 0.005:
+                    continue
+                riders = level * base * (1 + growth) ** elapsed * rng.gauss(1, 0.08)
+                yield stationId, rideDate, dayType, max(0, int(riders))
+            day += datetime.timedelta(days=1)
+
+    dbConn.executemany("INSERT INTO Ridership VALUES (?, ?, ?, ?);", rows())
+    numRows = dbConn.execute("SELECT COUNT(*) FROM Ridership;").fetchone()[0]
+    dbConn.commit()
+    dbConn.close()
+
+    os.replace(partial, path)
+    return numRows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic CTA ridership database.")
+    parser.add_argument("output", help="database file to write (replaced if it exists)")
+    parser.add_argument("--stations", type=int, default=150, help="number of stations (default: 150)")
+    parser.add_argument("--years", type=int, default=25, help="years of daily ridership (default: 25)")
+    parser.add_argument("--start-year", type=int, default=2001, help="first year (default: 2001)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    numRows = generate(args.output, args.stations, args.years, args.start_year, args.seed)
+    print(
+        f"{args.output}: {args.stations} stations, {numRows:,} ridership rows "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+In-process result cache for the CTA L analysis app.
+
+Operators ask for the same busy stations over and over; the @cached
+decorator keeps recent results of the station query functions in a
+bounded LRU cache with an optional time-to-live. Entries are keyed on the
+function and its normalized arguments and tagged with a fingerprint of
+Ridership, so any change to the ridership data invalidates them.
+
+The size and TTL come from CTA_CACHE_SIZE and CTA_CACHE_TTL (seconds,
+0 for no expiry), or from configure().
+"""
+
+import collections
+import functools
+import inspect
+import os
+import threading
+import time
+import weakref
+
+import database
+import rollups
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+    """
+
+    def __init__(self, maxSize=256, ttl=600):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        """
+        Look up a key.
+
+        Args:
+        key (tuple): The cache key.
+        version (str): Fingerprint of the data the caller is querying.
+
+        Returns:
+        tuple: (True, value) on a hit, (False, None) on a miss.
+        """
+
+        with self._lock:
+            # New data makes every cached result suspect
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return (True, entry[0])
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return (False, None)
+
+    def put(self, key, version, value):
+        """
+        Store a value, evicting the least recently used entries if full.
+
+        Args:
+        key (tuple): The cache key.
+        version (str): Fingerprint of the data the value was computed from.
+        value: The value to cache.
+        """
+
+        with self._lock:
+            if version != self._version or self.maxSize <= 0:
+                return
+
+            expiry = time.monotonic() + self.ttl if self.ttl else None
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drop every entry and reset the counters.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters.
+
+        Returns:
+        dict: hits, misses, evictions, size, maxSize and ttl.
+        """
+
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxSize": self.maxSize,
+                "ttl": self.ttl,
+            }
+
+
+resultCache = ResultCache(
+    int(os.environ.get("CTA_CACHE_SIZE", 256)),
+    float(os.environ.get("CTA_CACHE_TTL", 600)),
+)
+
+# (change counters, fingerprint) last computed on each connection; weak
+# keys, so closed and discarded connections drop out
+_fingerprints = weakref.WeakKeyDictionary()
+
+
+def configure(maxSize=None, ttl=None):
+    """
+    Resize the cache or change its time-to-live. Existing entries are dropped.
+
+    Args:
+    maxSize (int): Maximum number of cached results, 0 to disable caching.
+    ttl (float): Seconds a result stays valid, 0 for no expiry.
+    """
+
+    if maxSize is not None:
+        resultCache.maxSize = maxSize
+    if ttl is not None:
+        resultCache.ttl = ttl
+    resultCache.clear()
+
+
+def dataVersion(dbConn) -> str:
+    """
+    Return a fingerprint of Ridership as seen by a connection, from
+    rollups.ridershipVersion(), so updated and deleted rows change it as
+    well as appended ones. It is only recomputed when PRAGMA data_version
+    or the connection's own change count shows the database was written.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    str: The fingerprint, e.g. "1048576:1048576:0".
+    """
+
+    counters = (dbConn.execute("PRAGMA data_version;").fetchone()[0], dbConn.total_changes)
+    seen = _fingerprints.get(dbConn)
+    if seen is not None and seen[0] == counters:
+        return seen[1]
+
+    if not dbConn.in_transaction:
+        rollups.ensureRewriteTracking(dbConn)
+        counters = (dbConn.execute("PRAGMA data_version;").fetchone()[0], dbConn.total_changes)
+
+    fingerprint = formatVersion(rollups.ridershipVersion(dbConn.cursor()))
+    _fingerprints[dbConn] = (counters, fingerprint)
+
+    return fingerprint
+
+
+def formatVersion(version) -> str:
+    """
+    Format a rollups.ridershipVersion() tuple as a fingerprint string.
+
+    Args:
+    version (tuple): (number of rows, largest rowid, rewrites).
+
+    Returns:
+    str: The fingerprint, e.g. "1048576:1048576:0".
+    """
+
+    return ":".join(str(part) for part in version)
+
+
+def _freeze(value):
+    """
+    Turn a value into something hashable for use in a cache key.
+    """
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def likePattern(pattern):
+    """
+    Normalize a LIKE pattern: SQLite's LIKE ignores ASCII case, so
+    'howard' and 'Howard' select the same stations. None stays None.
+    """
+
+    if pattern is None:
+        return None
+    return "".join(char.lower() if char.isascii() else char for char in str(pattern))
+
+
+def exactStationKey(station):
+    """
+    Normalize a station argument given as an exact name: a resolved
+    station is keyed on its Station_IDs, a name is kept as is.
+    """
+
+    stationIds = getattr(station, "stationIds", None)
+    if stationIds is not None:
+        return ("ids",) + tuple(stationIds)
+    return station
+
+
+def stationKey(station):
+    """
+    Normalize a station argument given as a name pattern: a resolved
+    station is keyed on its Station_IDs, a pattern as in likePattern().
+    """
+
+    if hasattr(station, "stationIds"):
+        return exactStationKey(station)
+    return likePattern(station)
+
+
+def dateKey(date):
+    """
+    Normalize a date so "2019-01-01" and datetime.date(2019, 1, 1) share
+    a cache entry.
+    """
+
+    return str(date).strip()
+
+
+def yearKey(year):
+    """
+    Normalize a year so "2019", " 2019" and 2019 share a cache entry.
+    """
+
+    try:
+        return int(year)
+    except (TypeError, ValueError):
+        return year
+
+
+def cached(normalizers=None):
+    """
+    Decorator that serves a query function's results from resultCache.
+
+    Args:
+    normalizers (dict): Parameter name to a function that maps equivalent
+                        argument values onto the same key.
+
+    Returns:
+    function: The decorator.
+    """
+
+    normalizers = normalizers or {}
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name,) + tuple(
+                _freeze(normalizers.get(param, lambda value: value)(value))
+                for param, value in bound.arguments.items()
+            )
+
+            version = dataVersion(database.getConnection())
+            hit, value = resultCache.get(key, version)
+            if hit:
+                return value
+
+            value = func(*args, **kwargs)
+            resultCache.put(key, version, value)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
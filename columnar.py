@@ -0,0 +1,471 @@
+"""
+Columnar on-disk copy of Ridership for the CTA L analysis app.
+
+Ridership is exported into four NumPy arrays, one file per column:
+
+    station_id   int16   Station_ID minus the store's stationBase
+    day_number   int32   days since 1970-01-01
+    type_of_day  uint8   index into dayTypes ('W', 'A', 'U'); 255 if unknown
+    num_riders   int32
+
+sorted by station and date, plus the row range of every station. The
+arrays are opened memory-mapped, so a station's rows are a slice of each
+file and its totals are sums over that slice, without decoding the other
+columns or copying anything. CTA Station_IDs (40000 and up) do not fit an
+int16, hence the offset from stationBase.
+
+Each export is written to its own generation directory and published by
+rewriting the CURRENT file, so readers never see a half-written store.
+A store matches the database it was exported from through the Ridership
+fingerprint; the query functions only use it while that still holds.
+
+    python columnar.py /data/cta-columns            # export or refresh
+    python columnar.py /data/cta-columns --rebuild
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+import cache
+import database
+import rollups
+
+# Column name -> dtype, in file order
+columnTypes = {
+    "station_id": np.int16,
+    "day_number": np.int32,
+    "type_of_day": np.uint8,
+    "num_riders": np.int32,
+}
+
+# Type_of_Day values, by type_of_day code
+dayTypes = ("W", "A", "U")
+unknownDayType = 255
+
+# Rows fetched from SQLite per fetchmany() while exporting
+fetchSize = 65536
+
+# Days from 1970-01-01 to a Ride_Date, as an integer
+_dayNumber_SQL = "CAST(julianday(date(Ride_Date)) - 2440587.5 AS INTEGER)"
+
+_dayType_SQL = (
+    "CASE Type_of_Day "
+    + " ".join(f"WHEN '{dayType}' THEN {code}" for code, dayType in enumerate(dayTypes))
+    + f" ELSE {unknownDayType} END"
+)
+
+
+class ColumnStore:
+    """
+    One generation of the columnar Ridership store, memory-mapped.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+        directory (str): A generation directory written by exportStore().
+        """
+
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as metaFile:
+            self.meta = json.load(metaFile)
+
+        self.fingerprint = self.meta["fingerprint"]
+        self.stationBase = self.meta["stationBase"]
+        self.columns = {
+            name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+            for name in columnTypes
+        }
+
+        # Station_ID -> (first row, end row) in the sorted columns
+        stationIds = np.load(os.path.join(directory, "stations.npy"))
+        offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.ranges = {
+            stationId: (start, end)
+            for stationId, start, end in zip(
+                stationIds.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()
+            )
+        }
+
+    def __len__(self):
+        return len(self.columns["num_riders"])
+
+    def _rows(self, stationIds, start=None, end=None):
+        """
+        Row slices of some stations, optionally limited to a half-open
+        range of 'YYYY-MM-DD' dates. Rows are sorted by date within a
+        station, so the date bounds are found by binary search.
+        """
+
+        days = self.columns["day_number"]
+        slices = []
+        for stationId in stationIds:
+            first, last = self.ranges.get(stationId, (0, 0))
+            if start is not None:
+                first += int(np.searchsorted(days[first:last], dayNumber(start)))
+            if end is not None:
+                last = first + int(np.searchsorted(days[first:last], dayNumber(end)))
+            if first < last:
+                slices.append(slice(first, last))
+        return slices
+
+    def _gather(self, name, slices):
+        """
+        One column over the given row slices; a view when there is one slice.
+        """
+
+        column = self.columns[name]
+        if len(slices) == 1:
+            return column[slices[0]]
+        if not slices:
+            return column[:0]
+        return np.concatenate([column[rows] for rows in slices])
+
+    def dayTypeTotals(self, stationIds) -> tuple:
+        """
+        Total riders of some stations by day type.
+
+        Args:
+        stationIds (tuple): The Station_IDs.
+
+        Returns:
+        tuple: (weekday, saturday, sunday/holiday, total).
+        """
+
+        slices = self._rows(stationIds)
+        riders = self._gather("num_riders", slices).astype(np.int64)
+        types = self._gather("type_of_day", slices)
+
+        byType = np.bincount(types, weights=riders, minlength=len(dayTypes))
+        return (
+            int(byType[0]),
+            int(byType[1]),
+            int(byType[2]),
+            int(riders.sum()),
+        )
+
+    def yearlyTotals(self, stationIds) -> list:
+        """
+        Total riders of some stations per year.
+
+        Args:
+        stationIds (tuple): The Station_IDs.
+
+        Returns:
+        list: (year, riders) pairs in year order, for years with data.
+        """
+
+        slices = self._rows(stationIds)
+        years = _years(self._gather("day_number", slices))
+        riders = self._gather("num_riders", slices)
+        return _groupSums(years, riders)
+
+    def monthlyTotals(self, stationIds, year) -> list:
+        """
+        Total riders of some stations per month of one year.
+
+        Args:
+        stationIds (tuple): The Station_IDs.
+        year (int): The year.
+
+        Returns:
+        list: (month, riders) pairs in month order, for months with data.
+        """
+
+        year = int(year)
+        slices = self._rows(stationIds, f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+        days = self._gather("day_number", slices).astype("datetime64[D]")
+        months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+        riders = self._gather("num_riders", slices)
+        return _groupSums(months, riders)
+
+    def dailyTotals(self, stationId, start, end) -> tuple:
+        """
+        Daily riders of one station over a half-open date range.
+
+        Args:
+        stationId (int): The Station_ID.
+        start (str): First day, 'YYYY-MM-DD'.
+        end (str): Day after the last day, 'YYYY-MM-DD'.
+
+        Returns:
+        tuple: (day numbers, riders) arrays; views into the store.
+        """
+
+        slices = self._rows((stationId,), start, end)
+        return self._gather("day_number", slices), self._gather("num_riders", slices)
+
+    def totalsByStation(self, dayType=None) -> dict:
+        """
+        Total riders of every station, optionally for one day type only.
+
+        Args:
+        dayType (str): 'W', 'A' or 'U', or None for all days.
+
+        Returns:
+        dict: Station_ID -> riders, for stations with rows.
+        """
+
+        riders = self.columns["num_riders"].astype(np.int64)
+        if dayType is not None:
+            riders = np.where(self.columns["type_of_day"] == dayTypes.index(dayType), riders, 0)
+
+        totals = {}
+        if len(riders):
+            starts = np.array([first for first, _ in self.ranges.values()], dtype=np.int64)
+            sums = np.add.reduceat(riders, starts)
+            totals = dict(zip(self.ranges, sums.tolist()))
+        return totals
+
+
+def dayNumber(date) -> int:
+    """
+    Days from 1970-01-01 to a 'YYYY-MM-DD' date.
+    """
+
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def _years(days):
+    return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+
+def _groupSums(keys, values) -> list:
+    """
+    Sum values per distinct key, as (key, sum) pairs in key order.
+    """
+
+    if not len(keys):
+        return []
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.bincount(inverse, weights=values.astype(np.float64))
+    return list(zip(unique.tolist(), sums.astype(np.int64).tolist()))
+
+
+def _readCurrent(directory):
+    """
+    Name of the published generation, or None if nothing is published.
+    """
+
+    try:
+        with open(os.path.join(directory, "CURRENT")) as currentFile:
+            return currentFile.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _publish(directory, generation):
+    """
+    Make a generation current and delete the older ones. Processes that
+    still have old arrays mapped keep reading them until they reopen.
+    """
+
+    currentPath = os.path.join(directory, "CURRENT")
+    with open(currentPath + ".tmp", "w") as currentFile:
+        currentFile.write(generation + "\n")
+    os.replace(currentPath + ".tmp", currentPath)
+
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name != generation and name.startswith("gen-") and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _writeGeneration(directory, columns, meta) -> str:
+    """
+    Write sorted columns and their metadata as a new generation directory.
+    """
+
+    generation = f"gen-{meta['numRows']}-{meta['maxRow']}-{time.time_ns()}"
+    path = os.path.join(directory, generation)
+    os.makedirs(path)
+
+    stationIds = columns["station_id"]
+    if len(stationIds):
+        # First row of each station, and the end of the last one
+        boundaries = np.flatnonzero(np.diff(stationIds)) + 1
+        offsets = np.concatenate(([0], boundaries, [len(stationIds)])).astype(np.int64)
+    else:
+        offsets = np.zeros(1, dtype=np.int64)
+    uniqueIds = stationIds[offsets[:-1]].astype(np.int64) + meta["stationBase"]
+
+    for name, dtype in columnTypes.items():
+        np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(columns[name], dtype=dtype))
+    np.save(os.path.join(path, "stations.npy"), uniqueIds)
+    np.save(os.path.join(path, "offsets.npy"), offsets)
+    with open(os.path.join(path, "meta.json"), "w") as metaFile:
+        json.dump(meta, metaFile, indent=2)
+
+    return generation
+
+
+def _fetchColumns(dbCursor, stationBase, afterRow=0) -> dict:
+    """
+    Read Ridership rows past a rowid into column arrays, in fetchSize batches.
+    """
+
+    dbCursor.execute(
+        f"""
+        SELECT Station_ID, {_dayNumber_SQL}, {_dayType_SQL}, Num_Riders
+        FROM Ridership
+        WHERE rowid > ?
+        """,
+        (afterRow,),
+    )
+
+    parts = []
+    while True:
+        rows = dbCursor.fetchmany(fetchSize)
+        if not rows:
+            break
+        parts.append(np.array(rows, dtype=np.int64))
+
+    data = np.concatenate(parts) if parts else np.empty((0, 4), dtype=np.int64)
+
+    offsetIds = data[:, 0] - stationBase
+    if len(offsetIds) and (offsetIds.min() < 0 or offsetIds.max() > np.iinfo(np.int16).max):
+        raise ValueError("Station_IDs span more than an int16 column can hold")
+
+    return {
+        "station_id": offsetIds,
+        "day_number": data[:, 1],
+        "type_of_day": data[:, 2],
+        "num_riders": data[:, 3],
+    }
+
+
+def exportStore(dbConn, directory, rebuild=False) -> dict:
+    """
+    Bring the columnar store in a directory up to date with Ridership.
+    Rows appended since the last export are merged into the existing
+    columns; anything else (updated or deleted rows, a first export,
+    rebuild=True) exports the whole table again.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    directory (str): Directory of the store; created if missing.
+    rebuild (bool): Export everything even if a merge would do.
+
+    Returns:
+    dict: The new generation's metadata, or the current one's if it was
+    already up to date.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    # The store is matched against cache.dataVersion(), which counts
+    # rewrites once the triggers are in; stamp it the same way
+    if not dbConn.in_transaction:
+        rollups.ensureRewriteTracking(dbConn)
+    dbCursor = dbConn.cursor()
+
+    version = rollups.ridershipVersion(dbCursor)
+    numRows, maxRow, rewrites = version
+    fingerprint = cache.formatVersion(version)
+
+    current = None if rebuild else _readCurrent(directory)
+    store = ColumnStore(os.path.join(directory, current)) if current else None
+    if store is not None and store.fingerprint == fingerprint:
+        return store.meta
+
+    appended = (
+        store is not None
+        and rewrites == store.meta.get("rewrites")
+        and maxRow >= store.meta["maxRow"]
+        and dbCursor.execute(
+            "SELECT COUNT(*) FROM Ridership WHERE rowid <= ?;", (store.meta["maxRow"],)
+        ).fetchone()[0] == len(store)
+    )
+
+    if appended:
+        stationBase = store.stationBase
+        columns = _fetchColumns(dbCursor, stationBase, store.meta["maxRow"])
+        columns = {
+            name: np.concatenate((np.asarray(store.columns[name], dtype=np.int64), columns[name]))
+            for name in columnTypes
+        }
+    else:
+        stationBase = dbCursor.execute("SELECT MIN(Station_ID) FROM Ridership;").fetchone()[0] or 0
+        columns = _fetchColumns(dbCursor, stationBase)
+
+    # A stable sort keeps rows of the same station and day in rowid order
+    order = np.lexsort((columns["day_number"], columns["station_id"]))
+    columns = {name: values[order] for name, values in columns.items()}
+
+    meta = {
+        "fingerprint": fingerprint,
+        "numRows": numRows,
+        "maxRow": maxRow,
+        "rewrites": rewrites,
+        "stationBase": stationBase,
+        "dayTypes": list(dayTypes),
+        "database": getattr(dbConn, "path", None),
+        "exported": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    _publish(directory, _writeGeneration(directory, columns, meta))
+    return meta
+
+
+# Opened stores, keyed by generation directory
+_stores = {}
+_storesLock = threading.Lock()
+
+
+def openStore(dbConn, directory):
+    """
+    Return the store in a directory if it matches the database, so
+    queries can run against it.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    directory (str): Directory of the store.
+
+    Returns:
+    ColumnStore: The current generation, or None if there is none or it
+    was exported from different Ridership data.
+    """
+
+    current = _readCurrent(directory)
+    if current is None:
+        return None
+
+    path = os.path.join(directory, current)
+    with _storesLock:
+        store = _stores.get(path)
+        if store is None:
+            store = ColumnStore(path)
+            _stores.clear()
+            _stores[path] = store
+
+    if store.fingerprint != cache.dataVersion(dbConn):
+        return None
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Ridership to a columnar store.")
+    parser.add_argument("directory", nargs="?", help="store directory (default: the column_store setting)")
+    parser.add_argument("--rebuild", action="store_true", help="export every row again")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+    directory = args.directory or database.settings()["column_store"]
+    if not directory:
+        parser.error("no directory given and no column_store setting configured")
+
+    started = time.perf_counter()
+    meta = exportStore(database.getConnection(), directory, args.rebuild)
+    elapsed = time.perf_counter() - started
+    print(f"{meta['numRows']:,} rows in {directory} ({meta['fingerprint']}), {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
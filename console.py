@@ -0,0 +1,374 @@
+"""
+Console rendering for the CTA L analysis app.
+
+A thin layer over functions.py: each function here runs one query
+function, prints its result records, and for the charting commands asks
+whether to plot (unless the caller already decided).
+"""
+
+import datetime
+
+import functions
+
+
+def askToPlot(plot, prompt="Plot? (y/n) ") -> bool:
+    """
+    Decide whether to plot, asking the user only if the caller did not.
+
+    Parameters:
+    plot (bool): The caller's decision, or None to ask.
+    prompt (str): The question shown to the user.
+
+    Returns:
+    bool: True if a plot should be drawn.
+    """
+
+    if plot is None:
+        return input(prompt) == "y"
+    return plot
+
+
+def printGeneralStats():
+    """
+    Display general statistics about the database.
+    """
+
+    generalStats = functions.generalStats()
+
+    print("   # of stations:", generalStats.numStations)
+    print("   # of stops:", generalStats.numStops)
+    print("   # of ride entries:", f"{generalStats.numEntries:,d}")
+    print(
+        "   date range: "
+        + str(generalStats.earliestDate)
+        + " - "
+        + str(generalStats.latestDate)
+    )
+    print("   Total ridership:", f"{generalStats.totalRiders:,d}")
+
+
+def printStations(stationName) -> bool:
+    """
+    Display station IDs and names matching the given stationName.
+
+    Parameters:
+    stationName (str): The name or partial name of the station to search for.
+
+    Returns:
+    bool: True if stations found, False otherwise.
+    """
+
+    found = False
+
+    # Display the matching stations as they are found
+    for station in functions.iterFindStations(stationName):
+        print(station.stationId, ":", station.stationName)
+        found = True
+
+    return found
+
+
+def printPercentageRiders(stationName):
+    """
+    Display the percentage of ridership for weekdays, Saturdays,
+    and Sundays/holidays for a given station.
+
+    Parameters:
+    stationName (str): The name of the station to analyze.
+
+    Returns:
+    bool: True if data is found, False otherwise.
+    """
+
+    breakdown = functions.findPercentageRiders(stationName)
+
+    if breakdown is None:
+        print("**No data found...")
+        return False
+
+    # Display percentage ridership for the station
+    print(f"Percentage of ridership for the {stationName} station: ")
+    print(
+        "  Weekday ridership:",
+        f"{breakdown.weekday:,}",
+        f"({breakdown.percentage(breakdown.weekday):.2f}%)",
+    )
+    print(
+        "  Saturday ridership:",
+        f"{breakdown.saturday:,}",
+        f"({breakdown.percentage(breakdown.saturday):.2f}%)",
+    )
+    print(
+        "  Sunday/holiday ridership:",
+        f"{breakdown.sunday:,}",
+        f"({breakdown.percentage(breakdown.sunday):.2f}%)",
+    )
+    print("  Total ridership:", f"{breakdown.total:,}")
+
+    return True
+
+
+def printStationRidershipWeekdays():
+    """
+    Display weekday ridership for all stations, along with the
+    percentage of total weekday ridership.
+    """
+
+    print("Ridership on Weekdays for Each Station")
+    for share in functions.iterStationRidershipWeekdays():
+        print(share.stationName, ":", f"{share.riders:,d}", f"({share.percentage:.2f}%)")
+
+
+def printLineStops(lineColor, direction) -> bool:
+    """
+    Display all stops for a given line color and direction, along with
+    ADA information.
+
+    Parameters:
+    lineColor (str): The color of the line.
+    direction (str): The direction of the line (N/S/W/E).
+
+    Returns:
+    bool: True if stops are found, False otherwise.
+    """
+
+    found = False
+
+    for stop in functions.iterLineStops(lineColor, direction):
+        if stop.ada:
+            print(stop.stopName, ": direction =", stop.direction, "(handicap accessible)")
+        else:
+            print(stop.stopName, ": direction =", stop.direction, "(not handicap accessible)")
+        found = True
+
+    return found
+
+
+def printNumStopsEachLine():
+    """
+    Display the number of stops for each line color by direction, and
+    each combination's percentage of all stops.
+    """
+
+    print("Number of Stops For Each Color By Direction")
+    for count in functions.numStopsEachLine():
+        print(count.color, "going", count.direction, ":", count.numStops, f"({count.percentage:.2f}%)")
+
+
+def printLineRidership(year=None, rule="split") -> bool:
+    """
+    Display the ridership of each line, and each line's percentage of the
+    ridership of all lines.
+
+    Parameters:
+    year (str): Only count this year, or None for all years.
+    rule (str): How stations served by several lines count; see
+                functions.lineRidership().
+
+    Returns:
+    bool: True if any ridership is found, False otherwise.
+    """
+
+    lines = functions.lineRidership(year, rule=rule)
+    if not lines:
+        return False
+
+    print("Ridership For Each Line" + (f" in {year}" if year else ""))
+    for line in lines:
+        print(line.color, ":", f"{line.riders:,}", f"({line.percentage:.2f}%)")
+    return True
+
+
+def printYearlyRidership(stationName, plot=None, plotFile=None):
+    """
+    Display the total ridership per year for a station and optionally
+    plot the trend.
+
+    Parameters:
+    stationName (str): The name of the station (wildcards _ and %), or a
+                       results.ResolvedStation.
+    plot (bool): Whether to plot; None asks the user.
+    plotFile (str): Save the plot to this file instead of showing it.
+    """
+
+    series = functions.totalRidershipYear(stationName)
+
+    if series is None:
+        print("**No data found...")
+        return
+
+    # Output yearly ridership for the station
+    print(f"Yearly Ridership at {series.stationName}")
+    for year, riders in zip(series.labels, series.riders):
+        print(year, ":", f"{riders:,}")
+
+    if askToPlot(plot):
+        # matplotlib is only imported once a plot is requested
+        import plotting
+
+        plotting.plotYearlyRidership(series.labels, series.riders, series.stationName, plotFile)
+
+
+def printMonthlyRidership(stationName, year, plot=None, plotFile=None):
+    """
+    Display the monthly ridership of a station in a given year and
+    optionally plot it.
+
+    Parameters:
+    stationName (str): The name of the station (wildcards _ and %), or a
+                       results.ResolvedStation.
+    year (str): The year to show.
+    plot (bool): Whether to plot; None asks the user.
+    plotFile (str): Save the plot to this file instead of showing it.
+
+    Returns:
+    bool: True if the year is valid and data is found, False otherwise.
+    """
+
+    if not str(year).strip().isdigit():
+        print("**Invalid year...")
+        return False
+
+    series = functions.monthlyRidership(stationName, year)
+
+    print(f"Monthly Ridership at {series.stationName} for {year}")
+    for month, riders in zip(series.labels, series.riders):
+        print(month, ":", f"{riders:,}")
+
+    if not series.labels:
+        return False
+
+    if askToPlot(plot, "\nPlot? (y/n) ") and series.labels:
+        # matplotlib is only imported once a plot is requested
+        import plotting
+
+        # only the month part of each 'MM/YYYY' label goes on the axis
+        months = [label[:2] for label in series.labels]
+        plotting.plotMonthlyRidership(months, series.riders, series.stationName, year, plotFile)
+
+    return True
+
+
+def printComparison(station1, station2, year, plot=None, plotFile=None):
+    """
+    Display the first and last five days of ridership of two stations in
+    a given year and optionally plot both daily series.
+
+    Parameters:
+    station1 (str): The name of the first station (wildcards _ and %), or a
+                    results.ResolvedStation.
+    station2 (str): The name of the second station (wildcards _ and %), or a
+                    results.ResolvedStation.
+    year (str): The year to compare.
+    plot (bool): Whether to plot; None asks the user.
+    plotFile (str): Save the plot to this file instead of showing it.
+
+    Returns:
+    bool: True if the year is valid and both stations have data, False otherwise.
+    """
+
+    try:
+        daily = functions.compareRidership(station1, station2, year)
+    except ValueError:
+        print("**Invalid year...")
+        return False
+
+    if None in daily:
+        print("**No data found...")
+        return False
+
+    # Display station info and the first and last five days of ridership
+    for number, series in enumerate(daily, start=1):
+        print(f"Station {number}:", f"{series.stationId}", f"{series.stationName}")
+        days = list(zip(series.dates, series.riders))
+        for date, riders in days[:5] + days[-5:]:
+            print(date, f"{riders}")
+
+    if askToPlot(plot):
+        # matplotlib is only imported once a plot is requested
+        import plotting
+
+        # days are placed by day of the year, so a missing day leaves a gap
+        # instead of shifting the rest of the series
+        plotting.plotDailyComparison(
+            [
+                (
+                    [datetime.date.fromisoformat(day).timetuple().tm_yday for day in series.dates],
+                    series.riders,
+                    series.stationName,
+                )
+                for series in daily
+            ],
+            year,
+            plotFile,
+        )
+
+    return True
+
+
+def checkStation(stationName):
+    """
+    Resolve a station pattern, telling the user when it matches no
+    station or several.
+
+    Parameters:
+    stationName (str): The name of the station (wildcards _ and %).
+
+    Returns:
+    results.ResolvedStation: The station if exactly one matches, None otherwise.
+    """
+
+    matches = functions.stationNameMatches(stationName)
+
+    if len(matches) > 1:
+        print("**Multiple stations found...")
+        return None
+
+    if not matches:
+        print("**No station found...")
+        return None
+
+    return matches[0]
+
+
+def printNearbyStations(latitude, longitude, plot=None, plotFile=None, radius=1.0, limit=None):
+    """
+    Display the stations within a radius of a point, nearest first, and
+    optionally plot them on the map.
+
+    Parameters:
+    latitude (float): The latitude point.
+    longitude (float): The longitude point.
+    plot (bool): Whether to plot; None asks the user.
+    plotFile (str): Save the plot to this file instead of showing it.
+    radius (float): Search radius in miles.
+    limit (int): Show at most this many stations.
+    """
+
+    stations = functions.findNearbyStations(latitude, longitude, radius, limit)
+
+    if not stations:
+        print("**No stations found...")
+        return
+
+    # Print the list of nearby stations
+    if radius == 1:
+        print("\nList of Stations Within a Mile")
+    else:
+        print(f"\nList of Stations Within {radius:g} Miles")
+    for station in stations:
+        print(
+            station.stationName,
+            ":",
+            f"({station.latitude}, {station.longitude})",
+            f"{station.distance:.2f} mi",
+        )
+
+    if askToPlot(plot):
+        # matplotlib is only imported once a plot is requested
+        import plotting
+
+        plotting.plotNearbyStations(
+            [(station.stationName, station.latitude, station.longitude) for station in stations],
+            plotFile,
+        )
@@ -0,0 +1,231 @@
+"""
+Connection management for the CTA L analysis app.
+
+Settings are read, in increasing order of precedence, from built-in
+defaults, the [database] section of cta.ini in the working directory,
+the CTA_DB_* environment variables, and configure(). Each thread gets its
+own connection from getConnection(), so the query functions can be called
+from worker threads without tripping SQLite's same-thread check.
+
+Example cta.ini:
+
+    [database]
+    path = /data/CTA2_L_daily_ridership.db
+    read_only = yes
+    cache_size = -131072
+    column_store = /data/cta-columns
+"""
+
+import configparser
+import os
+import pathlib
+import sqlite3
+import threading
+import weakref
+
+import tracing
+
+# Statements run through ManagedConnection.execute() belong to its caller
+tracing.skipFramesOf(__file__)
+
+configFile = "cta.ini"
+
+# Setting name -> (environment variable, default value)
+settingSources = {
+    "path": ("CTA_DB_PATH", "CTA2_L_daily_ridership.db"),
+    "read_only": ("CTA_DB_READONLY", "no"),
+    # Negative cache_size is in KiB: 64 MiB of page cache per connection
+    "cache_size": ("CTA_DB_CACHE_SIZE", "-65536"),
+    "mmap_size": ("CTA_DB_MMAP_SIZE", str(256 * 1024 * 1024)),
+    "temp_store": ("CTA_DB_TEMP_STORE", "MEMORY"),
+    # Directory of the columnar Ridership store (columnar.py); empty to not use one
+    "column_store": ("CTA_COLUMN_STORE", ""),
+}
+
+# Values passed to configure(), which override everything else
+_overrides = {}
+
+# The calling thread's connection lives in _local.dbConn, opened during
+# _local.generation; closeAll() bumps _generation to retire them all
+_local = threading.local()
+_generation = 0
+
+# Every open connection handed out, so closeAll() can reach other threads'
+# ones; weak, so those of finished threads are not kept alive
+_connections = weakref.WeakSet()
+_connectionsLock = threading.Lock()
+
+
+class ManagedConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection that remembers how it was opened.
+    """
+
+    readOnly = False
+    path = None
+    columnStore = ""
+
+    def cursor(self, factory=None):
+        """
+        Open a cursor; a tracing.TracingCursor while tracing is switched on.
+        """
+
+        if factory is None:
+            factory = tracing.TracingCursor if tracing.tracer.enabled else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # sqlite3.Connection's shortcuts make their own plain cursor; going
+    # through cursor() traces them as well
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seqOfParameters):
+        return self.cursor().executemany(sql, seqOfParameters)
+
+    def executescript(self, sqlScript):
+        return self.cursor().executescript(sqlScript)
+
+    def close(self):
+        """
+        Close the connection and stop tracking it for closeAll().
+        """
+
+        with _connectionsLock:
+            _connections.discard(self)
+        super().close()
+
+
+def _parseBool(value) -> bool:
+    return str(value).strip().lower() in ("1", "yes", "true", "on")
+
+
+def settings() -> dict:
+    """
+    Resolve the current connection settings.
+
+    Returns:
+    dict: Setting name (see settingSources) to value, with read_only as a bool.
+    """
+
+    parser = configparser.ConfigParser()
+    parser.read(configFile)
+
+    resolved = {}
+    for name, (envVar, default) in settingSources.items():
+        value = parser.get("database", name, fallback=default)
+        value = os.environ.get(envVar, value)
+        resolved[name] = _overrides.get(name, value)
+
+    resolved["read_only"] = _parseBool(resolved["read_only"])
+    return resolved
+
+
+def configure(**options):
+    """
+    Override connection settings for connections opened from now on,
+    e.g. configure(path="other.db", read_only=True). Threads that
+    already hold a connection keep it until closeAll() is called.
+
+    Args:
+    **options: Setting names from settingSources with their new values.
+
+    Raises:
+    ValueError: If an option is not a known setting.
+    """
+
+    for name in options:
+        if name not in settingSources:
+            raise ValueError(f"unknown database setting: {name}")
+    _overrides.update(options)
+
+
+def connect(**options) -> ManagedConnection:
+    """
+    Open a new, tuned connection. Callers own it and must close it;
+    most code should use getConnection() instead.
+
+    Args:
+    **options: One-off overrides of the configured settings.
+
+    Returns:
+    ManagedConnection: The open connection.
+    """
+
+    config = settings()
+    config.update(options)
+    readOnly = _parseBool(config["read_only"])
+
+    if readOnly:
+        # mode=ro fails cleanly if the file is missing instead of creating it
+        dbConn = sqlite3.connect(
+            pathlib.Path(config["path"]).resolve().as_uri() + "?mode=ro",
+            uri=True,
+            factory=ManagedConnection,
+            check_same_thread=False,
+        )
+    else:
+        dbConn = sqlite3.connect(
+            config["path"], factory=ManagedConnection, check_same_thread=False
+        )
+
+    dbConn.readOnly = readOnly
+    dbConn.path = config["path"]
+    dbConn.columnStore = config["column_store"]
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(f"PRAGMA cache_size = {int(config['cache_size'])};")
+    dbCursor.execute(f"PRAGMA mmap_size = {int(config['mmap_size'])};")
+    dbCursor.execute("PRAGMA temp_store = " + str(config["temp_store"]).upper() + ";")
+
+    return dbConn
+
+
+def getConnection() -> ManagedConnection:
+    """
+    Return the calling thread's connection, opening it on first use.
+
+    Returns:
+    ManagedConnection: The connection owned by this thread.
+    """
+
+    dbConn = getattr(_local, "dbConn", None)
+    if dbConn is None or getattr(_local, "generation", None) != _generation:
+        dbConn = connect()
+        _local.dbConn = dbConn
+        _local.generation = _generation
+        with _connectionsLock:
+            _connections.add(dbConn)
+
+    return dbConn
+
+
+def isReadOnly(dbConn) -> bool:
+    """
+    Check whether a connection was opened read-only.
+
+    Args:
+    dbConn (sqlite3.Connection): The connection to check.
+
+    Returns:
+    bool: True for read-only connections opened by this module.
+    """
+
+    return getattr(dbConn, "readOnly", False)
+
+
+def closeAll():
+    """
+    Close every pooled connection. Threads open a fresh one on their
+    next call to getConnection().
+    """
+
+    global _generation
+
+    with _connectionsLock:
+        pooled = list(_connections)
+        _connections.clear()
+        _generation += 1
+
+    for dbConn in pooled:
+        dbConn.close()
@@ -0,0 +1,30 @@
+"""
+Date range helpers for the CTA L analysis app.
+
+Filtering with strftime('%Y', Ride_Date) = ? wraps the column in a function,
+so SQLite has to evaluate it for every row. yearRange() turns a year into
+a half-open [start, end) pair of date strings instead, so queries can
+filter with Ride_Date >= ? AND Ride_Date < ? and use the
+(Station_ID, Ride_Date) index. Ride_Date values are ISO-8601 strings, so
+comparing them against 'YYYY-MM-DD' bounds works whether or not a time
+part is stored.
+"""
+
+
+def yearRange(year) -> tuple:
+    """
+    Turn a year into a half-open date range.
+
+    Args:
+    year (str or int): The year, e.g. "2019".
+
+    Returns:
+    tuple: (start, end) date strings, e.g. ("2019-01-01", "2020-01-01").
+
+    Raises:
+    ValueError: If year is not a whole number.
+    """
+
+    year = int(year)
+    return (f"{year:04d}-01-01", f"{year + 1:04d}-01-01")
+
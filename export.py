@@ -0,0 +1,144 @@
+"""
+CSV and JSON export for the CTA L analysis app.
+
+The writers take any iterable of result records (see results.py) and
+write each record as it arrives, so exporting one of the streaming
+query functions (functions.iterStationRidershipWeekdays, iterLineStops,
+iterFindStations) keeps memory flat however many rows come back.
+
+    python export.py weekdays weekday-ridership.csv
+    python export.py stops Red N red-north.json
+    python export.py stations "%Kedzie%" -
+
+The format follows the output file's extension; - writes CSV to stdout
+(--format json for JSON).
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import database
+import functions
+
+formats = ("csv", "json")
+
+
+def writeCsv(records, outputFile) -> int:
+    """
+    Write records as CSV with a header row of their field names.
+
+    Args:
+    records (iterable): Result records, all of one type.
+    outputFile (file): Open text file, opened with newline="".
+
+    Returns:
+    int: Number of records written.
+    """
+
+    writer = csv.writer(outputFile)
+    count = 0
+    for record in records:
+        if count == 0:
+            writer.writerow(record.__slots__)
+        writer.writerow([getattr(record, name) for name in record.__slots__])
+        count += 1
+    return count
+
+
+def writeJson(records, outputFile) -> int:
+    """
+    Write records as a JSON array of objects, one record per line.
+
+    Args:
+    records (iterable): Result records.
+    outputFile (file): Open text file.
+
+    Returns:
+    int: Number of records written.
+    """
+
+    count = 0
+    outputFile.write("[")
+    for record in records:
+        outputFile.write(",\n" if count else "\n")
+        outputFile.write(json.dumps(record.asDict()))
+        count += 1
+    outputFile.write("\n]\n" if count else "]\n")
+    return count
+
+
+def writeRecords(records, path, fileFormat=None) -> int:
+    """
+    Write records to a file, or to stdout if path is "-".
+
+    Args:
+    records (iterable): Result records.
+    path (str): Output file, or "-" for stdout.
+    fileFormat (str): "csv" or "json"; by default taken from the file's
+                      extension, CSV for stdout.
+
+    Returns:
+    int: Number of records written.
+
+    Raises:
+    ValueError: If the format is not one of formats.
+    """
+
+    if fileFormat is None:
+        extension = os.path.splitext(path)[1].lstrip(".").lower()
+        fileFormat = extension if path != "-" else "csv"
+    if fileFormat not in formats:
+        raise ValueError(f"export format must be one of {formats}, not {fileFormat!r}")
+
+    write = writeCsv if fileFormat == "csv" else writeJson
+    if path == "-":
+        return write(records, sys.stdout)
+    with open(path, "w", newline="") as outputFile:
+        return write(records, outputFile)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export query results as CSV or JSON.")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+
+    weekdays = subparsers.add_parser("weekdays", help="weekday ridership of every station")
+    weekdays.add_argument("output", help="output file (.csv or .json), - for stdout")
+
+    stops = subparsers.add_parser("stops", help="stops of a line in one direction")
+    stops.add_argument("color", help="line color")
+    stops.add_argument("direction", help="direction (N/S/E/W)")
+    stops.add_argument("output", help="output file (.csv or .json), - for stdout")
+
+    stationSearch = subparsers.add_parser("stations", help="stations matching a name")
+    stationSearch.add_argument("name", help="station name (wildcards _ and %)")
+    stationSearch.add_argument("output", help="output file (.csv or .json), - for stdout")
+
+    for subparser in (weekdays, stops, stationSearch):
+        subparser.add_argument("--format", choices=formats, help="output format (default: from the extension)")
+        subparser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    if args.query == "weekdays":
+        records = functions.iterStationRidershipWeekdays()
+    elif args.query == "stops":
+        records = functions.iterLineStops(args.color, args.direction)
+    else:
+        records = functions.iterFindStations(args.name)
+
+    try:
+        count = writeRecords(records, args.output, args.format)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.output != "-":
+        print(f"{count:,} rows written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""
+Ridership forecasting for the CTA L analysis app.
+
+Fits a small seasonal model to every station's series of each
+Type_of_Day (see timeseries.readSeriesRows) over the last fitDays days:
+
+    riders = a + b * years + annual harmonics (2) + day-of-week offsets
+
+so each model is 12 coefficients, kept as a float32 BLOB in the
+ForecastModels table along with the residual spread. Forecasts are read
+from the stored coefficients and never refit.
+
+The models are ordinary least squares fits, so each one is also kept as
+its sums of products (X'X, X'y, y'y and the number of days). All series
+are solved at once with one batched call to np.linalg.solve. A refit
+after new data adds the products of the appended rows, subtracts those
+of the days that slid out of the window, and solves only the series
+that changed, which gives the same models as fitting from scratch.
+ingest.py runs it after loading new data once the table exists. If rows
+were updated or deleted, or fitDays changed, everything is fitted again.
+
+Future days take their Type_of_Day from the weekday (holidays are not
+known ahead): 'W' Monday to Friday, 'A' Saturday, 'U' Sunday.
+
+    python forecast.py                      # fit, or refit with new data
+    python forecast.py --full --fit-days 730
+    python forecast.py --station Howard --days 28
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import database
+import rollups
+import timeseries
+
+# Days of history, up to the last day in Ridership, each model is fitted to
+defaultFitDays = 3 * 365
+
+# Model inputs, in coefficient order; Monday is the day-of-week baseline
+features = (
+    "intercept", "years",
+    "sinYear", "cosYear", "sinHalfYear", "cosHalfYear",
+    "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+)
+
+# Day the trend is measured from, as days since 1970-01-01 (2000-01-01)
+trendEpoch = 10957
+
+# Series with fewer days than this are not modelled
+minDays = 2 * len(features)
+
+# Ridge added to the diagonal, per day fitted; keeps the day-of-week
+# offsets a day type never has (and the one equal to the intercept) solvable
+ridgeFactor = 1e-6
+
+# z of the 95% band around a forecast
+bandZ = 1.96
+
+# Longest forecast, in days
+maxDays = 366
+
+createForecastModels_SQL = """
+                           CREATE TABLE IF NOT EXISTS ForecastModels (
+                               Station_ID INTEGER NOT NULL,
+                               Type_of_Day TEXT NOT NULL,
+                               Num_Days INTEGER NOT NULL,
+                               Coefficients BLOB NOT NULL,
+                               Sigma REAL NOT NULL,
+                               Moments BLOB NOT NULL,
+                               PRIMARY KEY (Station_ID, Type_of_Day)
+                           )
+                           """
+
+# Records the Ridership fingerprint and the window the models cover
+createForecastState_SQL = """
+                          CREATE TABLE IF NOT EXISTS ForecastState (
+                              Name TEXT PRIMARY KEY,
+                              Num_Rows INTEGER NOT NULL,
+                              Max_Row INTEGER NOT NULL,
+                              Rewrites INTEGER NOT NULL,
+                              Window_End INTEGER NOT NULL,
+                              Fit_Days INTEGER NOT NULL
+                          )
+                          """
+
+
+class FitReport:
+    """
+    What a fit did, and how fast.
+    """
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.rowsRead = 0
+        self.modelsFitted = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        if self.mode == "current":
+            return "Forecast models are up to date"
+        return (
+            f"{self.mode} fit: {self.rowsRead:,} rows read, {self.modelsFitted:,} models "
+            f"fitted in {self.seconds:.2f} s"
+        )
+
+
+def isoDate(dayNumber) -> str:
+    """
+    'YYYY-MM-DD' of a day number (days since 1970-01-01).
+    """
+
+    return str(np.datetime64(int(dayNumber), "D"))
+
+
+def dayTypesOf(dayNumbers) -> np.ndarray:
+    """
+    Type_of_Day of future days, from the weekday alone.
+    """
+
+    # 1970-01-01 was a Thursday, so Monday is 0 in (n + 3) % 7
+    weekdays = (dayNumbers + 3) % 7
+    return np.where(weekdays < 5, "W", np.where(weekdays == 5, "A", "U"))
+
+
+def designMatrix(dayNumbers) -> np.ndarray:
+    """
+    Model inputs of each day, one row per day and one column per feature.
+    """
+
+    dayNumbers = np.asarray(dayNumbers, dtype=np.int64)
+    phase = 2 * np.pi * dayNumbers / 365.25
+    weekdays = (dayNumbers + 3) % 7
+
+    design = np.empty((len(dayNumbers), len(features)))
+    design[:, 0] = 1.0
+    design[:, 1] = (dayNumbers - trendEpoch) / 365.25
+    design[:, 2] = np.sin(phase)
+    design[:, 3] = np.cos(phase)
+    design[:, 4] = np.sin(2 * phase)
+    design[:, 5] = np.cos(2 * phase)
+    design[:, 6:] = weekdays[:, None] == np.arange(1, 7)
+    return design
+
+
+def seriesMoments(data) -> tuple:
+    """
+    Sums of products of each series of rows.
+
+    Args:
+    data (np.ndarray): Rows from timeseries.readSeriesRows().
+
+    Returns:
+    tuple: ((Station_ID, day type code) of each series, (series, size)
+    array of X'X, X'y, y'y and the number of days, flattened).
+    """
+
+    size = len(features) ** 2 + len(features) + 2
+    if not len(data):
+        return [], np.empty((0, size))
+
+    starts = np.flatnonzero(timeseries.seriesBoundaries(data))
+    ends = np.append(starts[1:], len(data))
+    design = designMatrix(data[:, 3])
+    riders = data[:, 4].astype(np.float64)
+
+    moments = np.empty((len(starts), size))
+    for index, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        X, y = design[start:end], riders[start:end]
+        moments[index] = np.concatenate([(X.T @ X).ravel(), X.T @ y, [y @ y, end - start]])
+
+    keys = list(zip(data[starts, 1].tolist(), data[starts, 2].tolist()))
+    return keys, moments
+
+
+def solveModels(moments) -> tuple:
+    """
+    Least-squares coefficients and residual spread of every series at once.
+
+    Args:
+    moments (np.ndarray): (series, size) sums of products, as from seriesMoments().
+
+    Returns:
+    tuple: ((series, features) coefficients, (series,) residual standard
+    deviations).
+    """
+
+    count = len(features)
+    XtX = moments[:, :count * count].reshape(-1, count, count)
+    Xty = moments[:, count * count:count * count + count]
+    yty = moments[:, -2]
+    numDays = moments[:, -1]
+
+    ridge = ridgeFactor * numDays[:, None, None] * np.eye(count)
+    coefficients = np.linalg.solve(XtX + ridge, Xty[:, :, None])[:, :, 0]
+
+    # Residual sum of squares from the sums, without the rows
+    fitted = np.einsum("si,sij,sj->s", coefficients, XtX, coefficients)
+    sse = np.maximum(yty - 2 * np.einsum("si,si->s", coefficients, Xty) + fitted, 0)
+    sigma = np.sqrt(sse / np.maximum(numDays - count, 1))
+    return coefficients, sigma
+
+
+def _windowRows(dbCursor, first, last, maxRow=None, stationIds=None) -> np.ndarray:
+    """
+    Ridership rows from day number first up to (not including) last,
+    optionally only those up to a rowid or of some stations.
+    """
+
+    sql = f"SELECT {timeseries.seriesColumns_SQL} FROM Ridership WHERE Ride_Date >= ? AND Ride_Date < ?"
+    parameters = [isoDate(first), isoDate(last)]
+    if maxRow is not None:
+        sql += " AND rowid <= ?"
+        parameters.append(maxRow)
+    if stationIds is not None:
+        sql += f" AND Station_ID IN ({', '.join('?' * len(stationIds))})"
+        parameters.extend(stationIds)
+    return timeseries.readSeriesRows(dbCursor, sql, parameters)
+
+
+def _storedMoments(dbCursor, keys) -> list:
+    """
+    The stored sums of products of some series, None where not modelled.
+    """
+
+    stored = []
+    for stationId, dayType in keys:
+        dbCursor.execute(
+            "SELECT Moments FROM ForecastModels WHERE Station_ID = ? AND Type_of_Day = ?;",
+            [stationId, chr(dayType)],
+        )
+        row = dbCursor.fetchone()
+        stored.append(None if row is None else np.frombuffer(row[0], dtype=np.float64))
+    return stored
+
+
+def fit(dbConn, full=False, fitDays=defaultFitDays) -> FitReport:
+    """
+    Bring the forecast models up to date with Ridership.
+
+    Args:
+    dbConn (sqlite3.Connection): Writable connection to the ridership database.
+    full (bool): Fit every model from scratch, even if a refit would do.
+    fitDays (int): Days of history, up to the last day in Ridership, the
+                   models are fitted to.
+
+    Returns:
+    FitReport: Mode ("full", "incremental" or "current"), counts and timing.
+
+    Raises:
+    ValueError: If the connection is read-only, or fitDays is too short.
+    """
+
+    if database.isReadOnly(dbConn):
+        raise ValueError("cannot fit forecast models through a read-only connection")
+    if fitDays < minDays:
+        raise ValueError(f"fitDays must be at least {minDays}, not {fitDays}")
+
+    started = time.perf_counter()
+
+    if not dbConn.in_transaction:
+        rollups.ensureRewriteTracking(dbConn)
+
+    dbCursor = dbConn.cursor()
+    if not dbConn.in_transaction:
+        dbCursor.execute("BEGIN IMMEDIATE;")
+    try:
+        dbCursor.execute(createForecastModels_SQL)
+
+        # State saved before rewrites were counted cannot be trusted
+        dbCursor.execute("PRAGMA table_info(ForecastState);")
+        if "Rewrites" not in [column[1] for column in dbCursor.fetchall()]:
+            dbCursor.execute("DROP TABLE IF EXISTS ForecastState;")
+        dbCursor.execute(createForecastState_SQL)
+
+        version = rollups.ridershipVersion(dbCursor)
+        dbCursor.execute(
+            "SELECT Num_Rows, Max_Row, Rewrites, Window_End, Fit_Days FROM ForecastState WHERE Name = 'Ridership';"
+        )
+        state = dbCursor.fetchone()
+
+        mode = "full"
+        if not full and state is not None and (state[2], state[4]) == (version[2], fitDays):
+            if version == tuple(state[:3]):
+                mode = "current"
+            else:
+                # Only appended rows can be added to the sums; a deleted
+                # or updated row's old products cannot be taken out
+                dbCursor.execute("SELECT COUNT(*) FROM Ridership WHERE rowid > ?;", [state[1]])
+                if state[0] + dbCursor.fetchone()[0] == version[0]:
+                    mode = "incremental"
+
+        report = FitReport(mode)
+        windowEnd = state[3] if state is not None else 0
+        if mode == "full":
+            dbCursor.execute(
+                "SELECT CAST(julianday(date(MAX(Ride_Date))) - 2440587.5 AS INTEGER) FROM Ridership;"
+            )
+            lastDay = dbCursor.fetchone()[0]
+            windowEnd = 0 if lastDay is None else lastDay + 1
+
+            data = _windowRows(dbCursor, windowEnd - fitDays, windowEnd)
+            keys, moments = seriesMoments(data)
+            report.rowsRead = len(data)
+            dbCursor.execute("DELETE FROM ForecastModels;")
+        elif mode == "incremental":
+            added = timeseries.readSeriesRows(
+                dbCursor, f"SELECT {timeseries.seriesColumns_SQL} FROM Ridership WHERE rowid > ?", [state[1]]
+            )
+            if len(added):
+                windowEnd = max(windowEnd, int(added[:, 3].max()) + 1)
+            added = added[added[:, 3] >= windowEnd - fitDays]
+
+            # Earlier rows the window has moved past
+            removed = np.empty((0, 5), dtype=np.int64)
+            if windowEnd > state[3]:
+                removed = _windowRows(dbCursor, state[3] - fitDays, windowEnd - fitDays, state[1])
+            report.rowsRead = len(added) + len(removed)
+
+            addedKeys, addedMoments = seriesMoments(added)
+            removedKeys, removedMoments = seriesMoments(removed)
+            keys = sorted(set(addedKeys) | set(removedKeys))
+            positions = {key: index for index, key in enumerate(keys)}
+            stored = _storedMoments(dbCursor, keys)
+
+            # Series with too few days to model keep no sums, so theirs are
+            # taken over the whole window again
+            fresh = {key for key, sums in zip(keys, stored) if sums is None}
+            freshRows = np.empty((0, 5), dtype=np.int64)
+            if fresh:
+                freshRows = _windowRows(
+                    dbCursor, windowEnd - fitDays, windowEnd, stationIds=sorted({key[0] for key in fresh})
+                )
+                report.rowsRead += len(freshRows)
+            freshKeys, freshMoments = seriesMoments(freshRows)
+
+            moments = np.zeros((len(keys), addedMoments.shape[1]))
+            for key, sums in zip(keys, stored):
+                if sums is not None:
+                    moments[positions[key]] += sums
+            for key, sums in zip(addedKeys, addedMoments):
+                if key not in fresh:
+                    moments[positions[key]] += sums
+            for key, sums in zip(removedKeys, removedMoments):
+                if key not in fresh:
+                    moments[positions[key]] -= sums
+            for key, sums in zip(freshKeys, freshMoments):
+                if key in fresh:
+                    moments[positions[key]] = sums
+        else:
+            keys, moments = [], np.empty((0, 0))
+
+        if keys:
+            modelled = moments[:, -1] >= minDays
+            coefficients, sigma = solveModels(moments[modelled]) if modelled.any() else ([], [])
+            dbCursor.executemany(
+                "DELETE FROM ForecastModels WHERE Station_ID = ? AND Type_of_Day = ?;",
+                [(stationId, chr(dayType)) for (stationId, dayType), keep in zip(keys, modelled.tolist()) if not keep],
+            )
+            dbCursor.executemany(
+                "INSERT OR REPLACE INTO ForecastModels VALUES (?, ?, ?, ?, ?, ?);",
+                [
+                    (
+                        stationId, chr(dayType), int(sums[-1]),
+                        coefficientRow.astype(np.float32).tobytes(), float(spread), sums.tobytes(),
+                    )
+                    for (stationId, dayType), sums, coefficientRow, spread in zip(
+                        [key for key, keep in zip(keys, modelled.tolist()) if keep],
+                        moments[modelled], coefficients, sigma,
+                    )
+                ],
+            )
+            report.modelsFitted = int(modelled.sum())
+
+        dbCursor.execute(
+            "INSERT OR REPLACE INTO ForecastState VALUES ('Ridership', ?, ?, ?, ?, ?);",
+            [*version, windowEnd, fitDays],
+        )
+        dbConn.commit()
+    except BaseException:
+        dbConn.rollback()
+        raise
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def forecast(dbConn, stationIds, days=14, dayType=None):
+    """
+    Forecast the total ridership of some stations from their stored models.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    stationIds (tuple): Station_IDs to total.
+    days (int): Days to forecast, from the day after the last day in
+                Ridership when the models were fitted.
+    dayType (str): Only forecast 'W', 'A' or 'U' days, or None for all.
+
+    Returns:
+    tuple: (dates, day types, riders, lower, upper) lists, the last two a
+    95% band; None if no models have been fitted or none cover the stations.
+
+    Raises:
+    ValueError: If days is not between 1 and maxDays.
+    """
+
+    if not 1 <= days <= maxDays:
+        raise ValueError(f"days must be between 1 and {maxDays}, not {days}")
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'ForecastState';")
+    if dbCursor.fetchone() is None:
+        return None
+
+    dbCursor.execute("SELECT Window_End FROM ForecastState WHERE Name = 'Ridership';")
+    state = dbCursor.fetchone()
+    dbCursor.execute(
+        f"""
+        SELECT Type_of_Day, Coefficients, Sigma FROM ForecastModels
+        WHERE Station_ID IN ({", ".join("?" * len(stationIds))})
+        """,
+        list(stationIds),
+    )
+    models = dbCursor.fetchall()
+    if state is None or not models:
+        return None
+
+    dayNumbers = state[0] + np.arange(days)
+    dayTypes = dayTypesOf(dayNumbers)
+    if dayType is not None:
+        dayNumbers, dayTypes = dayNumbers[dayTypes == dayType], dayTypes[dayTypes == dayType]
+
+    design = designMatrix(dayNumbers)
+    riders = np.zeros(len(dayNumbers))
+    variance = np.zeros(len(dayNumbers))
+    covered = np.zeros(len(dayNumbers), dtype=bool)
+    for modelDayType, coefficients, sigma in models:
+        rows = dayTypes == modelDayType
+        riders[rows] += design[rows] @ np.frombuffer(coefficients, dtype=np.float32)
+        variance[rows] += sigma ** 2
+        covered |= rows
+
+    band = bandZ * np.sqrt(variance)
+    dates = [isoDate(day) for day in dayNumbers.tolist()]
+    return (
+        [date for date, has in zip(dates, covered.tolist()) if has],
+        dayTypes[covered].tolist(),
+        np.round(np.maximum(riders[covered], 0)).astype(int).tolist(),
+        np.round(np.maximum(riders[covered] - band[covered], 0)).astype(int).tolist(),
+        np.round(riders[covered] + band[covered]).astype(int).tolist(),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit ridership forecast models, or print a forecast.")
+    parser.add_argument("--full", action="store_true", help="fit every model from scratch")
+    parser.add_argument(
+        "--fit-days", type=int, default=defaultFitDays, help=f"days of history fitted (default: {defaultFitDays})"
+    )
+    parser.add_argument("--station", help="print a forecast for this station (wildcards _ and %%) instead")
+    parser.add_argument("--days", type=int, default=14, help="days to forecast (default: 14)")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    if args.station is None:
+        try:
+            print(fit(database.getConnection(), args.full, args.fit_days))
+        except ValueError as error:
+            parser.error(str(error))
+        return
+
+    import functions
+
+    try:
+        result = functions.forecastRidership(args.station, args.days)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if result is None:
+        print("**No forecast; check the station name and run forecast.py to fit the models...")
+        return
+
+    print("Forecast for", result.stationName)
+    for date, dayType, riders, lower, upper in zip(
+        result.dates, result.dayTypes, result.riders, result.lower, result.upper
+    ):
+        print(f"  {date} ({dayType}): {riders:,} ({lower:,} - {upper:,})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,197 +1,331 @@
-import sqlite3
-import matplotlib.pyplot as figure
+"""
+Query functions for the CTA L analysis app.
 
-# set up sqlite
-dbConn = sqlite3.connect("CTA2_L_daily_ridership.db")
-dbCursor = dbConn.cursor()
+Every function here runs its SQL and returns result records from
+results.py; nothing is printed and nothing is prompted for. The console
+rendering lives in console.py. The per-station queries are served from
+the LRU cache in cache.py, so treat the records they return as read-only.
+"""
 
+import threading
 
-def printGeneralStats():
+import cache
+import database
+import dates
+import indexes
+import results
+import rollups
+import stations
+import stats
+
+# One-time setup (index creation) guard shared by all threads
+_setupLock = threading.Lock()
+_setupDone = False
+
+# Rows fetched per fetchmany() call by the streaming (iter*) functions
+fetchBatchSize = 1000
+
+
+def getConnection():
+    """
+    Return the calling thread's database connection from the pool in
+    database.py, creating the ridership indexes the first time through.
+
+    Returns:
+    sqlite3.Connection: The connection owned by this thread.
+    """
+
+    global _setupDone
+
+    dbConn = database.getConnection()
+    if not _setupDone:
+        with _setupLock:
+            if not _setupDone:
+                indexes.ensureIndexes(dbConn)
+                _setupDone = True
+
+    return dbConn
+
+
+def generalStats() -> results.GeneralStats:
     """
-    Fetch and display general statistics about the database, including:
+    Fetch general statistics about the database, including:
     - Number of stations
     - Number of stops
     - Total ride entries
     - Date range of the data
     - Total ridership count
+
+    The statistics are computed in one pass and cached in the database,
+    so they are only recomputed after the data changes.
+
+    Returns:
+    results.GeneralStats: The statistics.
     """
 
-    # Get number of stations
-    numStations_SQL = "SELECT COUNT(*) FROM Stations;"
-    dbCursor.execute(numStations_SQL)
-    row = dbCursor.fetchone()
-    print("   # of stations:", row[0])
+    return stats.generalStats(getConnection())
 
-    # Get number of stops
-    numStops_SQL = "SELECT COUNT(*) FROM Stops;"
-    dbCursor.execute(numStops_SQL)
-    row = dbCursor.fetchone()
-    print("   # of stops:", row[0])
-
-    # Get number of ride entries
-    numEntries_SQL = "SELECT COUNT(*) FROM Ridership;"
-    dbCursor.execute(numEntries_SQL)
-    row = dbCursor.fetchone()
-    print("   # of ride entries:", f"{row[0]:,d}")
-
-    # Get the date range
-    earliestDate_SQL = """
-                       SELECT Date(Ride_Date) as Date FROM Ridership
-                       GROUP BY Date
-                       ORDER BY Date ASC;
-                       """
-    dbCursor.execute(earliestDate_SQL)
-    row = dbCursor.fetchall()
 
-    earliestDate = row[0][0] # first entry is earliest date
-    latestDate = row[-1][0]  # last entry is the latest date
+def iterFindStations(stationName):
+    """
+    Stream the stations matching the given stationName.
 
-    print("   date range: " + earliestDate + " - " + latestDate)
+    Args:
+    stationName (str): The name or partial name of the station to search for.
 
-    # Get total Ridership
-    numRides_SQL = "SELECT SUM(Num_Riders) FROM Ridership;"
-    dbCursor.execute(numRides_SQL)
-    row = dbCursor.fetchone()
-    print("   Total ridership:", f"{row[0]:,d}")
+    Yields:
+    results.Station: For each match, ordered by name.
+    """
 
+    # Matched against the in-memory station catalog, no query needed
+    return stations.getCatalog().iterSearch(stationName)
 
-def findStations(stationName) -> bool:
+
+def findStations(stationName) -> list:
     """
-    Find and display station names matching the given stationName.
+    Find stations matching the given stationName.
 
     Args:
     stationName (str): The name or partial name of the station to search for.
-    
+
+    Returns:
+    list: results.Station for each match, ordered by name; empty if none.
+    """
+
+    return list(iterFindStations(stationName))
+
+
+def columnStore(dbConn):
+    """
+    Return the columnar Ridership store (see columnar.py) if one is
+    configured and was exported from the current data, so the ridership
+    queries can sum slices of it instead of scanning SQLite.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
     Returns:
-    bool: True if stations found, False otherwise.
+    columnar.ColumnStore: The store, or None to query SQLite.
     """
 
-    # Query to find stations with a name similar to the user input
-    findStations_SQL = """
-                       SELECT Station_ID, Station_Name FROM Stations
-                       WHERE Station_Name LIKE ?
-                       GROUP BY Station_ID
-                       ORDER BY Station_Name ASC;
+    directory = getattr(dbConn, "columnStore", "")
+    if not directory:
+        return None
+
+    # numpy is only imported once a column store is configured
+    import columnar
+
+    return columnar.openStore(dbConn, directory)
+
+
+def resolveStation(station, exact=False):
+    """
+    Turn a station argument into a results.ResolvedStation.
+
+    Args:
+    station: A results.ResolvedStation, which is returned as is, or a name.
+             A name is a LIKE pattern (wildcards _ and %) covering every
+             station it matches, unless exact is True.
+    exact (bool): Treat a name as an exact, case-sensitive station name.
+
+    Returns:
+    results.ResolvedStation: The station, or None if no station matches.
+    """
+
+    if isinstance(station, results.ResolvedStation):
+        return station
+    if exact:
+        return stations.getCatalog().exact(station)
+    return stations.getCatalog().lookup(station)
+
+
+def _idPlaceholders(station) -> str:
+    """
+    Return the "?, ?" placeholder list for a resolved station's Station_IDs.
+    """
+
+    return ", ".join("?" * len(station.stationIds))
+
+
+# Day-type breakdown of ridership per station name, as a single scan of the rollup.
+# {filter} is replaced with an optional WHERE clause on Station_Name.
+dayTypeBreakdown_SQL = """
+                       SELECT Station_Name,
+                              SUM(CASE WHEN Type_of_Day = 'W' THEN Num_Riders ELSE 0 END) as Weekday,
+                              SUM(CASE WHEN Type_of_Day = 'A' THEN Num_Riders ELSE 0 END) as Saturday,
+                              SUM(CASE WHEN Type_of_Day = 'U' THEN Num_Riders ELSE 0 END) as Sunday,
+                              SUM(Num_Riders) as Total
+                       FROM Stations JOIN RidershipRollup
+                       ON Stations.Station_ID = RidershipRollup.Station_ID
+                       {filter}
+                       GROUP BY Station_Name
+                       ORDER BY Station_Name ASC
                        """
-    dbCursor.execute(findStations_SQL, [stationName])
-    result = dbCursor.fetchall()
 
-    if not result:
-        return False
 
-    # Display the matching stations
-    for row in result:
-        print(row[0], ":", row[1])
+def dayTypeBreakdown(stationNames=None) -> dict:
+    """
+    Fetch the weekday, Saturday and Sunday/holiday ridership of many
+    stations in one pass, e.g. for a nightly report.
+
+    Args:
+    stationNames (list): Exact station names to include, or None for every station.
+
+    Returns:
+    dict: Station name to results.DayTypeBreakdown.
+          Stations without ridership data are left out.
+    """
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
+    store = columnStore(dbConn)
+    if store is not None:
+        catalog = stations.getCatalog()
+        if stationNames is None:
+            stationNames = catalog.idsByName
+        breakdowns = {}
+        for stationName in sorted(set(stationNames)):
+            stationIds = catalog.idsByName.get(stationName)
+            totals = store.dayTypeTotals(stationIds) if stationIds else (0, 0, 0, 0)
+            if totals[3]:
+                breakdowns[stationName] = results.DayTypeBreakdown(stationName, *totals)
+        return breakdowns
+
+    # Ridership is summed from the precomputed rollup
+    rollups.ensureRollups(dbConn)
+
+    if stationNames is None:
+        dbCursor.execute(dayTypeBreakdown_SQL.format(filter=""))
+    else:
+        stationNames = list(stationNames)
+        if not stationNames:
+            return {}
+        placeholders = ", ".join("?" * len(stationNames))
+        dbCursor.execute(
+            dayTypeBreakdown_SQL.format(filter=f"WHERE Station_Name IN ({placeholders})"),
+            stationNames,
+        )
+
+    return {row[0]: results.DayTypeBreakdown(*row) for row in dbCursor.fetchall()}
 
 
 # Find number and percentage of riders for weekdays, Saturdays, and Sundays/holidays
+@cache.cached({"stationName": cache.exactStationKey})
 def findPercentageRiders(stationName):
     """
-    Fetch and display the percentage of ridership for weekdays, Saturdays, 
-    and Sundays/holidays for a given station.
-    
+    Fetch the ridership for weekdays, Saturdays, and Sundays/holidays
+    for a given station.
+
     Args:
-    stationName (str): The name of the station to analyze.
+    stationName (str): The exact name of the station to analyze, or a
+                       results.ResolvedStation.
+
+    Returns:
+    results.DayTypeBreakdown: The breakdown, or None if the station has no data.
     """
 
-    # Query to find total riders for the station
-    totalRiders_SQL = """
-                      SELECT SUM(Num_Riders) as Total FROM Stations
-                      JOIN Ridership 
-                      ON Stations.Station_ID = Ridership.Station_ID
-                      WHERE Station_Name = ?
-                      """
-    dbCursor.execute(totalRiders_SQL, [stationName])
-    totalRiders = (dbCursor.fetchone())[0]
+    station = resolveStation(stationName, exact=True)
+    if station is None:
+        return None
 
-    if not totalRiders:
-        print("**No data found...")
-        return
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
 
-    # Queries to find ridership for different days
-    numRidersWeekday_SQL = """
-                           SELECT SUM(Num_Riders) as Total FROM Stations
-                           JOIN Ridership 
-                           ON Stations.Station_ID = Ridership.Station_ID
-                           WHERE Station_Name = ?
-                           AND Type_of_Day = 'W'
-                           """
-    dbCursor.execute(numRidersWeekday_SQL, [stationName])
-    weekdayRes = (dbCursor.fetchone())[0]
-
-    numRidersSaturday_SQL = """
-                            SELECT SUM(Num_Riders) as Total FROM Stations
-                            JOIN Ridership 
-                            ON Stations.Station_ID = Ridership.Station_ID
-                            WHERE Station_Name = ?
-                            AND Type_of_Day = 'A'
-                            """
-    dbCursor.execute(numRidersSaturday_SQL, [stationName])
-    saturdayRes = (dbCursor.fetchone())[0]
-
-    numRidersSunday_SQL = """
-                          SELECT SUM(Num_Riders) as Total FROM Stations
-                          JOIN Ridership 
-                          ON Stations.Station_ID = Ridership.Station_ID
-                          WHERE Station_Name = ?
-                          AND Type_of_Day = 'U'
-                          """
-    dbCursor.execute(numRidersSunday_SQL, [stationName])
-    sundayRes = (dbCursor.fetchone())[0]
-
-    # Display percentage ridership for the station
-    print(f"Percentage of ridership for the {stationName} station: ")
-    print(
-        "  Weekday ridership:",
-        f"{weekdayRes:,}",
-        f"({(weekdayRes/totalRiders)*100:.2f}%)",
-    )
-    print(
-        "  Saturday ridership:",
-        f"{saturdayRes:,}",
-        f"({(saturdayRes/totalRiders)*100:.2f}%)",
-    )
-    print(
-        "  Sunday/holiday ridership:",
-        f"{sundayRes:,}",
-        f"({(sundayRes/totalRiders)*100:.2f}%)",
-    )
-    print("  Total ridership:", f"{totalRiders:,}")
+    store = columnStore(dbConn)
+    if store is not None:
+        row = store.dayTypeTotals(station.stationIds)
+    else:
+        # One query over the rollup returns the whole day-type breakdown
+        rollups.ensureRollups(dbConn)
+        dbCursor.execute(
+            f"""
+            SELECT SUM(CASE WHEN Type_of_Day = 'W' THEN Num_Riders ELSE 0 END) as Weekday,
+                   SUM(CASE WHEN Type_of_Day = 'A' THEN Num_Riders ELSE 0 END) as Saturday,
+                   SUM(CASE WHEN Type_of_Day = 'U' THEN Num_Riders ELSE 0 END) as Sunday,
+                   SUM(Num_Riders) as Total
+            FROM RidershipRollup
+            WHERE Station_ID IN ({_idPlaceholders(station)})
+            """,
+            station.stationIds,
+        )
+        row = dbCursor.fetchone()
+
+    if not row[3]:
+        return None
+
+    return results.DayTypeBreakdown(station.stationName, *row)
+
+
+def _iterRows(dbCursor, batchSize):
+    """
+    Yield the rows of an executed query, fetching batchSize at a time.
+    """
 
+    while True:
+        rows = dbCursor.fetchmany(batchSize)
+        if not rows:
+            return
+        yield from rows
 
-def stationRidershipWeekdays():
+
+def iterStationRidershipWeekdays(batchSize=fetchBatchSize):
     """
-    Fetch and display weekday ridership for all stations,
-    along with the percentage of total weekday ridership.
+    Stream weekday ridership for all stations, along with the percentage
+    of total weekday ridership. The total comes from a window over the
+    per-station sums, so one query produces both.
+
+    Args:
+    batchSize (int): Rows fetched from the cursor at a time.
+
+    Yields:
+    results.StationShare: For each station, busiest first.
     """
 
-    # Query to find total weekday ridership
-    numRidersWeekday_SQL = """
-                           SELECT SUM(Num_Riders) as Total FROM Stations
-                           JOIN Ridership 
-                           ON Stations.Station_ID = Ridership.Station_ID
-                           AND Type_of_Day = 'W'
-                           """
-    dbCursor.execute(numRidersWeekday_SQL)
-    totalRidersWeekday = (dbCursor.fetchone())[0]
+    dbConn = getConnection()
+
+    store = columnStore(dbConn)
+    if store is not None:
+        namesById = stations.getCatalog().namesById
+        byName = {}
+        for stationId, riders in store.totalsByStation("W").items():
+            if stationId in namesById:
+                byName[namesById[stationId]] = byName.get(namesById[stationId], 0) + riders
+        totalRidersWeekday = sum(byName.values())
+        for stationName, riders in sorted(byName.items(), key=lambda item: -item[1]):
+            yield results.StationShare(stationName, riders, (riders / totalRidersWeekday) * 100)
+        return
 
-    # Query to find weekday ridership for each station
+    # Ridership is summed from the precomputed rollup
+    rollups.ensureRollups(dbConn)
+
+    # Weekday ridership for each station, and of all stations alongside
     weekdayRiderAllStations_SQL = """
-                                  SELECT Station_Name, SUM(Num_Riders) as Total 
-                                  FROM Stations JOIN Ridership 
-                                  ON Stations.Station_ID = Ridership.Station_ID
+                                  SELECT Station_Name, SUM(Num_Riders) as Total,
+                                         SUM(SUM(Num_Riders)) OVER () as AllStations
+                                  FROM Stations JOIN RidershipRollup
+                                  ON Stations.Station_ID = RidershipRollup.Station_ID
                                   AND Type_of_Day = 'W'
                                   GROUP BY Station_Name
                                   ORDER BY Total DESC
                                   """
+    dbCursor = dbConn.cursor()
     dbCursor.execute(weekdayRiderAllStations_SQL)
-    res = dbCursor.fetchall()
 
-    # Display ridership for each station
-    print("Ridership on Weekdays for Each Station")
-    for row in res:
-        print(row[0], ":", f"{row[1]:,d}", f"({(row[1]/totalRidersWeekday)*100:.2f}%)")
+    for row in _iterRows(dbCursor, batchSize):
+        yield results.StationShare(row[0], row[1], (row[1] / row[2]) * 100)
+
+
+def stationRidershipWeekdays() -> list:
+    """
+    Fetch weekday ridership for all stations, along with the percentage
+    of total weekday ridership.
 
+    Returns:
+    list: results.StationShare for each station, busiest first.
+    """
+
+    return list(iterStationRidershipWeekdays())
 
 
 def checkIfLineExists(lineColor) -> bool:
@@ -204,7 +338,10 @@ def checkIfLineExists(lineColor) -> bool:
     Returns:
     bool: True if line exists, false otherwise
     """
-    
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
     checkLine_SQL = """
                     SELECT Color FROM Lines
                     WHERE Color LIKE ?
@@ -212,27 +349,30 @@ def checkIfLineExists(lineColor) -> bool:
     dbCursor.execute(checkLine_SQL, [lineColor])
     res = dbCursor.fetchone()
 
-    if res is None:
-        return False
+    return res is not None
 
 
-def lineStops(lineColor, direction) -> bool:
+def iterLineStops(lineColor, direction, batchSize=fetchBatchSize):
     """
-    Fetch and display all stops for a given line color and direction,
+    Stream all stops for a given line color and direction,
     along with ADA information.
 
     Args:
     lineColor (str): The color of the line.
     direction (str): The direction of the line (N/S/W/E).
+    batchSize (int): Rows fetched from the cursor at a time.
 
-    Returns:
-    bool: True if stops are found, False oth  erwise.
+    Yields:
+    results.LineStop: For each stop, ordered by name.
     """
 
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
     # SQL query to fetch stop names and ADA accessibility for the given line and direction
     lineStops_SQL = """
                     SELECT Stop_Name, ADA FROM Stops
-                    JOIN StopDetails 
+                    JOIN StopDetails
                     ON Stops.Stop_ID = StopDetails.Stop_ID
                     JOIN Lines ON StopDetails.Line_ID = Lines.Line_ID
                     WHERE Color LIKE ?
@@ -240,386 +380,687 @@ def lineStops(lineColor, direction) -> bool:
                     GROUP BY Stop_Name
                     ORDER BY Stop_Name ASC
                     """
-    
+
     # Execute the query with the specified line color and direction
     dbCursor.execute(lineStops_SQL, [lineColor, direction])
-    res = dbCursor.fetchall()
 
-    # Return False if no stops are found
-    if not res:
-        return False
-    else:
-        # Iterate through the results and print stop details with accessibility info
-        for row in res:
-            if row[1] == 1:
-                print(
-                    row[0], ": direction =", direction.upper(), "(handicap accessible)"
-                )
-            else:
-                print(
-                    row[0],
-                    ": direction =",
-                    direction.upper(),
-                    "(not handicap accessible)",
-                )
+    for row in _iterRows(dbCursor, batchSize):
+        yield results.LineStop(row[0], direction.upper(), row[1] == 1)
+
+
+def lineStops(lineColor, direction) -> list:
+    """
+    Fetch all stops for a given line color and direction,
+    along with ADA information.
+
+    Args:
+    lineColor (str): The color of the line.
+    direction (str): The direction of the line (N/S/W/E).
+
+    Returns:
+    list: results.LineStop for each stop, ordered by name; empty if none.
+    """
 
+    return list(iterLineStops(lineColor, direction))
 
 
-def numStopsEachLine():
+def numStopsEachLine() -> list:
     """
-    Fetch and display the number of stops for each line color, organized by direction,
+    Fetch the number of stops for each line color, organized by direction,
     and the percentage of total stops for each line color and direction combination.
-    
+
     Returns:
-    None
+    list: results.LineStopCount for each color and direction.
     """
 
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
     # SQL query to get the number of stops for each line color and direction
     numStopsLine_SQL = """
-                       SELECT Color, Direction, COUNT(Stops.Stop_ID) AS NumStops 
+                       SELECT Color, Direction, COUNT(Stops.Stop_ID) AS NumStops
                        FROM Stops
-                       JOIN StopDetails 
+                       JOIN StopDetails
                        ON Stops.Stop_ID = StopDetails.Stop_ID
                        JOIN Lines ON StopDetails.Line_ID = Lines.Line_ID
                        GROUP BY Color, Direction
                        ORDER BY Color ASC, Direction ASC
                        """
-    
+
     # Execute the query to fetch the number of stops for each line and direction
     dbCursor.execute(numStopsLine_SQL)
     res = dbCursor.fetchall()
 
     # SQL query to get the total number of stops across all lines
     numStops_SQL = "SELECT COUNT(*) FROM Stops;"
-    
+
     # Execute the query to fetch the total number of stops
     dbCursor.execute(numStops_SQL)
     stops = dbCursor.fetchone()
 
-    # Output the number of stops for each color by direction
-    print("Number of Stops For Each Color By Direction")
-    for row in res:
-        # Print color, direction, number of stops, and percentage of total stops
-        print(row[0], "going", row[1], ":", row[2], f"({(row[2]/stops[0])*100:.2f}%)")
+    return [
+        results.LineStopCount(row[0], row[1], row[2], (row[2] / stops[0]) * 100)
+        for row in res
+    ]
+
+
+def _lineColumn(rule) -> str:
+    """
+    LineRollup column holding the totals under a shared-station rule.
+
+    Raises:
+    ValueError: If rule is not one of rollups.lineRules.
+    """
+
+    if rule not in rollups.lineRules:
+        raise ValueError(f"rule must be one of {tuple(rollups.lineRules)}, not {rule!r}")
+    return rollups.lineRules[rule]
+
+
+def lineRidership(year=None, dayType=None, rule="split") -> list:
+    """
+    Fetch the ridership of every line, along with its percentage of the
+    ridership of all lines. Stations are mapped to lines through their
+    stops; rule decides how a station served by several lines counts.
+
+    Args:
+    year (str): Only count this year, or None for all years.
+    dayType (str): Only count 'W', 'A' or 'U' days, or None for all days.
+    rule (str): "split" (shared stations divided evenly among their lines,
+                the default), "full" (counted in full on each line) or
+                "exclusive" (left out); see rollups.lineRules.
+
+    Returns:
+    list: results.LineRidership for each line, busiest first.
+
+    Raises:
+    ValueError: If rule is unknown or year is not a whole number.
+    """
+
+    column = _lineColumn(rule)
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
+    # Ridership is summed from the precomputed line rollup
+    rollups.ensureLineRollups(dbConn)
+
+    lineRidership_SQL = f"""
+                        SELECT Color, SUM({column}) as Total FROM Lines
+                        JOIN LineRollup ON Lines.Line_ID = LineRollup.Line_ID
+                        WHERE (? IS NULL OR Year = ?)
+                        AND (? IS NULL OR Type_of_Day = ?)
+                        GROUP BY Color
+                        ORDER BY Total DESC, Color ASC
+                        """
+    year = None if year is None else int(year)
+    dbCursor.execute(lineRidership_SQL, [year, year, dayType, dayType])
+    res = dbCursor.fetchall()
+
+    allLines = sum(row[1] for row in res)
+    return [
+        results.LineRidership(row[0], round(row[1]), (row[1] / allLines) * 100 if allLines else 0.0)
+        for row in res
+    ]
+
+
+def lineYearlyRidership(lineColor, rule="split"):
+    """
+    Fetch the total ridership per year of a line.
+
+    Args:
+    lineColor (str): The color of the line.
+    rule (str): How stations shared with other lines count; see lineRidership().
+
+    Returns:
+    results.RidershipSeries: Years and ridership, named "<Color> Line", or
+    None if the line has no data.
+
+    Raises:
+    ValueError: If rule is unknown.
+    """
+
+    column = _lineColumn(rule)
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+    rollups.ensureLineRollups(dbConn)
+
+    lineYearly_SQL = f"""
+                     SELECT MIN(Color), printf('%04d', Year) as Year, SUM({column}) as Total
+                     FROM Lines JOIN LineRollup ON Lines.Line_ID = LineRollup.Line_ID
+                     WHERE Color LIKE ?
+                     GROUP BY Year
+                     ORDER BY Year ASC
+                     """
+    dbCursor.execute(lineYearly_SQL, [lineColor])
+    res = dbCursor.fetchall()
+
+    if not res:
+        return None
+
+    return results.RidershipSeries(
+        f"{res[0][0]} Line",
+        [row[1] for row in res],
+        [round(row[2]) for row in res],
+    )
+
+
+def lineMonthlyRidership(lineColor, year, rule="split"):
+    """
+    Fetch the total monthly ridership of a line in a given year.
+
+    Args:
+    lineColor (str): The color of the line.
+    year (str): The year for which the monthly ridership is retrieved.
+    rule (str): How stations shared with other lines count; see lineRidership().
+
+    Returns:
+    results.RidershipSeries: 'MM/YYYY' labels and ridership, named
+    "<Color> Line", or None if the line has no data that year.
+
+    Raises:
+    ValueError: If rule is unknown.
+    """
+
+    column = _lineColumn(rule)
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+    rollups.ensureLineRollups(dbConn)
+
+    lineMonthly_SQL = f"""
+                      SELECT MIN(Color), printf('%02d/%04d', Month, Year) as Month, SUM({column}) as Total
+                      FROM Lines JOIN LineRollup ON Lines.Line_ID = LineRollup.Line_ID
+                      WHERE Color LIKE ?
+                      AND Year = ?
+                      GROUP BY Month
+                      ORDER BY Month ASC
+                      """
+    dbCursor.execute(lineMonthly_SQL, [lineColor, year])
+    res = dbCursor.fetchall()
 
+    if not res:
+        return None
+
+    return results.RidershipSeries(
+        f"{res[0][0]} Line",
+        [row[1] for row in res],
+        [round(row[2]) for row in res],
+    )
 
+
+@cache.cached({"stationName": cache.stationKey})
 def totalRidershipYear(stationName):
     """
-    Fetches and displays the total ridership per year for a specified station.
-    Optionally plots the ridership trend over the years
+    Fetches the total ridership per year for a specified station.
 
     Parameters:
-    stationName (str): The name of the station for which the ridership data is retrieved.
+    stationName (str): The name of the station (wildcards _ and %), or a
+                       results.ResolvedStation.
 
     Returns:
-    None
+    results.RidershipSeries: Years and ridership, or None if there is no data.
     """
 
+    station = resolveStation(stationName)
+    if station is None:
+        return None
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
     # SQL query to get the total ridership by year for the given station
-    yearlyRidership_SQL = """
-                          SELECT strftime('%Y', Ride_Date) as Year, SUM(Num_Riders) as Total, Station_Name
-                          FROM Stations JOIN Ridership
-                          ON Stations.Station_ID = Ridership.Station_ID
-                          WHERE Station_Name LIKE ?
+    yearlyRidership_SQL = f"""
+                          SELECT printf('%04d', Year) as Year, SUM(Num_Riders) as Total
+                          FROM RidershipRollup
+                          WHERE Station_ID IN ({_idPlaceholders(station)})
                           GROUP BY Year
                           ORDER BY Year ASC
                           """
-    
-    # Execute the query with the provided station name
-    dbCursor.execute(yearlyRidership_SQL, [stationName])
-    res = dbCursor.fetchall()
 
-    # Output yearly ridership for the station
-    print(f"Yearly Ridership at {res[0][2]}")  # Access station name from query result
-    for row in res:
-        print(row[0], ":", f"{row[1]:,}")  # Print year and formatted ridership number
-
-    # Ask user if they want to plot the data
-    plot = input("Plot? (y/n) ")
+    store = columnStore(dbConn)
+    if store is not None:
+        res = [(f"{year:04d}", riders) for year, riders in store.yearlyTotals(station.stationIds)]
+    else:
+        # Execute the query with the station's IDs
+        rollups.ensureRollups(dbConn)
+        dbCursor.execute(yearlyRidership_SQL, station.stationIds)
+        res = dbCursor.fetchall()
 
-    # If user chooses to plot, prepare data for plotting
-    if plot == "y":
-        x = []  # Years
-        y = []  # Ridership counts
+    if not res:
+        return None
 
-        # Populate x and y with the years and ridership values from the query result
-        for row in res:
-            x.append(row[0])
-            y.append(row[1])
+    return results.RidershipSeries(
+        station.stationName,
+        [row[0] for row in res],
+        [row[1] for row in res],
+    )
 
-        # Set up the plot labels and title
-        figure.xlabel("Year")
-        figure.ylabel("Number of Riders")
-        figure.title(f"Yearly Ridership at {res[0][2]} Station")
-        
-        # Plot the data and display the figure
-        figure.ioff()
-        figure.plot(x, y)
-        figure.show()
 
+# Monthly ridership of a station in a year, from the rollup.
+# {ids} is replaced with the station's Station_ID placeholders.
+monthlyRidership_SQL = """
+                       SELECT printf('%02d/%04d', Month, Year) as Month, SUM(Num_Riders) as Total
+                       FROM RidershipRollup
+                       WHERE Station_ID IN ({ids})
+                       AND Year = ?
+                       GROUP BY Month
+                       ORDER BY Month ASC
+                       """
 
 
+@cache.cached({"stationName": cache.stationKey, "year": cache.yearKey})
 def monthlyRidership(stationName, year):
     """
-    Fetches and displays the total monthly ridership for a specified station in a given year.
-    Optionally plots the monthly ridership trend if the user chooses to plot.
+    Fetches the total monthly ridership for a specified station in a given year.
 
     Parameters:
-    stationName (str): The name of the station for which the ridership data is retrieved.
+    stationName (str): The name of the station (wildcards _ and %), or a
+                       results.ResolvedStation.
     year (str): The year for which the monthly ridership data is retrieved.
 
     Returns:
-    None
-    """
-
-    # SQL query to get the monthly ridership for the given station and year
-    monthlyRidership_SQL = """
-                           SELECT strftime('%m/%Y', Ride_Date) as Month, SUM(Num_Riders) as Total, Station_Name
-                           FROM Stations JOIN Ridership
-                           ON Stations.Station_ID = Ridership.Station_ID
-                           WHERE Station_Name LIKE ?
-                           AND strftime('%Y', Ride_Date) = ?
-                           GROUP BY Month
-                           ORDER BY Month ASC
-                           """
-
-    # Execute the query with station name and year as parameters
-    dbCursor.execute(monthlyRidership_SQL, [stationName, year])
-    res = dbCursor.fetchall()
+    results.RidershipSeries: 'MM/YYYY' labels and ridership. With no data the
+    series is empty and keeps the stationName passed in.
+    """
 
-    # If no results, display a message, otherwise show ridership data
-    if not res:
-        print(f"Monthly Ridership at {stationName} for {year}")
+    station = resolveStation(stationName)
+    if station is None:
+        return results.RidershipSeries(stationName, [], [])
+    if isinstance(stationName, results.ResolvedStation):
+        stationName = stationName.stationName
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
+    store = columnStore(dbConn)
+    if store is not None:
+        try:
+            res = [
+                (f"{month:02d}/{int(year):04d}", riders)
+                for month, riders in store.monthlyTotals(station.stationIds, year)
+            ]
+        except ValueError:
+            # Not a year; the SQL below matches nothing either
+            res = []
     else:
-        print(f"Monthly Ridership at {res[0][2]} for {year}")  # Access station name from query result
-        for row in res:
-            print(row[0], ":", f"{row[1]:,}")  # Print month and formatted ridership number
+        # Execute the query with the station's IDs and year as parameters
+        rollups.ensureRollups(dbConn)
+        dbCursor.execute(
+            monthlyRidership_SQL.format(ids=_idPlaceholders(station)),
+            station.stationIds + (year,),
+        )
+        res = dbCursor.fetchall()
+
+    return results.RidershipSeries(
+        station.stationName if res else stationName,
+        [row[0] for row in res],
+        [row[1] for row in res],
+    )
+
+
+def lineStationIds(lineColor) -> tuple:
+    """
+    Fetch the Station_IDs of every station with a stop on a line.
+
+    Args:
+    lineColor (str): The color of the line (wildcards _ and %).
+
+    Returns:
+    tuple: Sorted Station_IDs; empty if the line does not exist.
+    """
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
+    lineStations_SQL = """
+                       SELECT DISTINCT Stops.Station_ID FROM Stops
+                       JOIN StopDetails ON Stops.Stop_ID = StopDetails.Stop_ID
+                       JOIN Lines ON StopDetails.Line_ID = Lines.Line_ID
+                       WHERE Color LIKE ?
+                       ORDER BY Stops.Station_ID
+                       """
+    dbCursor.execute(lineStations_SQL, [lineColor])
+
+    return tuple(row[0] for row in dbCursor.fetchall())
+
+
+@cache.cached(
+    {
+        "start": cache.dateKey,
+        "end": cache.dateKey,
+        "station": cache.stationKey,
+        "line": cache.likePattern,
+    }
+)
+def ridershipTrend(start, end, granularity="monthly", station=None, line=None):
+    """
+    Fetches the ridership of a station, a line or the whole system over
+    a date range, per day, week, month or year, with year-over-year
+    changes. The range and the year before it are read in one pass; see
+    trends.py.
+
+    Parameters:
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
+    granularity (str): "daily", "weekly", "monthly" or "yearly".
+    station (str): A station name (wildcards _ and %) or a
+                   results.ResolvedStation; every station matching the
+                   pattern is included.
+    line (str): A line color. Stations served by several lines count in
+                full towards each of them. Give at most one of station
+                and line; with neither, the whole system is covered.
+
+    Returns:
+    results.RidershipTrend: The trend, or None if the station or line
+    does not exist.
+
+    Raises:
+    ValueError: If both station and line are given, the granularity is
+                unknown, or the dates are not a valid range.
+    """
+
+    # numpy is only imported once a trend is requested
+    import trends
+
+    if station is not None and line is not None:
+        raise ValueError("give a station or a line, not both")
+
+    if station is not None:
+        resolved = resolveStation(station)
+        if resolved is None:
+            return None
+        scope, stationIds = resolved.stationName, resolved.stationIds
+    elif line is not None:
+        stationIds = lineStationIds(line)
+        if not stationIds:
+            return None
+        scope = f"{line} Line"
+    else:
+        scope, stationIds = "System", None
+
+    dbConn = getConnection()
+    rollups.ensureRollups(dbConn)
+    return trends.loadTrend(
+        dbConn, scope, stationIds, start, end, granularity, columnStore(dbConn)
+    )
+
+
+def ridershipAnomalies(station=None, start=None, end=None, kind=None, limit=None):
+    """
+    Fetches the station days flagged as unusual by the last anomaly scan
+    (see anomalies.py), newest first.
+
+    Parameters:
+    station (str): Only this station (wildcards _ and %), or a
+                   results.ResolvedStation; None for every station.
+    start (str): First day, 'YYYY-MM-DD', or None.
+    end (str): Day after the last day, 'YYYY-MM-DD', or None.
+    kind (str): Only "drop" or only "spike" days, or None for both.
+    limit (int): Return at most this many days, or None for all.
+
+    Returns:
+    list: results.RidershipAnomaly for each flagged day; empty if no scan
+    has been run. None if the station does not exist.
+    """
+
+    stationFilter = ""
+    parameters = [start, start, end, end, kind, kind]
+    if station is not None:
+        resolved = resolveStation(station)
+        if resolved is None:
+            return None
+        stationFilter = f"AND Anomalies.Station_ID IN ({_idPlaceholders(resolved)})"
+        parameters += list(resolved.stationIds)
+
+    dbConn = getConnection()
+    dbCursor = dbConn.cursor()
+
+    dbCursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Anomalies';")
+    if dbCursor.fetchone() is None:
+        return []
+
+    anomalies_SQL = f"""
+                    SELECT IFNULL(Station_Name, Anomalies.Station_ID), Ride_Date, Type_of_Day,
+                           Num_Riders, Expected, Score, Kind
+                    FROM Anomalies LEFT JOIN Stations
+                    ON Anomalies.Station_ID = Stations.Station_ID
+                    WHERE (? IS NULL OR Ride_Date >= ?)
+                    AND (? IS NULL OR Ride_Date < ?)
+                    AND (? IS NULL OR Kind = ?)
+                    {stationFilter}
+                    ORDER BY Ride_Date DESC, ABS(Score) DESC
+                    LIMIT ?
+                    """
+    dbCursor.execute(anomalies_SQL, parameters + [-1 if limit is None else limit])
+
+    return [results.RidershipAnomaly(*row) for row in dbCursor.fetchall()]
+
+
+def forecastRidership(station, days=14, dayType=None):
+    """
+    Forecasts the daily ridership of a station from its stored models;
+    nothing is refitted (see forecast.py).
+
+    Parameters:
+    station (str): A station name (wildcards _ and %) or a
+                   results.ResolvedStation; every station matching the
+                   pattern is included.
+    days (int): Days to forecast, from the day after the last day of data.
+    dayType (str): Only forecast 'W', 'A' or 'U' days, or None for all.
+
+    Returns:
+    results.RidershipForecast: The forecast, or None if the station does
+    not exist or has no fitted models.
+
+    Raises:
+    ValueError: If days is out of range.
+    """
+
+    # numpy is only imported once a forecast is requested
+    import forecast
+
+    resolved = resolveStation(station)
+    if resolved is None:
+        return None
+
+    series = forecast.forecast(getConnection(), resolved.stationIds, days, dayType)
+    if series is None:
+        return None
+    return results.RidershipForecast(resolved.stationName, *series)
+
+
+def ridershipPanel(stationNames, start, end):
+    """
+    Fetches the daily ridership of any number of stations over a date
+    range, aligned on a shared calendar. Days a station did not report
+    stay marked as missing; see timeseries.StationPanel.fill().
+
+    Parameters:
+    stationNames (list): Station names (wildcards _ and %) or
+                         results.ResolvedStation, one per row.
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
 
-    # Ask user if they want to plot the data
-    plot = input("\nPlot? (y/n) ")
+    Returns:
+    timeseries.StationPanel: The aligned series, or None if a station
+    does not resolve to exactly one name.
+    """
 
-    # If user chooses to plot, prepare data for plotting
-    if plot == "y":
-        x = []  # Months
-        y = []  # Ridership counts
+    # numpy is only imported once a daily series is requested
+    import timeseries
 
-        # Populate x and y with months and ridership values from query result
-        for row in res:
-            x.append(row[0][:2]) # only takes the month from the date str
-            y.append(row[1])
+    resolved = [resolveStation(stationName) for stationName in stationNames]
+    if None in resolved:
+        return None
 
-        # Set up plot labels and title
-        figure.xlabel("Month")
-        figure.ylabel("Number of Riders")
-        figure.title(f"Monthly Ridership at {res[0][2]} Station ({year})")
+    dbConn = getConnection()
+    return timeseries.loadPanel(dbConn, resolved, start, end, columnStore(dbConn))
 
-        # Plot the data and display the figure
-        figure.ioff()
-        figure.plot(x, y)
-        figure.show()
 
+def _dailyFromPanel(panel, row):
+    """
+    Turn one row of a StationPanel into a results.DailyRidership holding
+    only the days the station reported, or None if it reported none.
+    """
 
+    days, riders = panel.reported(row)
+    if not days:
+        return None
 
-def compareRidership(station1, station2, year):
+    station = panel.stations[row]
+    return results.DailyRidership(station.stationIds[0], station.stationName, days, riders)
+
+
+def dailyRidership(stationName, year):
     """
-    Compares the daily ridership between two stations for a given year. 
-    Displays the first and last five days of ridership data for both stations 
-    and offers the option to plot the ridership trends.
+    Fetches the daily ridership of a station for a given year.
 
     Parameters:
-    station1 (str): The name of the first station for comparison.
-    station2 (str): The name of the second station for comparison.
+    stationName (str): The name of the station (wildcards _ and %), or a
+                       results.ResolvedStation.
     year (str): The year for which the ridership data is retrieved.
 
     Returns:
-    None
-    """
-
-    # SQL query to get daily ridership for a specific station in the given year
-    stationRidership_SQL = """
-                           SELECT strftime('%Y-%m-%d', Ride_Date) as Date, 
-                           SUM(Num_Riders) as Total, Stations.Station_ID, Station_Name
-                           FROM Stations JOIN Ridership
-                           ON Stations.Station_ID = Ridership.Station_ID
-                           WHERE Station_Name LIKE ?
-                           AND strftime('%Y', Ride_Date) = ?
-                           GROUP BY Date
-                           ORDER BY Date ASC
-                           """
-
-    # Execute the SQL query for the first station
-    dbCursor.execute(stationRidership_SQL, [station1, year])
-    res1 = dbCursor.fetchall()
-
-    # Execute the SQL query for the second station
-    dbCursor.execute(stationRidership_SQL, [station2, year])
-    res2 = dbCursor.fetchall()
-
-    # Display station info and the first and last five days of ridership for station 1
-    print("Station 1:", f"{res1[0][2]}", f"{res1[0][3]}")
-    for row in res1[:5]:  # First 5 days
-        print(row[0], f"{row[1]}")
-    for row in res1[-5:]:  # Last 5 days
-        print(row[0], f"{row[1]}")
-
-    # Display station info and the first and last five days of ridership for station 2
-    print("Station 2:", f"{res2[0][2]}", f"{res2[0][3]}")
-    for row in res2[:5]:  # First 5 days
-        print(row[0], f"{row[1]}")
-    for row in res2[-5:]:  # Last 5 days
-        print(row[0], f"{row[1]}")
-
-    # Ask the user if they want to plot the ridership data
-    plot = input("Plot? (y/n) ")
-
-    # If user chooses to plot, prepare data for plotting
-    if plot == "y":
-        x = []   # Dates for station 1
-        y = []   # Ridership counts for station 1
-        x2 = []  # Dates for station 2
-        y2 = []  # Ridership counts for station 2
-
-        day = 1 # counter for what day we are appending to the figure
-        # Populate x and y with data from station 1
-        for row in res1:
-            x.append(day)
-            y.append(row[1])
-            day += 1
-
-        day = 1 # reset the day counter
-        # Populate x2 and y2 with data from station 2
-        for row in res2:
-            x2.append(day)
-            y2.append(row[1])
-            day += 1
-
-        # Set up plot labels, title, and legend
-        figure.xlabel("Day")
-        figure.ylabel("Number of Riders")
-        figure.title(f"Ridership Each Day of {year}")
-        figure.plot(x, y, label=res1[0][3])   # Plot for station 1
-        figure.plot(x2, y2, label=res2[0][3]) # Plot for station 2
-        figure.legend()  # Display the legend for station names
-        
-
-        # Show the plot
-        figure.ioff()
-        figure.show()
+    results.DailyRidership: The daily series, or None if there is no data.
 
+    Raises:
+    ValueError: If year is not a whole number.
+    """
 
+    panel = ridershipPanel([stationName], *dates.yearRange(year))
+    if panel is None:
+        return None
 
-def checkIfStationExists(stationName) -> bool:
+    return _dailyFromPanel(panel, 0)
+
+
+@cache.cached(
+    {"station1": cache.stationKey, "station2": cache.stationKey, "year": cache.yearKey}
+)
+def compareRidership(station1, station2, year) -> list:
     """
-    Helper function to check if a station exists in the database. 
-    It verifies if there is exactly one matching station. 
-    If multiple stations or none are found, it returns False and provides a message.
-    
+    Fetches the daily ridership of two stations for a given year, for
+    comparison. Both stations are loaded in one query onto the same
+    calendar, so the n-th day of each series is looked up by date rather
+    than by position.
+
     Parameters:
-    stationName (str): The name of the station to check.
-    
+    station1 (str): The name of the first station for comparison, or a
+                    results.ResolvedStation.
+    station2 (str): The name of the second station for comparison, or a
+                    results.ResolvedStation.
+    year (str): The year for which the ridership data is retrieved.
+
     Returns:
-    bool: True if exactly one station is found, False otherwise.
+    list: results.DailyRidership for each station; an entry is None when
+    that station has no data for the year.
+
+    Raises:
+    ValueError: If year is not a whole number.
     """
 
-    # SQL query to check if the station exists and is unique in the database
-    checkStations_SQL = """
-                        SELECT Station_Name FROM Stations
-                        WHERE Station_Name LIKE ?
-                        GROUP BY Station_Name
-                        """
-    
-    # Execute the SQL query with the provided station name
-    dbCursor.execute(checkStations_SQL, [stationName])
-    res = dbCursor.fetchall()
+    start, end = dates.yearRange(year)
 
-    # If multiple stations are found, return False and notify the user
-    if len(res) > 1:
-        print("**Multiple stations found...")
-        return False
+    resolved = [resolveStation(station1), resolveStation(station2)]
+    found = [station for station in resolved if station is not None]
+    if not found:
+        return [None, None]
 
-    # If no station is found, return False and notify the user
-    if not res:
-        print("**No station found...")
-        return False
+    panel = ridershipPanel(found, start, end)
+    series = iter([_dailyFromPanel(panel, row) for row in range(len(found))])
+
+    return [None if station is None else next(series) for station in resolved]
 
-    # If exactly one station is found, return True
-    return True
 
+def stationNameMatches(stationName) -> list:
+    """
+    Resolve a name pattern to the distinct stations it matches, in one
+    step: the result both answers whether the station exists and carries
+    the Station_IDs the ridership queries filter on.
+
+    Parameters:
+    stationName (str): The name of the station (wildcards _ and %).
+
+    Returns:
+    list: results.ResolvedStation for each matching name.
+    """
+
+    return stations.getCatalog().resolve(stationName)
 
 
-def findNearbyStations(latitude, longitude):
+def checkIfStationExists(stationName) -> bool:
     """
-    Finds and displays stations within a mile of the specified latitude and longitude.
-    Optionally plots the stations on a map if requested.
-    
+    Helper function to check if a station exists in the database.
+    It verifies if there is exactly one matching station.
+
+    Parameters:
+    stationName (str): The name of the station to check.
+
+    Returns:
+    bool: True if exactly one station is found, False otherwise.
+    """
+
+    return len(stationNameMatches(stationName)) == 1
+
+
+def findNearbyStations(latitude, longitude, radius=1.0, limit=None) -> list:
+    """
+    Finds the station stops within a radius of the specified latitude and
+    longitude, using true great-circle distance.
+
     Parameters:
     latitude (float): The latitude point.
     longitude (float): The longitude point.
-    
+    radius (float): Search radius in miles.
+    limit (int): Return at most this many stops (the nearest ones).
+
     Returns:
-    None
-    """
-
-    # Degrees of latitude and longitude corresponding to approximately one mile
-    latitudeMin = round(latitude - 1 / 69, 3)
-    latitudeMax = round(latitude + 1 / 69, 3)
-    longitudeMin = round(longitude - 1 / 51, 3)
-    longitudeMax = round(longitude + 1 / 51, 3)
-
-    # SQL query to find nearby stations within the specified latitude and longitude bounds
-    findNearbyStations_SQL = """
-                             SELECT Station_Name, Latitude, Longitude
-                             FROM Stations JOIN Stops
-                             ON Stations.Station_ID = Stops.Station_ID
-                             WHERE Latitude >= ? AND Latitude <= ?
-                             AND Longitude >= ? AND Longitude <= ?
-                             GROUP BY Station_Name, Latitude, Longitude
-                             ORDER BY Station_Name ASC, Latitude DESC
-                             """
-
-    # Execute the SQL query with the calculated bounds
-    dbCursor.execute(
-        findNearbyStations_SQL, [latitudeMin, latitudeMax, longitudeMin, longitudeMax]
-    )
-    res = dbCursor.fetchall()
+    list: results.NearbyStation for each stop found, nearest first; empty if none.
+    """
 
-    # Check if any stations were found
-    if not res:
-        print("**No stations found...")
-        return
+    # numpy is only imported once a nearby search is requested
+    import spatial
 
-    # Print the list of nearby stations
-    print("\nList of Stations Within a Mile")
-    for row in res:
-        print(row[0], ":", f"({row[1]}, {row[2]})")
+    stopIndex = spatial.getStopIndex()
 
-    # Prompt the user to plot the stations on a map
-    plot = input("Plot? (y/n) ")
+    return [
+        results.NearbyStation(
+            stopIndex.names[index],
+            float(stopIndex.latitudes[index]),
+            float(stopIndex.longitudes[index]),
+            distance,
+        )
+        for index, distance in stopIndex.withinRadius(latitude, longitude, radius, limit)
+    ]
 
-    if plot == "y":
-        x = []  # List to store longitudes
-        y = []  # List to store latitudes
 
-        # Populate the lists with latitude and longitude of each station
-        for row in res:
-            x.append(row[2])
-            y.append(row[1])
+def findNearestStations(latitude, longitude, k=1, maxRadius=None) -> list:
+    """
+    Finds the k station stops nearest to the specified latitude and longitude.
 
-        # Load and display the map image
-        image = figure.imread("chicago.png")
-        xydims = [-87.9277, -87.5569, 41.7012, 42.0868]
-        figure.imshow(image, extent=xydims)
+    Parameters:
+    latitude (float): The latitude point.
+    longitude (float): The longitude point.
+    k (int): Number of stops to return.
+    maxRadius (float): Ignore stops further than this many miles.
 
-        figure.title("Stations Near You")
+    Returns:
+    list: results.NearbyStation for each stop found, nearest first.
+    """
 
-        # Plot the stations on the map
-        figure.plot(x, y, 'o')
+    # numpy is only imported once a nearby search is requested
+    import spatial
 
-        # Annotate each point with the station name
-        for row in res:
-            figure.annotate(row[0], (row[2], row[1]))
-            figure.xlim([-87.9277, -87.5569])
-            figure.ylim([41.7012, 42.0868])
+    stopIndex = spatial.getStopIndex()
 
-        # Show the plotted map
-        figure.show()
\ No newline at end of file
+    return [
+        results.NearbyStation(
+            stopIndex.names[index],
+            float(stopIndex.latitudes[index]),
+            float(stopIndex.longitudes[index]),
+            distance,
+        )
+        for index, distance in stopIndex.nearest(latitude, longitude, k, maxRadius)
+    ]
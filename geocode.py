@@ -0,0 +1,382 @@
+"""
+Bulk nearest-station assignment for the CTA L analysis app.
+
+Reads a CSV or Parquet file of coordinates (rider surveys, trip records)
+in chunks and assigns each point its nearest L station stops, or every
+stop within a radius, writing the assignments with distances in miles.
+
+Points and stops are turned into unit vectors on the sphere, so a whole
+block of points is compared against every stop with a single matrix
+product: the stop with the largest dot product is the nearest. Distances
+of the chosen stops are then computed exactly with the haversine formula.
+
+    python geocode.py trips.csv assignments.csv --lat-col lat --lon-col lon
+    python geocode.py survey.parquet near.csv --radius 0.5
+
+Parquet input needs pyarrow.
+"""
+
+import argparse
+import csv
+import sys
+import time
+
+import numpy as np
+
+import database
+import spatial
+
+# Points compared against the stop catalog per matrix product; bounds the
+# size of the points x stops matrix
+blockSize = 8192
+
+
+def unitVectors(latitudes, longitudes):
+    """
+    Convert coordinates in degrees to unit vectors on the sphere.
+
+    Args:
+    latitudes (np.ndarray): Latitudes in degrees.
+    longitudes (np.ndarray): Longitudes in degrees.
+
+    Returns:
+    np.ndarray: An (n, 3) array of unit vectors.
+    """
+
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    cosLat = np.cos(lat)
+    return np.column_stack((cosLat * np.cos(lon), cosLat * np.sin(lon), np.sin(lat)))
+
+
+def _pairDistances(latitudes, longitudes, stopLatitudes, stopLongitudes):
+    """
+    Haversine distance in miles between matching pairs of points.
+    """
+
+    lat1 = np.radians(latitudes)
+    lat2 = np.radians(stopLatitudes)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(np.radians(stopLongitudes - longitudes) / 2) ** 2
+    )
+    return 2 * spatial.earthRadius * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class StopMatcher:
+    """
+    Vectorized nearest and within-radius matching against a StopIndex.
+    """
+
+    def __init__(self, stopIndex):
+        """
+        Args:
+        stopIndex (spatial.StopIndex): The stops to match against.
+        """
+
+        self.stopIndex = stopIndex
+        self.stopVectors = unitVectors(stopIndex.latitudes, stopIndex.longitudes)
+        # Output fields of each stop, formatted once
+        self.stopFields = [
+            (name, str(latitude), str(longitude))
+            for name, latitude, longitude in zip(
+                stopIndex.names, stopIndex.latitudes.tolist(), stopIndex.longitudes.tolist()
+            )
+        ]
+
+    def nearest(self, latitudes, longitudes, k=1):
+        """
+        Find the k nearest stops of every point.
+
+        Args:
+        latitudes (np.ndarray): Latitudes of the points.
+        longitudes (np.ndarray): Longitudes of the points.
+        k (int): Stops to find per point.
+
+        Returns:
+        tuple: (stop indices, distances in miles), each of shape (n, k),
+        nearest first. Points with missing or infinite coordinates get
+        index -1 and distance NaN.
+        """
+
+        count = len(latitudes)
+        k = min(k, len(self.stopIndex))
+        stops = np.full((count, k), -1, dtype=np.int64)
+        distances = np.full((count, k), np.nan)
+        if k == 0:
+            return stops, distances
+
+        valid = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+
+        for start in range(0, len(valid), blockSize):
+            rows = valid[start:start + blockSize]
+            similarity = unitVectors(latitudes[rows], longitudes[rows]) @ self.stopVectors.T
+
+            # Largest dot product = smallest angle = nearest stop
+            if k == 1:
+                best = np.argmax(similarity, axis=1)[:, None]
+            else:
+                best = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(similarity, best, axis=1), axis=1)
+                best = np.take_along_axis(best, order, axis=1)
+
+            stops[rows] = best
+            distances[rows] = _pairDistances(
+                latitudes[rows, None],
+                longitudes[rows, None],
+                self.stopIndex.latitudes[best],
+                self.stopIndex.longitudes[best],
+            )
+
+        return stops, distances
+
+    def withinRadius(self, latitudes, longitudes, radius):
+        """
+        Find every stop within a radius of every point.
+
+        Args:
+        latitudes (np.ndarray): Latitudes of the points.
+        longitudes (np.ndarray): Longitudes of the points.
+        radius (float): Radius in miles.
+
+        Returns:
+        tuple: (point indices, stop indices, distances in miles) for each
+        matching pair, ordered by point then distance.
+        """
+
+        # Points within the radius have a dot product of at least this
+        threshold = np.cos(radius / spatial.earthRadius)
+        valid = np.flatnonzero(np.isfinite(latitudes) & np.isfinite(longitudes))
+
+        pointParts, stopParts = [], []
+        for start in range(0, len(valid), blockSize):
+            rows = valid[start:start + blockSize]
+            similarity = unitVectors(latitudes[rows], longitudes[rows]) @ self.stopVectors.T
+            pointHits, stopHits = np.nonzero(similarity >= threshold)
+            pointParts.append(rows[pointHits])
+            stopParts.append(stopHits)
+
+        if not pointParts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0)
+
+        points = np.concatenate(pointParts)
+        stops = np.concatenate(stopParts)
+        distances = _pairDistances(
+            latitudes[points],
+            longitudes[points],
+            self.stopIndex.latitudes[stops],
+            self.stopIndex.longitudes[stops],
+        )
+
+        # The dot-product test can let in pairs a hair past the radius
+        inside = distances <= radius
+        points, stops, distances = points[inside], stops[inside], distances[inside]
+
+        order = np.lexsort((distances, points))
+        return points[order], stops[order], distances[order]
+
+
+def _toFloats(values):
+    """
+    Parse coordinate strings, turning blanks and junk into NaN.
+    """
+
+    parsed = np.empty(len(values))
+    for index, value in enumerate(values):
+        try:
+            parsed[index] = float(value)
+        except (TypeError, ValueError):
+            parsed[index] = np.nan
+    return parsed
+
+
+def readPointChunks(path, latColumn, lonColumn, idColumn=None, chunkSize=100000):
+    """
+    Stream points from a CSV or Parquet file.
+
+    Args:
+    path (str): The input file; .parquet files are read with pyarrow.
+    latColumn (str): Name of the latitude column.
+    lonColumn (str): Name of the longitude column.
+    idColumn (str): Column identifying each point, or None to use the
+                    row number (starting at 1).
+    chunkSize (int): Points per chunk.
+
+    Yields:
+    tuple: (ids, latitudes, longitudes) with ids a list and the
+    coordinates float arrays.
+    """
+
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as parquet
+        except ImportError:
+            raise ImportError("reading Parquet files needs pyarrow (pip install pyarrow)") from None
+
+        columns = [latColumn, lonColumn] + ([idColumn] if idColumn else [])
+        rowNumber = 0
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunkSize, columns=columns):
+            latitudes = batch.column(latColumn).to_numpy(zero_copy_only=False).astype(np.float64)
+            longitudes = batch.column(lonColumn).to_numpy(zero_copy_only=False).astype(np.float64)
+            if idColumn:
+                ids = batch.column(idColumn).to_pylist()
+            else:
+                ids = list(range(rowNumber + 1, rowNumber + batch.num_rows + 1))
+            rowNumber += batch.num_rows
+            yield ids, latitudes, longitudes
+        return
+
+    with open(path, newline="") as pointFile:
+        reader = csv.reader(pointFile)
+        header = next(reader)
+        latIndex = header.index(latColumn)
+        lonIndex = header.index(lonColumn)
+        idIndex = header.index(idColumn) if idColumn else None
+
+        rowNumber = 0
+        while True:
+            rows = [row for _, row in zip(range(chunkSize), reader)]
+            if not rows:
+                return
+
+            if idIndex is None:
+                ids = list(range(rowNumber + 1, rowNumber + len(rows) + 1))
+            else:
+                ids = [row[idIndex] for row in rows]
+            rowNumber += len(rows)
+
+            yield (
+                ids,
+                _toFloats([row[latIndex] if len(row) > latIndex else None for row in rows]),
+                _toFloats([row[lonIndex] if len(row) > lonIndex else None for row in rows]),
+            )
+
+
+assignmentColumns = [
+    "point_id",
+    "rank",
+    "station_name",
+    "stop_latitude",
+    "stop_longitude",
+    "distance_miles",
+]
+
+
+def assignChunk(matcher, ids, latitudes, longitudes, k=1, radius=None):
+    """
+    Match one chunk of points and build its output rows.
+
+    Args:
+    matcher (StopMatcher): The stop matcher.
+    ids (list): Identifier of each point.
+    latitudes (np.ndarray): Latitudes of the points.
+    longitudes (np.ndarray): Longitudes of the points.
+    k (int): Nearest stops per point, when radius is None.
+    radius (float): Return every stop within this many miles instead.
+
+    Returns:
+    list: Rows with the fields in assignmentColumns. In nearest mode
+    points with missing coordinates get a row with empty station fields.
+    """
+
+    stopFields = matcher.stopFields
+
+    if radius is not None:
+        points, stops, distances = matcher.withinRadius(latitudes, longitudes, radius)
+        # Rank of each pair within its point: position minus the point's first position
+        firsts = np.flatnonzero(np.r_[True, points[1:] != points[:-1]])
+        ranks = np.arange(len(points)) - np.repeat(firsts, np.diff(np.r_[firsts, len(points)])) + 1
+        return [
+            (ids[point], rank) + stopFields[stop] + (f"{distance:.4f}",)
+            for point, rank, stop, distance in zip(
+                points.tolist(), ranks.tolist(), stops.tolist(), distances.tolist()
+            )
+        ]
+
+    stops, distances = matcher.nearest(latitudes, longitudes, k)
+    rows = []
+    # Plain lists are much faster than indexing arrays one element at a time
+    for pointId, pointStops, pointDistances in zip(ids, stops.tolist(), distances.tolist()):
+        for rank, (stop, distance) in enumerate(zip(pointStops, pointDistances), start=1):
+            if stop < 0:
+                rows.append((pointId, "", "", "", "", ""))
+                break
+            rows.append((pointId, rank) + stopFields[stop] + (f"{distance:.4f}",))
+
+    return rows
+
+
+def assignFile(inputPath, outputPath, latColumn, lonColumn, idColumn=None,
+               k=1, radius=None, chunkSize=100000, progress=None):
+    """
+    Assign stations to every point of a file, streaming it in chunks.
+
+    Args:
+    inputPath (str): CSV or Parquet file of points.
+    outputPath (str): CSV file the assignments are written to.
+    latColumn (str): Name of the latitude column.
+    lonColumn (str): Name of the longitude column.
+    idColumn (str): Column identifying each point, or None for row numbers.
+    k (int): Nearest stops per point, when radius is None.
+    radius (float): Write every stop within this many miles instead.
+    chunkSize (int): Points read per chunk.
+    progress (function): Called with (points done, seconds elapsed) after each chunk.
+
+    Returns:
+    tuple: (points read, rows written, seconds elapsed).
+    """
+
+    matcher = StopMatcher(spatial.loadStopIndex(database.getConnection()))
+    started = time.perf_counter()
+    numPoints = numRows = 0
+
+    with open(outputPath, "w", newline="") as outputFile:
+        writer = csv.writer(outputFile)
+        writer.writerow(assignmentColumns)
+
+        for ids, latitudes, longitudes in readPointChunks(
+            inputPath, latColumn, lonColumn, idColumn, chunkSize
+        ):
+            rows = assignChunk(matcher, ids, latitudes, longitudes, k, radius)
+            writer.writerows(rows)
+            numPoints += len(ids)
+            numRows += len(rows)
+            if progress is not None:
+                progress(numPoints, time.perf_counter() - started)
+
+    return numPoints, numRows, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign the nearest L stations to a file of coordinates.")
+    parser.add_argument("input", help="CSV or Parquet file of points")
+    parser.add_argument("output", help="CSV file to write the assignments to")
+    parser.add_argument("--lat-col", default="latitude", help="latitude column (default: latitude)")
+    parser.add_argument("--lon-col", default="longitude", help="longitude column (default: longitude)")
+    parser.add_argument("--id-col", help="column identifying each point (default: row number)")
+    parser.add_argument("--k", type=int, default=1, help="nearest stations per point (default: 1)")
+    parser.add_argument("--radius", type=float, help="write every station within this many miles instead")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="points per chunk (default: 100000)")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    def progress(numPoints, elapsed):
+        print(f"\r{numPoints:,} points ({numPoints / max(elapsed, 1e-9):,.0f}/sec)", end="", file=sys.stderr)
+
+    numPoints, numRows, elapsed = assignFile(
+        args.input, args.output, args.lat_col, args.lon_col, args.id_col,
+        args.k, args.radius, args.chunk_size, progress,
+    )
+    print(file=sys.stderr)
+    print(
+        f"Assigned {numPoints:,} points ({numRows:,} rows) in {elapsed:.1f} s,",
+        f"{numPoints / max(elapsed, 1e-9):,.0f} points/sec",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Ridership indexes for the CTA L analysis app.
+
+Creates the composite indexes the date-range and day-type queries rely on,
+and checks with EXPLAIN QUERY PLAN that the app's hot queries actually use
+them (or the rollup's primary key).
+Run this file directly to print the plan check for the configured database.
+"""
+
+import database
+import rollups
+
+# Index name -> CREATE statement
+ridershipIndexes = {
+    "Ridership_Station_Date": """
+                              CREATE INDEX IF NOT EXISTS Ridership_Station_Date
+                              ON Ridership (Station_ID, Ride_Date)
+                              """,
+    "Ridership_DayType_Station": """
+                                 CREATE INDEX IF NOT EXISTS Ridership_DayType_Station
+                                 ON Ridership (Type_of_Day, Station_ID)
+                                 """,
+}
+
+# Station_IDs and dates the plan checks fill the queries in with
+sampleStationIds = (40380, 41660)
+sampleRange = ("2019-01-01", "2020-01-01")
+
+
+def planChecks() -> list:
+    """
+    The queries the app runs on its hot paths, each with sample parameters
+    and the index it must use. The SQL is taken from the modules that run
+    it, so the checks follow any change to those queries.
+
+    Returns:
+    list: (description, sql, params, index name) for each query.
+    """
+
+    # Imported here since these modules import this one
+    import anomalies
+    import functions
+    import timeseries
+    import trends
+
+    ids = ", ".join("?" * len(sampleStationIds))
+    start, end = sampleRange
+    return [
+        (
+            "monthly ridership of a station from the rollup",
+            functions.monthlyRidership_SQL.format(ids=ids),
+            [*sampleStationIds, int(start[:4])],
+            "sqlite_autoindex_RidershipRollup_1",
+        ),
+        (
+            "daily ridership of stations over a date range",
+            trends.dailyRows_SQL.format(
+                dateColumn="Ride_Date", stationFilter=f"AND Station_ID IN ({ids})"
+            ),
+            [start, start, end, *sampleStationIds],
+            "Ridership_Station_Date",
+        ),
+        (
+            "station panel over a date range",
+            timeseries.panelRows_SQL.format(ids=ids),
+            [start, *sampleStationIds, start, end],
+            "Ridership_Station_Date",
+        ),
+        (
+            "series extended by an incremental anomaly scan",
+            anomalies.incrementalRows_SQL,
+            [0, anomalies.defaultWindow - 1],
+            "Ridership_Station_Date",
+        ),
+    ]
+
+
+def ensureIndexes(dbConn):
+    """
+    Create any of the ridership indexes that do not exist yet.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    None
+    """
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute("SELECT name FROM sqlite_master WHERE type = 'index';")
+    existing = {row[0] for row in dbCursor.fetchall()}
+
+    # Read-only connections run the queries without the missing indexes
+    missing = [name for name in ridershipIndexes if name not in existing]
+    if not missing or database.isReadOnly(dbConn):
+        return
+
+    for name in missing:
+        dbCursor.execute(ridershipIndexes[name])
+
+    # Without statistics the planner tends to scan Ridership and probe
+    # Stations, so gather a sample-based ANALYZE once the indexes exist
+    dbCursor.execute("PRAGMA analysis_limit = 1000;")
+    dbCursor.execute("ANALYZE;")
+    dbConn.commit()
+
+
+def queryPlan(dbCursor, sql, params=()) -> list:
+    """
+    Return the EXPLAIN QUERY PLAN detail lines for a query.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+    sql (str): The query to explain.
+    params (list): The query parameters.
+
+    Returns:
+    list: The detail text of each plan step.
+    """
+
+    dbCursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    return [row[3] for row in dbCursor.fetchall()]
+
+
+def usesIndex(dbCursor, sql, params, indexName) -> bool:
+    """
+    Check whether SQLite plans to use the given index for a query.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+    sql (str): The query to explain.
+    params (list): The query parameters.
+    indexName (str): The index that should appear in the plan.
+
+    Returns:
+    bool: True if any plan step uses the index, False otherwise.
+    """
+
+    return any(
+        f"INDEX {indexName}" in detail for detail in queryPlan(dbCursor, sql, params)
+    )
+
+
+def checkIndexUse(dbCursor) -> list:
+    """
+    Run every query in planChecks() through EXPLAIN QUERY PLAN. The
+    rollup must exist, see rollups.ensureRollups().
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    list: (description, index name, used) for each check.
+    """
+
+    return [
+        (description, indexName, usesIndex(dbCursor, sql, params, indexName))
+        for description, sql, params, indexName in planChecks()
+    ]
+
+
+if __name__ == "__main__":
+    dbConn = database.connect()
+    ensureIndexes(dbConn)
+    rollups.ensureRollups(dbConn)
+
+    for description, indexName, used in checkIndexUse(dbConn.cursor()):
+        print(description, ":", indexName, "used" if used else "NOT USED")
@@ -0,0 +1,413 @@
+"""
+Incremental ingest of daily ridership extracts for the CTA L analysis app.
+
+Loads CSV extracts into Ridership without rebuilding the database. Both
+the city data portal layout (station_id, stationname, date, daytype,
+rides, with MM/DD/YYYY dates) and the database's own column names
+(Station_ID, Ride_Date, Type_of_Day, Num_Riders) are understood.
+
+Each file is streamed in chunks and upserted with executemany into a
+temporary staging table keyed on (Station_ID, Ride_Date), so a day that
+appears twice in the extracts keeps its last value. The staged rows are
+then appended to Ridership in one statement, skipping station days that
+are already loaded; everything runs in one transaction. Afterwards the
+rollup is advanced by the appended rows only, the saved general
+statistics are carried forward, a configured column store merges the
+new rows, and if anomalies have been scanned for (see anomalies.py) or
+forecast models fitted (see forecast.py) the new days are scored and
+the models refit. Rows that do not parse, or whose day type is not W, A
+or U, are rejected; the first few are reported with their line numbers.
+
+    python ingest.py ridership-2024.csv
+    python ingest.py corrections.csv --replace
+
+--replace overwrites station days that are already loaded instead of
+skipping them; as that rewrites old rows, the rollup is rebuilt.
+"""
+
+import argparse
+import csv
+import datetime
+import sys
+import time
+
+import database
+import indexes
+import rollups
+import stations
+import stats
+
+# Rows read from an extract per executemany()
+chunkSize = 50000
+
+# Type_of_Day codes: weekday, Saturday, Sunday or holiday
+dayTypes = ("W", "A", "U")
+
+# Rejected rows described in IngestReport.rejections, per ingest
+maxRejections = 20
+
+# Accepted header names (lower case) of each Ridership column
+columnAliases = {
+    "Station_ID": ("station_id", "stationid"),
+    "Ride_Date": ("ride_date", "date"),
+    "Type_of_Day": ("type_of_day", "daytype"),
+    "Num_Riders": ("num_riders", "rides"),
+    "Station_Name": ("station_name", "stationname"),
+}
+
+createStage_SQL = """
+                  CREATE TEMP TABLE IF NOT EXISTS IngestStage (
+                      Station_ID INTEGER NOT NULL,
+                      Ride_Date TEXT NOT NULL,
+                      Type_of_Day TEXT NOT NULL,
+                      Num_Riders INTEGER NOT NULL,
+                      Station_Name TEXT,
+                      PRIMARY KEY (Station_ID, Ride_Date)
+                  )
+                  """
+
+stageRow_SQL = """
+               INSERT INTO temp.IngestStage VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (Station_ID, Ride_Date) DO UPDATE
+               SET Type_of_Day = excluded.Type_of_Day,
+                   Num_Riders = excluded.Num_Riders,
+                   Station_Name = IFNULL(excluded.Station_Name, Station_Name)
+               """
+
+# Staged station days that Ridership already has
+_loaded_SQL = """
+              EXISTS (SELECT 1 FROM Ridership
+                      WHERE Ridership.Station_ID = IngestStage.Station_ID
+                      AND Ridership.Ride_Date = IngestStage.Ride_Date)
+              """
+
+
+class IngestReport:
+    """
+    What an ingest did, and how fast.
+    """
+
+    def __init__(self):
+        self.rowsRead = 0
+        self.rowsRejected = 0
+        # "path, line n: reason" for the first maxRejections rejected rows
+        self.rejections = []
+        self.rowsStaged = 0
+        self.rowsSkipped = 0
+        self.rowsReplaced = 0
+        self.rowsInserted = 0
+        self.stationsAdded = 0
+        self.anomaliesFlagged = None
+        self.modelsRefit = None
+        self.seconds = 0.0
+
+    def rowsPerSecond(self) -> float:
+        """
+        Extract rows processed per second.
+        """
+
+        return self.rowsRead / self.seconds if self.seconds else 0.0
+
+    def reject(self, path, lineNumber, reason):
+        """
+        Count a rejected extract row, keeping the first few reasons.
+        """
+
+        self.rowsRejected += 1
+        if len(self.rejections) < maxRejections:
+            self.rejections.append(f"{path}, line {lineNumber}: {reason}")
+
+    def __str__(self):
+        derived = ""
+        if self.anomaliesFlagged is not None:
+            derived += f", {self.anomaliesFlagged:,} anomalies flagged"
+        if self.modelsRefit is not None:
+            derived += f", {self.modelsRefit:,} forecast models refit"
+        return (
+            f"{self.rowsRead:,} rows read, {self.rowsInserted:,} inserted, "
+            f"{self.rowsSkipped:,} already loaded, {self.rowsReplaced:,} replaced, "
+            f"{self.rowsRejected:,} rejected, {self.stationsAdded:,} new stations{derived} "
+            f"in {self.seconds:.2f} s ({self.rowsPerSecond():,.0f} rows/sec)"
+        )
+
+
+def parseDate(value) -> str:
+    """
+    Normalize an extract date to 'YYYY-MM-DD'.
+
+    Args:
+    value (str): 'MM/DD/YYYY', or 'YYYY-MM-DD' optionally followed by a time.
+
+    Returns:
+    str: The date.
+
+    Raises:
+    ValueError: If the date is in neither form.
+    """
+
+    value = value.strip()
+    if "/" in value:
+        month, day, year = value.split(" ")[0].split("/")
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+    return datetime.date.fromisoformat(value[:10]).isoformat()
+
+
+def dayTypeOf(date) -> str:
+    """
+    Type_of_Day of a 'YYYY-MM-DD' date when an extract leaves it out:
+    'A' for Saturdays, 'U' for Sundays, 'W' otherwise. Holidays cannot be
+    told apart and count as weekdays.
+    """
+
+    weekday = datetime.date.fromisoformat(date).weekday()
+    return "A" if weekday == 5 else "U" if weekday == 6 else "W"
+
+
+def _columnIndexes(header) -> dict:
+    """
+    Map Ridership column names to their positions in an extract's header.
+    """
+
+    positions = {name.strip().lower(): index for index, name in enumerate(header)}
+    found = {}
+    for column, aliases in columnAliases.items():
+        for alias in aliases:
+            if alias in positions:
+                found[column] = positions[alias]
+                break
+
+    missing = {"Station_ID", "Ride_Date", "Num_Riders"} - set(found)
+    if missing:
+        raise ValueError(f"extract has no column for {', '.join(sorted(missing))}")
+    return found
+
+
+def readExtract(path, report, dateSuffix=""):
+    """
+    Stream an extract as staging rows, chunkSize rows at a time.
+
+    Args:
+    path (str): The CSV file.
+    report (IngestReport): Counts read and rejected rows.
+    dateSuffix (str): Appended to each 'YYYY-MM-DD' date so new rows match
+                      the stored Ride_Date format, e.g. "T00:00:00.000".
+
+    Yields:
+    list: (Station_ID, Ride_Date, Type_of_Day, Num_Riders, Station_Name) rows.
+    Nothing for an empty file.
+    """
+
+    with open(path, newline="") as extractFile:
+        reader = csv.reader(extractFile)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = _columnIndexes(header)
+        stationCol = columns["Station_ID"]
+        dateCol = columns["Ride_Date"]
+        ridersCol = columns["Num_Riders"]
+        typeCol = columns.get("Type_of_Day")
+        nameCol = columns.get("Station_Name")
+
+        # Every station repeats the same dates; parse each one once
+        parsedDates = {}
+
+        chunk = []
+        for row in reader:
+            report.rowsRead += 1
+            try:
+                parsed = parsedDates.get(row[dateCol])
+                if parsed is None:
+                    date = parseDate(row[dateCol])
+                    parsed = parsedDates[row[dateCol]] = (date + dateSuffix, dayTypeOf(date))
+                dayType = row[typeCol].strip().upper() if typeCol is not None else ""
+                if dayType and dayType not in dayTypes:
+                    raise ValueError(f"unknown Type_of_Day {row[typeCol].strip()!r}")
+                chunk.append((
+                    int(row[stationCol]),
+                    parsed[0],
+                    dayType or parsed[1],
+                    int(row[ridersCol].replace(",", "")),
+                    row[nameCol].strip() if nameCol is not None else None,
+                ))
+            except (ValueError, IndexError) as error:
+                reason = "missing columns" if isinstance(error, IndexError) else str(error)
+                report.reject(path, reader.line_num, reason)
+                continue
+
+            if len(chunk) >= chunkSize:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def _dateSuffix(dbCursor) -> str:
+    """
+    The time part stored after the date in Ride_Date, e.g. "T00:00:00.000".
+    """
+
+    dbCursor.execute("SELECT Ride_Date FROM Ridership LIMIT 1;")
+    row = dbCursor.fetchone()
+    return row[0][10:] if row is not None else "T00:00:00.000"
+
+
+def ingest(dbConn, paths, replace=False) -> IngestReport:
+    """
+    Load extracts into Ridership and bring the derived data up to date.
+
+    Args:
+    dbConn (sqlite3.Connection): Writable connection to the ridership database.
+    paths (list): CSV extracts to load, in order; later files win for a
+                  station day that appears more than once.
+    replace (bool): Overwrite station days already in Ridership instead of
+                    skipping them.
+
+    Returns:
+    IngestReport: Row counts and timing.
+
+    Raises:
+    ValueError: If the connection is read-only or an extract lacks a
+                required column.
+    """
+
+    if database.isReadOnly(dbConn):
+        raise ValueError("cannot ingest through a read-only connection")
+
+    report = IngestReport()
+    started = time.perf_counter()
+
+    # The skip check looks up every staged row by (Station_ID, Ride_Date)
+    indexes.ensureIndexes(dbConn)
+    # Start from an up-to-date rollup so only the new rows need adding
+    rollups.ensureRollups(dbConn)
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute("BEGIN IMMEDIATE;")
+    try:
+        oldFingerprint = stats.dataFingerprint(dbCursor)
+        maxRow = rollups.ridershipFingerprint(dbCursor)[1]
+        dateSuffix = _dateSuffix(dbCursor)
+
+        dbCursor.execute(createStage_SQL)
+        dbCursor.execute("DELETE FROM temp.IngestStage;")
+        for path in paths:
+            for chunk in readExtract(path, report, dateSuffix):
+                dbCursor.executemany(stageRow_SQL, chunk)
+
+        dbCursor.execute("SELECT COUNT(*) FROM temp.IngestStage;")
+        report.rowsStaged = dbCursor.fetchone()[0]
+
+        # Stations the extracts introduce, when they carry station names
+        dbCursor.execute(
+            """
+            INSERT INTO Stations (Station_ID, Station_Name)
+            SELECT Station_ID, MAX(Station_Name) FROM temp.IngestStage
+            WHERE Station_Name IS NOT NULL
+            AND Station_ID NOT IN (SELECT Station_ID FROM Stations)
+            GROUP BY Station_ID
+            """
+        )
+        report.stationsAdded = dbCursor.rowcount
+
+        if replace:
+            dbCursor.execute(
+                """
+                DELETE FROM Ridership
+                WHERE EXISTS (SELECT 1 FROM temp.IngestStage
+                              WHERE IngestStage.Station_ID = Ridership.Station_ID
+                              AND IngestStage.Ride_Date = Ridership.Ride_Date)
+                """
+            )
+            report.rowsReplaced = dbCursor.rowcount
+        else:
+            dbCursor.execute(f"DELETE FROM temp.IngestStage WHERE {_loaded_SQL};")
+            report.rowsSkipped = dbCursor.rowcount
+
+        dbCursor.execute(
+            """
+            SELECT COUNT(*), Date(MIN(Ride_Date)), Date(MAX(Ride_Date)), IFNULL(SUM(Num_Riders), 0)
+            FROM temp.IngestStage
+            """
+        )
+        added = dbCursor.fetchone()
+
+        # New rows are numbered on from the old largest rowid, even where
+        # replaced rows freed the top ones, so every appended row sits
+        # above the watermarks of the derived tables. Date order keeps
+        # rowids in the order the data was recorded.
+        dbCursor.execute(
+            """
+            INSERT INTO Ridership (rowid, Station_ID, Ride_Date, Type_of_Day, Num_Riders)
+            SELECT ? + ROW_NUMBER() OVER (ORDER BY Ride_Date, Station_ID),
+                   Station_ID, Ride_Date, Type_of_Day, Num_Riders
+            FROM temp.IngestStage
+            """,
+            [maxRow],
+        )
+        report.rowsInserted = dbCursor.rowcount
+        dbCursor.execute("DELETE FROM temp.IngestStage;")
+
+        # Replaced rows changed old data, so the saved stats no longer add up
+        if not replace:
+            stats.appendStats(dbConn, oldFingerprint, added)
+
+        # Adds only the appended rows (or rebuilds after a replace) and commits
+        rollups.refreshRollups(dbConn)
+    except BaseException:
+        dbConn.rollback()
+        raise
+
+    if report.stationsAdded:
+        stations.reloadCatalog()
+
+    if getattr(dbConn, "columnStore", ""):
+        # numpy is only imported once a column store is configured
+        import columnar
+
+        columnar.exportStore(dbConn, dbConn.columnStore)
+
+    # Once anomalies have been scanned for or forecast models fitted,
+    # bring them up to date with the new days as well
+    dbCursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('AnomalyState', 'ForecastState');"
+    )
+    derived = {row[0] for row in dbCursor.fetchall()}
+
+    # numpy is only imported once anomalies or forecasts are in use
+    if "AnomalyState" in derived:
+        import anomalies
+
+        report.anomaliesFlagged = anomalies.scan(dbConn).flagged
+    if "ForecastState" in derived:
+        import forecast
+
+        report.modelsRefit = forecast.fit(dbConn).modelsFitted
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load daily ridership extracts into the database.")
+    parser.add_argument("extracts", nargs="+", help="CSV extract files")
+    parser.add_argument("--replace", action="store_true", help="overwrite days already loaded")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    report = ingest(database.getConnection(), args.extracts, args.replace)
+    for rejection in report.rejections:
+        print("rejected:", rejection, file=sys.stderr)
+
+    if report.rowsRead == 0:
+        print("No rows to load in", ", ".join(args.extracts))
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,23 @@
 # 9/18/2024
 # Summary: Console based program that outputs data from the CTA2 L ridership
 #          database. Users can also plot data to view trends. 
+#
+# Usage:   python main.py                     interactive menu
+#          python main.py --batch cmds.txt    run commands from a file (- for stdin)
 
 
+import argparse
+import atexit
+import contextlib
+import logging
+import os
+import shlex
+import sys
+
+import console
+import database
 import functions
+import tracing
 
 
 def main():
@@ -23,6 +37,7 @@ def main():
     7 - Output monthly ridership for a specific year and station.
     8 - Compare daily ridership between two stations for a specific year.
     9 - Find nearby stations within a mile of given latitude and longitude.
+    10 - Output the ridership of each line, for all years or one year.
     x - Exit the program.
     
     Returns:
@@ -33,12 +48,12 @@ def main():
 
     # Display general statistics
     print("\nGeneral Statistics:")
-    functions.printGeneralStats()
+    console.printGeneralStats()
 
     # Loop to handle user commands
     while True:
         # Prompt user for input
-        choice = input("\nPlease enter a command (1-9, x to exit): ")
+        choice = input("\nPlease enter a command (1-10, x to exit): ")
 
         # Match user input to corresponding case
         match choice:
@@ -48,7 +63,7 @@ def main():
                 
                 # Get partial station name from user and find stations
                 stationName = input("Enter partial station name (wildcards _ and %): ")
-                if functions.findStations(stationName) == False:
+                if console.printStations(stationName) == False:
                     print("**No stations found...")
 
             case "2":
@@ -56,11 +71,11 @@ def main():
                 
                 # Get station name from user and analyze ridership percentage
                 stationName = input("Enter the name of the station you would like to analyze: ")
-                functions.findPercentageRiders(stationName)
+                console.printPercentageRiders(stationName)
 
             case "3":
                 # Display ridership statistics for weekdays
-                functions.stationRidershipWeekdays()
+                console.printStationRidershipWeekdays()
 
             case "4":
                 print()
@@ -72,31 +87,33 @@ def main():
                     continue
 
                 direction = input("Enter a direction (N/S/W/E): ")
-                if functions.lineStops(lineColor, direction) == False:
+                if console.printLineStops(lineColor, direction) == False:
                     print("**That line does not run in the direction chosen...")
 
             case "5":
                 # Output number of stops for each line color and direction
-                functions.numStopsEachLine()
+                console.printNumStopsEachLine()
 
             case "6":
                 print()
                 
                 # Get station name from user and output yearly ridership
                 stationName = input("Enter a station name (wildcards _ and %): ")
-                if functions.checkIfStationExists(stationName) == False:
+                station = console.checkStation(stationName)
+                if station is None:
                     continue
-                functions.totalRidershipYear(stationName)
+                console.printYearlyRidership(station)
 
             case "7":
                 print()
                 
                 # Get station name and year from user and output monthly ridership
                 stationName = input("Enter a station name (wildcards _ and %): ")
-                if functions.checkIfStationExists(stationName) == False:
+                station = console.checkStation(stationName)
+                if station is None:
                     continue
                 year = input("Enter a year: ")
-                functions.monthlyRidership(stationName, year)
+                console.printMonthlyRidership(station, year)
 
             case "8":
                 print()
@@ -105,17 +122,17 @@ def main():
                 year = input("Year to compare against? ")
                 print() 
 
-                station1 = input("Enter station 1 (wildcards _ and %): ")
-                if functions.checkIfStationExists(station1) == False:
+                station1 = console.checkStation(input("Enter station 1 (wildcards _ and %): "))
+                if station1 is None:
                     continue
 
                 print()
 
-                station2 = input("Enter station 2 (wildcards _ and %): ")
-                if functions.checkIfStationExists(station2) == False:
+                station2 = console.checkStation(input("Enter station 2 (wildcards _ and %): "))
+                if station2 is None:
                     continue
 
-                functions.compareRidership(station1, station2, year)
+                console.printComparison(station1, station2, year)
 
             case "9":
                 print()
@@ -131,7 +148,18 @@ def main():
                     print("**Longitude entered is out of bounds...")
                     continue
 
-                functions.findNearbyStations(latitude, longitude)
+                console.printNearbyStations(latitude, longitude)
+
+            case "10":
+                print()
+
+                # Get an optional year from user and output ridership per line
+                year = input("Enter a year (blank for all years): ").strip() or None
+                if year is not None and not year.isdigit():
+                    print("**Year must be a number...")
+                    continue
+                if console.printLineRidership(year) == False:
+                    print("**No ridership found...")
 
             case "x":
                 # Exit the program
@@ -141,5 +169,264 @@ def main():
                 # Handle unknown commands
                 print("**Error, unknown command, try again...")
 
+def splitBatchLine(line) -> list:
+    """
+    Split a batch command line into fields. Fields are separated by
+    whitespace; double quotes group a field that contains spaces
+    ("95th/Dan Ryan"), and # starts a comment. Single quotes are left
+    alone since station names such as O'Hare contain them.
+
+    Parameters:
+    line (str): One line of the batch file.
+
+    Returns:
+    list: The fields, empty for blank and comment lines.
+    """
+
+    lexer = shlex.shlex(line, posix=True)
+    lexer.whitespace_split = True
+    lexer.quotes = '"'
+    lexer.escapedquotes = '"'
+    return list(lexer)
+
+
+def runBatchCommand(fields, plot, plotFile):
+    """
+    Run one menu command non-interactively, with the answers the
+    interactive menu would have prompted for given as arguments.
+
+    Batch commands (station names may use wildcards _ and %):
+    1 <partial station name>
+    2 <station name>
+    3
+    4 <line color> <direction>
+    5
+    6 <station name>
+    7 <station name> <year>
+    8 <year> <station 1> <station 2>
+    9 <latitude> <longitude> [<radius in miles> [<max stations>]]
+    10 [<year> [split|full|exclusive]]
+
+    Parameters:
+    fields (list): The command followed by its arguments.
+    plot (bool): Whether commands 6-9 should plot.
+    plotFile (str): File the plot is saved to, or None to show it.
+
+    Returns:
+    bool: False if the command or its arguments were invalid, or named a
+    station or line that was not found; True otherwise.
+    """
+
+    command, args = fields[0], fields[1:]
+
+    # Command -> (fewest, most) arguments
+    expectedArgs = {
+        "1": (1, 1), "2": (1, 1), "3": (0, 0), "4": (2, 2), "5": (0, 0),
+        "6": (1, 1), "7": (2, 2), "8": (3, 3), "9": (2, 4),
+        "10": (0, 2),
+    }
+
+    if command not in expectedArgs:
+        print("**Error, unknown command:", command)
+        return False
+
+    fewest, most = expectedArgs[command]
+    if not fewest <= len(args) <= most:
+        print(f"**Error, wrong number of arguments for command {command}...")
+        return False
+
+    match command:
+
+        case "1":
+            if console.printStations(args[0]) == False:
+                print("**No stations found...")
+                return False
+
+        case "2":
+            if console.printPercentageRiders(args[0]) == False:
+                return False
+
+        case "3":
+            console.printStationRidershipWeekdays()
+
+        case "4":
+            if functions.checkIfLineExists(args[0]) == False:
+                print("**No such line...")
+                return False
+            elif console.printLineStops(args[0], args[1]) == False:
+                print("**That line does not run in the direction chosen...")
+
+        case "5":
+            console.printNumStopsEachLine()
+
+        case "6":
+            station = console.checkStation(args[0])
+            if station is None:
+                return False
+            console.printYearlyRidership(station, plot, plotFile)
+
+        case "7":
+            station = console.checkStation(args[0])
+            if station is None:
+                return False
+            if console.printMonthlyRidership(station, args[1], plot, plotFile) == False:
+                return False
+
+        case "8":
+            station1 = console.checkStation(args[1])
+            station2 = console.checkStation(args[2]) if station1 is not None else None
+            if station2 is None:
+                return False
+            if console.printComparison(station1, station2, args[0], plot, plotFile) == False:
+                return False
+
+        case "9":
+            try:
+                latitude, longitude = float(args[0]), float(args[1])
+                radius = float(args[2]) if len(args) > 2 else 1.0
+                limit = int(args[3]) if len(args) > 3 else None
+            except ValueError:
+                print("**Latitude, longitude, radius and limit must be numbers...")
+                return False
+
+            if latitude < 40 or latitude > 43:
+                print("**Latitude entered is out of bounds...")
+                return False
+            if longitude < -88 or longitude > -87:
+                print("**Longitude entered is out of bounds...")
+                return False
+            console.printNearbyStations(latitude, longitude, plot, plotFile, radius, limit)
+
+        case "10":
+            year = args[0] if args and args[0] != "all" else None
+            rule = args[1] if len(args) > 1 else "split"
+            if year is not None and not year.isdigit():
+                print("**Year must be a number...")
+                return False
+            try:
+                found = console.printLineRidership(year, rule)
+            except ValueError:
+                print("**Rule must be one of split, full or exclusive...")
+                return False
+            if found == False:
+                print("**No ridership found...")
+
+    return True
+
+
+def runBatch(commandFile, plotDir) -> int:
+    """
+    Run every command in a batch file on one warm database connection.
+
+    Each line holds one command (see runBatchCommand), optionally followed
+    by --plot=png, --plot=svg or --plot=show. Saved plots are named after
+    the line number and command, e.g. 0012-cmd6.png.
+
+    Parameters:
+    commandFile (file): Open file of commands.
+    plotDir (str): Directory saved plots are written to.
+
+    Returns:
+    int: Number of commands that failed.
+    """
+
+    commands = 0
+    failures = 0
+
+    for lineNumber, line in enumerate(commandFile, start=1):
+        try:
+            fields = splitBatchLine(line)
+        except ValueError as error:
+            print(f"**Error on line {lineNumber}: {error}")
+            failures += 1
+            continue
+
+        if not fields:
+            continue
+
+        # Pull out the plot option, wherever it appears on the line
+        plotFormat = None
+        for field in [field for field in fields if field.startswith("--plot=")]:
+            plotFormat = field[len("--plot="):]
+            fields.remove(field)
+
+        commands += 1
+        if not fields:
+            print(f"**Error on line {lineNumber}: no command before the plot option")
+            failures += 1
+            continue
+
+        plotFile = None
+        if plotFormat not in (None, "show"):
+            plotFile = os.path.join(plotDir, f"{lineNumber:04d}-cmd{fields[0]}.{plotFormat}")
+
+        print(f"\n> {line.strip()}")
+        if not runBatchCommand(fields, plotFormat is not None, plotFile):
+            failures += 1
+
+    if failures:
+        print(f"\n**{failures} of {commands} commands failed")
+
+    return failures
+
+
+def parseArgs(argv=None):
+    """
+    Parse the command line.
+
+    Parameters:
+    argv (list): Arguments, defaulting to sys.argv[1:].
+
+    Returns:
+    argparse.Namespace: The parsed options.
+    """
+
+    parser = argparse.ArgumentParser(description="CTA L ridership analysis app")
+    parser.add_argument("--db", help="path of the ridership database")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="run the commands in FILE (- for stdin) instead of the interactive menu",
+    )
+    parser.add_argument("--output", metavar="FILE", help="write batch output to FILE instead of stdout")
+    parser.add_argument("--plot-dir", default=".", help="directory for plots saved in batch mode")
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="trace every SQL statement and write per-function timings to FILE (JSON) on exit",
+    )
+    parser.add_argument(
+        "--slow-ms",
+        type=float,
+        help="log statements slower than this many milliseconds to stderr (implies tracing)",
+    )
+    parser.add_argument("--explain", action="store_true", help="include query plans in the trace")
+    return parser.parse_args(argv)
+
+
 # run the program
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    options = parseArgs()
+
+    if options.db:
+        database.configure(path=options.db)
+
+    if options.trace or options.slow_ms is not None or options.explain:
+        tracing.configure(enabled=True, slowMs=options.slow_ms, explain=options.explain or None)
+        logging.basicConfig(format="slow query: %(message)s")
+        if options.trace:
+            atexit.register(tracing.tracer.exportJson, options.trace)
+
+    if options.batch is None:
+        main()
+        sys.exit(0)
+
+    os.makedirs(options.plot_dir, exist_ok=True)
+
+    with contextlib.ExitStack() as stack:
+        commandFile = sys.stdin if options.batch == "-" else stack.enter_context(open(options.batch))
+        if options.output:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(options.output, "w"))))
+        failures = runBatch(commandFile, options.plot_dir)
+
+    sys.exit(1 if failures else 0)
\ No newline at end of file
@@ -0,0 +1,250 @@
+"""
+Plotting for the CTA L analysis app.
+
+matplotlib takes several hundred milliseconds to import and set up a
+backend, and most sessions never plot anything. console.py therefore
+imports this module only when the user answers "y" to a Plot prompt, so
+the matplotlib cost is paid on the first plot instead of at startup.
+
+Charts saved to a file are drawn off-screen on the Agg canvas, without
+pyplot: each thread reuses one Figure, cleared after every save, and the
+map of Chicago is decoded once and shared. Rendering thousands of charts
+in a batch therefore does not grow memory. Only charts that are shown on
+screen go through pyplot, on a figure that is closed once the window is.
+"""
+
+import os
+import threading
+
+import matplotlib.image
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Longitude/latitude extent of chicago.png
+mapExtent = [-87.9277, -87.5569, 41.7012, 42.0868]
+
+mapFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chicago.png")
+
+# Decoded map image, loaded on first use
+_basemap = None
+_basemapLock = threading.Lock()
+
+# Each thread's reusable off-screen figure
+_local = threading.local()
+
+
+def basemap():
+    """
+    Return the decoded map of Chicago, reading chicago.png only once.
+
+    Returns:
+    np.ndarray: The image, shared by every chart; do not modify it.
+    """
+
+    global _basemap
+
+    if _basemap is None:
+        with _basemapLock:
+            if _basemap is None:
+                image = matplotlib.image.imread(mapFile)
+                image.setflags(write=False)
+                _basemap = image
+
+    return _basemap
+
+
+def _figure():
+    """
+    Return the calling thread's off-screen figure, emptied.
+    """
+
+    figure = getattr(_local, "figure", None)
+    if figure is None:
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        _local.figure = figure
+
+    figure.clear()
+    return figure
+
+
+def _render(draw, outputFiles):
+    """
+    Draw a chart once and save it to every file in outputFiles, or show
+    it on screen if outputFiles is empty.
+    """
+
+    if not outputFiles:
+        # pyplot (and an interactive backend) only for on-screen charts
+        import matplotlib.pyplot as pyplot
+
+        figure = pyplot.figure()
+        draw(figure.add_subplot())
+        pyplot.show()
+        pyplot.close(figure)
+        return
+
+    figure = _figure()
+    draw(figure.add_subplot())
+    try:
+        for outputFile in outputFiles:
+            figure.savefig(outputFile)
+    finally:
+        # Drop the artists now rather than holding them until the next chart
+        figure.clear()
+
+
+def _outputFiles(outputFile) -> list:
+    if outputFile is None:
+        return []
+    if isinstance(outputFile, (list, tuple)):
+        return list(outputFile)
+    return [outputFile]
+
+
+def plotYearlyRidership(years, riders, stationName, outputFile=None):
+    """
+    Plot the yearly ridership trend of a station.
+
+    Parameters:
+    years (list): Year labels for the x axis.
+    riders (list): Ridership for each year.
+    stationName (str): Station name for the title.
+    outputFile (str): Save the chart here (format from the extension) instead
+                      of showing it; a list of files saves it to each.
+    """
+
+    def draw(axes):
+        # Set up the plot labels and title
+        axes.set_xlabel("Year")
+        axes.set_ylabel("Number of Riders")
+        axes.set_title(f"Yearly Ridership at {stationName} Station")
+        axes.plot(years, riders)
+
+    _render(draw, _outputFiles(outputFile))
+
+
+def plotMonthlyRidership(months, riders, stationName, year, outputFile=None):
+    """
+    Plot the monthly ridership of a station for one year.
+
+    Parameters:
+    months (list): Month labels for the x axis.
+    riders (list): Ridership for each month.
+    stationName (str): Station name for the title.
+    year (str): The year shown.
+    outputFile (str): Save the chart here (format from the extension) instead
+                      of showing it; a list of files saves it to each.
+    """
+
+    def draw(axes):
+        # Set up plot labels and title
+        axes.set_xlabel("Month")
+        axes.set_ylabel("Number of Riders")
+        axes.set_title(f"Monthly Ridership at {stationName} Station ({year})")
+        axes.plot(months, riders)
+
+    _render(draw, _outputFiles(outputFile))
+
+
+def plotMonthlyRidershipByYear(series, stationName, outputFile=None):
+    """
+    Plot the monthly ridership of a station with one line per year.
+
+    Parameters:
+    series (list): (year, months, riders) for each year, months being 1-12.
+    stationName (str): Station name for the title.
+    outputFile (str): Save the chart here (format from the extension) instead
+                      of showing it; a list of files saves it to each.
+    """
+
+    def draw(axes):
+        # Set up plot labels and title
+        axes.set_xlabel("Month")
+        axes.set_ylabel("Number of Riders")
+        axes.set_title(f"Monthly Ridership at {stationName} Station by Year")
+        for year, months, riders in series:
+            axes.plot(months, riders, label=str(year))
+        axes.set_xticks(range(1, 13))
+        axes.legend(fontsize="small", ncol=2)
+
+    _render(draw, _outputFiles(outputFile))
+
+
+def plotDailyComparison(series, year, outputFile=None):
+    """
+    Plot the daily ridership of several stations on one chart.
+
+    Parameters:
+    series (list): (days, riders, stationName) for each station.
+    year (str): The year shown.
+    outputFile (str): Save the chart here (format from the extension) instead
+                      of showing it; a list of files saves it to each.
+    """
+
+    def draw(axes):
+        # Set up plot labels, title, and legend
+        axes.set_xlabel("Day")
+        axes.set_ylabel("Number of Riders")
+        axes.set_title(f"Ridership Each Day of {year}")
+        for days, riders, stationName in series:
+            axes.plot(days, riders, label=stationName)
+        axes.legend()  # Display the legend for station names
+
+    _render(draw, _outputFiles(outputFile))
+
+
+def plotNearbyStations(stations, outputFile=None):
+    """
+    Plot stations as labelled points on the map of Chicago.
+
+    Parameters:
+    stations (list): (stationName, latitude, longitude) for each station.
+    outputFile (str): Save the chart here (format from the extension) instead
+                      of showing it; a list of files saves it to each.
+    """
+
+    x = [row[2] for row in stations]  # Longitudes
+    y = [row[1] for row in stations]  # Latitudes
+
+    def draw(axes):
+        # The map is decoded once and shared by every chart
+        axes.imshow(basemap(), extent=mapExtent)
+        axes.set_title("Stations Near You")
+
+        # Plot the stations on the map
+        axes.plot(x, y, 'o')
+
+        # Annotate each point with the station name
+        for row in stations:
+            axes.annotate(row[0], (row[2], row[1]))
+        axes.set_xlim(mapExtent[:2])
+        axes.set_ylim(mapExtent[2:])
+
+    _render(draw, _outputFiles(outputFile))
+
+
+def renderBatch(charts, outputDir, formats=("png",)) -> list:
+    """
+    Render many charts to files, drawing each chart once however many
+    formats it is saved in.
+
+    Parameters:
+    charts (iterable): (name, plot function, args) for each chart, e.g.
+                       ("howard-yearly", plotYearlyRidership, (years, riders, "Howard")).
+                       The files are named name.png, name.svg, ...
+    outputDir (str): Directory to write the files to; created if missing.
+    formats (tuple): File formats to save each chart in.
+
+    Returns:
+    list: Paths of the files written.
+    """
+
+    os.makedirs(outputDir, exist_ok=True)
+
+    written = []
+    for name, plot, args in charts:
+        outputFiles = [os.path.join(outputDir, f"{name}.{fileFormat}") for fileFormat in formats]
+        plot(*args, outputFile=outputFiles)
+        written.extend(outputFiles)
+    return written
@@ -0,0 +1,251 @@
+"""
+All-stations report for the CTA L analysis app.
+
+Builds the per-station pack (day-type split, yearly totals, monthly
+totals for every year, charts) for every station name in Stations. The
+stations are spread over a pool of worker processes; each worker opens
+its own read-only connection and renders its charts off-screen, so the
+report scales with the number of cores.
+
+The rollup and indexes are brought up to date once, up front, so the
+workers only read.
+
+    python report.py reports/2024 --workers 8 --format svg
+
+writes reports/2024/index.csv with one line per station, and per station
+a JSON file with the full pack and its charts under stations/.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import database
+import functions
+import results
+import rollups
+import stations
+
+chartFormats = ("png", "svg")
+
+indexColumns = [
+    "station_name",
+    "station_ids",
+    "weekday",
+    "saturday",
+    "sunday",
+    "total",
+    "first_year",
+    "last_year",
+    "pack",
+]
+
+
+def fileStem(station) -> str:
+    """
+    File name stem for a station: its first Station_ID and its name with
+    anything but letters and digits turned into dashes.
+
+    Args:
+    station (results.ResolvedStation): The station.
+
+    Returns:
+    str: e.g. "40380-Clark-Lake".
+    """
+
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", station.stationName).strip("-")
+    return f"{station.stationIds[0]}-{slug}"
+
+
+def _initWorker(settings):
+    """
+    Set up a worker process: read-only connections to the same database
+    as the parent, and the off-screen matplotlib backend.
+    """
+
+    os.environ["MPLBACKEND"] = "Agg"
+    settings = dict(settings, read_only=True)
+    database.configure(**{name: settings[name] for name in database.settingSources})
+
+
+def stationPack(station, outputDir, chartFormat=None) -> dict:
+    """
+    Build the report pack of one station and write it to outputDir.
+    Runs in a worker process.
+
+    Args:
+    station (results.ResolvedStation): The station.
+    outputDir (str): The report's stations/ directory.
+    chartFormat (str): "png" or "svg", or None for no charts.
+
+    Returns:
+    dict: The pack: station, dayTypes, yearly, monthly and charts.
+    """
+
+    breakdown = functions.findPercentageRiders(station)
+    yearly = functions.totalRidershipYear(station)
+
+    pack = {
+        "stationName": station.stationName,
+        "stationIds": list(station.stationIds),
+        "dayTypes": None if breakdown is None else breakdown.asDict(),
+        "yearly": {},
+        "monthly": {},
+        "charts": [],
+    }
+
+    if yearly is not None:
+        pack["yearly"] = dict(zip(yearly.labels, yearly.riders))
+        for year in yearly.labels:
+            monthly = functions.monthlyRidership(station, year)
+            # Labels are 'MM/YYYY'; key the months by their number
+            pack["monthly"][year] = {
+                label[:2]: riders for label, riders in zip(monthly.labels, monthly.riders)
+            }
+
+    stem = fileStem(station)
+
+    if chartFormat is not None and yearly is not None:
+        # matplotlib is only imported once a plot is requested
+        import plotting
+
+        yearlyChart = f"{stem}-yearly.{chartFormat}"
+        plotting.plotYearlyRidership(
+            yearly.labels, yearly.riders, station.stationName,
+            os.path.join(outputDir, yearlyChart),
+        )
+
+        monthlyChart = f"{stem}-monthly.{chartFormat}"
+        plotting.plotMonthlyRidershipByYear(
+            [
+                (year, [int(month) for month in months], list(months.values()))
+                for year, months in pack["monthly"].items()
+            ],
+            station.stationName,
+            os.path.join(outputDir, monthlyChart),
+        )
+        pack["charts"] = [yearlyChart, monthlyChart]
+
+    with open(os.path.join(outputDir, stem + ".json"), "w") as packFile:
+        json.dump(pack, packFile, indent=2)
+
+    return pack
+
+
+def _prepare():
+    """
+    Bring the indexes and rollup up to date before the read-only workers
+    start, so none of them has to build its own temporary rollup.
+    """
+
+    dbConn = functions.getConnection()
+    if not database.isReadOnly(dbConn):
+        rollups.ensureRollups(dbConn)
+
+
+def buildReport(outputDir, workers=None, chartFormat="png", progress=None) -> list:
+    """
+    Build the pack of every station, in parallel.
+
+    Args:
+    outputDir (str): Directory to write the report to; created if missing.
+    workers (int): Number of worker processes, default one per CPU.
+    chartFormat (str): "png" or "svg", or None for no charts.
+    progress (function): Called with (stations done, stations in total,
+                         station name) as each station finishes.
+
+    Returns:
+    list: The packs, ordered by station name.
+
+    Raises:
+    ValueError: If chartFormat is not one of chartFormats or None.
+    """
+
+    if chartFormat is not None and chartFormat not in chartFormats:
+        raise ValueError(f"chart format must be one of {chartFormats}, not {chartFormat!r}")
+
+    stationsDir = os.path.join(outputDir, "stations")
+    os.makedirs(stationsDir, exist_ok=True)
+
+    _prepare()
+    catalog = stations.getCatalog()
+    todo = [catalog.exact(stationName) for stationName in sorted(catalog.idsByName)]
+
+    packs = []
+    # spawn, not fork: a forked worker would inherit the parent's connections
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_initWorker,
+        initargs=(database.settings(),),
+    ) as executor:
+        futures = {
+            executor.submit(stationPack, station, stationsDir, chartFormat): station
+            for station in todo
+        }
+        for future in concurrent.futures.as_completed(futures):
+            packs.append(future.result())
+            if progress is not None:
+                progress(len(packs), len(todo), futures[future].stationName)
+
+    packs.sort(key=lambda pack: pack["stationName"])
+    _writeIndex(outputDir, packs)
+    return packs
+
+
+def _writeIndex(outputDir, packs):
+    """
+    Write index.csv: one line per station with its day-type totals.
+    """
+
+    with open(os.path.join(outputDir, "index.csv"), "w", newline="") as indexFile:
+        writer = csv.writer(indexFile)
+        writer.writerow(indexColumns)
+        for pack in packs:
+            dayTypes = pack["dayTypes"] or {}
+            years = list(pack["yearly"])
+            station = results.ResolvedStation(pack["stationName"], tuple(pack["stationIds"]))
+            writer.writerow([
+                pack["stationName"],
+                " ".join(str(stationId) for stationId in pack["stationIds"]),
+                dayTypes.get("weekday", 0),
+                dayTypes.get("saturday", 0),
+                dayTypes.get("sunday", 0),
+                dayTypes.get("total", 0),
+                years[0] if years else "",
+                years[-1] if years else "",
+                os.path.join("stations", fileStem(station) + ".json"),
+            ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the report pack of every station.")
+    parser.add_argument("output", help="directory to write the report to")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--format", choices=chartFormats, default="png", help="chart format (default: png)")
+    parser.add_argument("--no-charts", action="store_true", help="skip the charts")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    started = time.perf_counter()
+
+    def progress(done, total, stationName):
+        elapsed = time.perf_counter() - started
+        print(f"\r[{done}/{total}] {elapsed:6.1f} s  {stationName[:40]:<40}", end="", file=sys.stderr)
+
+    packs = buildReport(args.output, args.workers, None if args.no_charts else args.format, progress)
+    print(file=sys.stderr)
+    print(f"Report of {len(packs)} stations written to {args.output} in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
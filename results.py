@@ -0,0 +1,179 @@
+"""
+Result records returned by the query functions in functions.py.
+
+Each record is a lightweight __slots__ class: attribute access by name,
+no per-instance __dict__, and equality/repr based on the field values.
+asDict() turns a record into plain data for JSON or CSV output.
+"""
+
+
+class Record:
+    """
+    Base class for result records. Subclasses list their fields in
+    __slots__, in constructor order.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(self.__slots__):
+            raise TypeError(
+                f"{type(self).__name__} takes {len(self.__slots__)} fields, got {len(args)}"
+            )
+
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+        for name in self.__slots__:
+            if not hasattr(self, name):
+                raise TypeError(f"{type(self).__name__} is missing field {name}")
+
+    def asDict(self) -> dict:
+        """
+        Return the record's fields as a dict.
+        """
+
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.asDict() == other.asDict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class GeneralStats(Record):
+    """
+    Summary statistics of the whole database.
+    """
+
+    __slots__ = (
+        "numStations",
+        "numStops",
+        "numEntries",
+        "earliestDate",
+        "latestDate",
+        "totalRiders",
+    )
+
+
+class Station(Record):
+    """
+    A station from the Stations table.
+    """
+
+    __slots__ = ("stationId", "stationName")
+
+
+class DayTypeBreakdown(Record):
+    """
+    Ridership of one station split by Type_of_Day.
+    """
+
+    __slots__ = ("stationName", "weekday", "saturday", "sunday", "total")
+
+    def percentage(self, riders) -> float:
+        """
+        Express part of the station's ridership as a percentage of its total.
+        """
+
+        return (riders / self.total) * 100
+
+
+class StationShare(Record):
+    """
+    A station's ridership and its percentage of the ridership of all stations.
+    """
+
+    __slots__ = ("stationName", "riders", "percentage")
+
+
+class LineStop(Record):
+    """
+    A stop served by a line in one direction.
+    """
+
+    __slots__ = ("stopName", "direction", "ada")
+
+
+class LineStopCount(Record):
+    """
+    Number of stops of a line in one direction, and its share of all stops.
+    """
+
+    __slots__ = ("color", "direction", "numStops", "percentage")
+
+
+class LineRidership(Record):
+    """
+    Ridership of a line and its percentage of the ridership of all lines,
+    under one of the shared-station rules in rollups.lineRules.
+    """
+
+    __slots__ = ("color", "riders", "percentage")
+
+
+class RidershipSeries(Record):
+    """
+    Ridership of a station over labelled periods, e.g. years or months.
+    """
+
+    __slots__ = ("stationName", "labels", "riders")
+
+
+class DailyRidership(Record):
+    """
+    Daily ridership of a station, with dates as 'YYYY-MM-DD' strings.
+    """
+
+    __slots__ = ("stationId", "stationName", "dates", "riders")
+
+
+class RidershipTrend(Record):
+    """
+    Ridership of a station, line or the whole system per day, week, month
+    or year of a date range, with the change from the same period a year
+    earlier. Periods without data are None throughout.
+    """
+
+    __slots__ = ("scope", "granularity", "periods", "riders", "yoyChange", "yoyPercent")
+
+
+class RidershipAnomaly(Record):
+    """
+    A station day flagged by anomalies.py: its ridership, the median of
+    the days it was compared with, and its robust score (negative for a
+    drop, positive for a spike).
+    """
+
+    __slots__ = ("stationName", "date", "dayType", "riders", "expected", "score", "kind")
+
+
+class RidershipForecast(Record):
+    """
+    Forecast daily ridership of a station, with the bounds of a 95% band,
+    from the models fitted by forecast.py.
+    """
+
+    __slots__ = ("stationName", "dates", "dayTypes", "riders", "lower", "upper")
+
+
+class NearbyStation(Record):
+    """
+    A station stop close to a point of interest, with its distance in miles.
+    """
+
+    __slots__ = ("stationName", "latitude", "longitude", "distance")
+
+
+class ResolvedStation(Record):
+    """
+    A station name resolved to the Station_IDs that carry it.
+    """
+
+    __slots__ = ("stationName", "stationIds")
@@ -0,0 +1,541 @@
+"""
+Precomputed ridership rollups for the CTA L analysis app.
+
+The Ridership table holds one row per station per day, so every aggregate
+over it is a full scan. This module maintains a summary table,
+RidershipRollup, holding the total riders for each
+station x Type_of_Day x year x month combination. It is built once and
+refreshed incrementally when new Ridership rows are appended; the analysis
+functions read from it instead of from Ridership.
+
+A second table, LineRollup, holds the same totals per line x Type_of_Day
+x year x month. Stations are mapped to lines through their stops (Stops ->
+StopDetails -> Lines), and a station served by several lines is counted
+under each of the rules in lineRules, so every rule is a plain sum at
+query time. LineRollup is derived from RidershipRollup and rebuilt when
+either Ridership or the stop topology changes.
+
+Appends are noticed from the row count and the largest rowid; rewrites
+(UPDATE, DELETE, and inserts reusing a deleted rowid) from a counter that
+triggers on Ridership bump, installed by the first writable refresh.
+ridershipVersion() combines the three, and every derived table records
+the version it was built from.
+
+On a read-only connection a stale rollup cannot be rewritten in place, so
+it is built in the connection's temp schema instead, which shadows the
+on-disk tables. The temp copy starts from the on-disk rollup and adds only
+the rows appended since, and is dropped again once a writable connection
+has brought the on-disk rollup up to date.
+"""
+
+import weakref
+
+import database
+
+# Summary table: one row per station, day type, year and month
+createRollup_SQL = """
+                   CREATE TABLE IF NOT EXISTS {schema}.RidershipRollup (
+                       Station_ID INTEGER NOT NULL,
+                       Type_of_Day TEXT NOT NULL,
+                       Year INTEGER NOT NULL,
+                       Month INTEGER NOT NULL,
+                       Num_Riders INTEGER NOT NULL,
+                       Num_Days INTEGER NOT NULL,
+                       PRIMARY KEY (Station_ID, Type_of_Day, Year, Month)
+                   )
+                   """
+
+# Records which part of Ridership the rollup reflects
+createRollupState_SQL = """
+                        CREATE TABLE IF NOT EXISTS {schema}.RollupState (
+                            Name TEXT PRIMARY KEY,
+                            Num_Rows INTEGER NOT NULL,
+                            Max_Row INTEGER NOT NULL,
+                            Rewrites INTEGER NOT NULL
+                        )
+                        """
+
+# Counts Ridership rows updated or deleted, which the row count and
+# largest rowid cannot show
+createRewrites_SQL = """
+                     CREATE TABLE IF NOT EXISTS RidershipRewrites (
+                         Name TEXT PRIMARY KEY,
+                         Rewrites INTEGER NOT NULL
+                     )
+                     """
+
+rewriteTriggers_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS Ridership_{event.title()}_Count
+    AFTER {event} ON Ridership
+    BEGIN
+        UPDATE RidershipRewrites SET Rewrites = Rewrites + 1 WHERE Name = 'Ridership';
+    END
+    """
+    for event in ("UPDATE", "DELETE")
+]
+
+# Aggregates every Ridership row with a rowid above the given watermark
+# into the rollup, adding onto groups that already exist
+aggregateRidership_SQL = """
+                         INSERT INTO RidershipRollup
+                         SELECT Station_ID, Type_of_Day,
+                                CAST(strftime('%Y', Ride_Date) AS INTEGER) AS Year,
+                                CAST(strftime('%m', Ride_Date) AS INTEGER) AS Month,
+                                SUM(Num_Riders), COUNT(*)
+                         FROM Ridership
+                         WHERE rowid > ?
+                         GROUP BY Station_ID, Type_of_Day, Year, Month
+                         ON CONFLICT (Station_ID, Type_of_Day, Year, Month)
+                         DO UPDATE SET Num_Riders = Num_Riders + excluded.Num_Riders,
+                                       Num_Days = Num_Days + excluded.Num_Days
+                         """
+
+# How a station served by several lines counts towards each line, and the
+# LineRollup column holding the totals under that rule:
+#   split     - its ridership is divided evenly among its lines, so the
+#               lines add up to the system total
+#   full      - its whole ridership counts on every line serving it
+#   exclusive - it is left out; only single-line stations count
+lineRules = {
+    "split": "Split_Riders",
+    "full": "Num_Riders",
+    "exclusive": "Exclusive_Riders",
+}
+
+# Line summary table: one row per line, day type, year and month
+createLineRollup_SQL = """
+                       CREATE TABLE IF NOT EXISTS {schema}.LineRollup (
+                           Line_ID INTEGER NOT NULL,
+                           Type_of_Day TEXT NOT NULL,
+                           Year INTEGER NOT NULL,
+                           Month INTEGER NOT NULL,
+                           Num_Riders INTEGER NOT NULL,
+                           Split_Riders REAL NOT NULL,
+                           Exclusive_Riders INTEGER NOT NULL,
+                           PRIMARY KEY (Line_ID, Type_of_Day, Year, Month)
+                       )
+                       """
+
+# Records the Ridership fingerprint and stop topology LineRollup reflects
+createLineRollupState_SQL = """
+                            CREATE TABLE IF NOT EXISTS {schema}.LineRollupState (
+                                Name TEXT PRIMARY KEY,
+                                Num_Rows INTEGER NOT NULL,
+                                Max_Row INTEGER NOT NULL,
+                                Rewrites INTEGER NOT NULL,
+                                Topology TEXT NOT NULL
+                            )
+                            """
+
+# Cheap fingerprint of which stops serve which stations and lines
+topology_SQL = """
+               SELECT (SELECT COUNT(*) FROM Stops) || ':' ||
+                      (SELECT IFNULL(SUM(Stop_ID * Station_ID), 0) FROM Stops) || ':' ||
+                      (SELECT COUNT(*) FROM StopDetails) || ':' ||
+                      (SELECT IFNULL(SUM(Stop_ID * Line_ID), 0) FROM StopDetails)
+               """
+
+# Rolls RidershipRollup up to lines, under every rule in lineRules at once
+aggregateLines_SQL = """
+                     WITH StationLines AS (
+                         SELECT DISTINCT Stops.Station_ID, StopDetails.Line_ID
+                         FROM Stops JOIN StopDetails ON Stops.Stop_ID = StopDetails.Stop_ID
+                     ),
+                     LineCounts AS (
+                         SELECT Station_ID, COUNT(*) AS Num_Lines
+                         FROM StationLines GROUP BY Station_ID
+                     )
+                     INSERT INTO LineRollup
+                     SELECT StationLines.Line_ID, Type_of_Day, Year, Month,
+                            SUM(Num_Riders),
+                            SUM(Num_Riders * 1.0 / Num_Lines),
+                            SUM(CASE WHEN Num_Lines = 1 THEN Num_Riders ELSE 0 END)
+                     FROM RidershipRollup
+                     JOIN StationLines ON StationLines.Station_ID = RidershipRollup.Station_ID
+                     JOIN LineCounts ON LineCounts.Station_ID = RidershipRollup.Station_ID
+                     GROUP BY StationLines.Line_ID, Type_of_Day, Year, Month
+                     """
+
+# Change counters seen when each connection's rollups were last verified;
+# weak keys, so closed and discarded connections drop out
+_verified = weakref.WeakKeyDictionary()
+_linesVerified = weakref.WeakKeyDictionary()
+
+
+def ensureRewriteTracking(dbConn):
+    """
+    Install the Ridership triggers that count rewritten rows, if missing.
+    A read-only connection cannot; ridershipVersion() then falls back to
+    a checksum.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    None
+    """
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'Ridership' "
+        "AND name IN ('Ridership_Update_Count', 'Ridership_Delete_Count');"
+    )
+    if dbCursor.fetchone()[0] == len(rewriteTriggers_SQL) or database.isReadOnly(dbConn):
+        return
+
+    dbCursor.execute(createRewrites_SQL)
+    dbCursor.execute("INSERT OR IGNORE INTO RidershipRewrites VALUES ('Ridership', 0);")
+    for trigger_SQL in rewriteTriggers_SQL:
+        dbCursor.execute(trigger_SQL)
+    dbConn.commit()
+
+
+def ridershipVersion(dbCursor) -> tuple:
+    """
+    Identify the current contents of Ridership: the row count and largest
+    rowid, which change on every append, and the rewrite count, which
+    changes on every UPDATE or DELETE. Without the rewrite triggers (see
+    ensureRewriteTracking()) the total of Num_Riders stands in for the
+    count, as -1 - total so the two never compare equal.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    tuple: (number of rows, largest rowid, rewrites).
+    """
+
+    numRows, maxRow = ridershipFingerprint(dbCursor)
+
+    if _tableExists(dbCursor, "RidershipRewrites"):
+        dbCursor.execute("SELECT Rewrites FROM RidershipRewrites WHERE Name = 'Ridership';")
+        row = dbCursor.fetchone()
+        if row is not None:
+            return (numRows, maxRow, row[0])
+
+    dbCursor.execute("SELECT IFNULL(SUM(Num_Riders), 0) FROM Ridership;")
+    return (numRows, maxRow, -1 - dbCursor.fetchone()[0])
+
+
+def ridershipFingerprint(dbCursor):
+    """
+    Compute the row count and largest rowid of Ridership. They show
+    appended rows, but not rewritten ones; use ridershipVersion() to tell
+    whether derived data is current.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    tuple: (number of rows, largest rowid), (0, 0) for an empty table.
+    """
+
+    dbCursor.execute("SELECT COUNT(*), IFNULL(MAX(rowid), 0) FROM Ridership;")
+    row = dbCursor.fetchone()
+    return (row[0], row[1])
+
+
+def _changeCounters(dbConn):
+    """
+    Return the counters SQLite bumps whenever the database is written,
+    by this connection (total_changes) or by any other (data_version).
+    """
+
+    version = dbConn.execute("PRAGMA data_version;").fetchone()[0]
+    return (version, dbConn.total_changes)
+
+
+def _tableExists(dbCursor, name) -> bool:
+    """
+    Check whether a table exists in the main or the temp schema.
+    """
+
+    dbCursor.execute(
+        """
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?
+        UNION ALL
+        SELECT name FROM sqlite_temp_master WHERE type = 'table' AND name = ?
+        """,
+        [name, name],
+    )
+    return dbCursor.fetchone() is not None
+
+
+def _hasColumn(dbCursor, table, column) -> bool:
+    """
+    Check whether a table has a column; state tables written by older
+    versions of the app lack the newer ones.
+    """
+
+    dbCursor.execute(f"PRAGMA table_info({table});")
+    return any(row[1] == column for row in dbCursor.fetchall())
+
+
+def _mainRollupState(dbCursor):
+    """
+    Return the version the on-disk (main schema) rollup was built from,
+    ignoring any temp copy shadowing it.
+
+    Returns:
+    tuple: (number of rows, largest rowid, rewrites), or None if there is
+    no on-disk rollup or it predates rewrite tracking.
+    """
+
+    dbCursor.execute("SELECT name FROM main.sqlite_master WHERE type = 'table' AND name = 'RollupState';")
+    if dbCursor.fetchone() is None:
+        return None
+    dbCursor.execute("PRAGMA main.table_info(RollupState);")
+    if not any(row[1] == "Rewrites" for row in dbCursor.fetchall()):
+        return None
+
+    dbCursor.execute("SELECT Num_Rows, Max_Row, Rewrites FROM main.RollupState WHERE Name = 'Ridership';")
+    state = dbCursor.fetchone()
+    return None if state is None else tuple(state)
+
+
+def _dropTempRollups(dbCursor):
+    """
+    Drop the temp copies of the rollup tables, so the on-disk ones are
+    read again.
+    """
+
+    for table in ("RidershipRollup", "RollupState", "LineRollup", "LineRollupState"):
+        dbCursor.execute(f"DROP TABLE IF EXISTS temp.{table};")
+
+
+def _shadowsCurrentRollup(dbCursor) -> bool:
+    """
+    Check whether a temp rollup hides an on-disk rollup that is current
+    again, so the temp copy can be dropped.
+    """
+
+    dbCursor.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table' AND name = 'RollupState';")
+    if dbCursor.fetchone() is None:
+        return False
+    mainState = _mainRollupState(dbCursor)
+    return mainState is not None and mainState == ridershipVersion(dbCursor)
+
+
+def rollupsAreStale(dbCursor) -> bool:
+    """
+    Consistency check: compare the fingerprint recorded when the rollup was
+    last refreshed against the current state of Ridership.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    bool: True if the rollup is missing or out of date, False otherwise.
+    """
+
+    if not _tableExists(dbCursor, "RollupState") or not _hasColumn(dbCursor, "RollupState", "Rewrites"):
+        return True
+
+    dbCursor.execute(
+        "SELECT Num_Rows, Max_Row, Rewrites FROM RollupState WHERE Name = 'Ridership';"
+    )
+    state = dbCursor.fetchone()
+
+    return state is None or tuple(state) != ridershipVersion(dbCursor)
+
+
+def refreshRollups(dbConn, rebuild=False):
+    """
+    Bring RidershipRollup up to date with Ridership.
+
+    Rows appended since the last refresh (rowid above the recorded
+    watermark) are aggregated and added onto the existing rollup rows.
+    If rows were deleted or updated (the rewrite count moved), or rebuild
+    is True, the rollup is recomputed from scratch.
+
+    A read-only connection reads the on-disk rollup whenever it is
+    current. Otherwise it builds a temp copy, seeded from the on-disk
+    rollup when only rows were appended since that was refreshed.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    rebuild (bool): Force a full rebuild.
+
+    Returns:
+    None
+    """
+
+    schema = "temp" if database.isReadOnly(dbConn) else "main"
+
+    # Outside a transaction, so a caller's transaction is never committed early
+    if not dbConn.in_transaction:
+        ensureRewriteTracking(dbConn)
+
+    dbCursor = dbConn.cursor()
+
+    # Take the write lock before reading the watermark, so two connections
+    # refreshing at once cannot both add the same new rows
+    if schema == "main" and not dbConn.in_transaction:
+        dbCursor.execute("BEGIN IMMEDIATE;")
+
+    if schema == "temp" and not rebuild:
+        mainState = _mainRollupState(dbCursor)
+        if mainState is not None and mainState == ridershipVersion(dbCursor):
+            # A writer has refreshed the on-disk rollup; stop shadowing it
+            _dropTempRollups(dbCursor)
+            return
+
+    dbCursor.execute(createRollup_SQL.format(schema=schema))
+    if schema == "main" and _tableExists(dbCursor, "RollupState") and not _hasColumn(dbCursor, "RollupState", "Rewrites"):
+        dbCursor.execute(f"DROP TABLE {schema}.RollupState;")
+    dbCursor.execute(createRollupState_SQL.format(schema=schema))
+
+    version = ridershipVersion(dbCursor)
+    numRows, maxRow, rewrites = version
+
+    dbCursor.execute(
+        "SELECT Num_Rows, Max_Row, Rewrites FROM RollupState WHERE Name = 'Ridership';"
+    )
+    state = dbCursor.fetchone()
+
+    if schema == "temp" and state is None and not rebuild:
+        mainState = _mainRollupState(dbCursor)
+        if mainState is not None and mainState[2] == rewrites:
+            # Start from the on-disk rollup; the append check below decides
+            # whether only the newer rows need adding
+            dbCursor.execute("INSERT INTO temp.RidershipRollup SELECT * FROM main.RidershipRollup;")
+            state = mainState
+
+    if state is not None and tuple(state) == version and not rebuild:
+        dbConn.commit()
+        return
+
+    watermark = 0
+    if state is not None and state[2] == rewrites and not rebuild:
+        # Append-only growth: every row not yet rolled up sits above the
+        # old watermark, and the old rows are all still there unchanged
+        dbCursor.execute("SELECT COUNT(*) FROM Ridership WHERE rowid > ?;", [state[1]])
+        newRows = dbCursor.fetchone()[0]
+        if state[0] + newRows == numRows:
+            watermark = state[1]
+
+    if watermark == 0:
+        dbCursor.execute("DELETE FROM RidershipRollup;")
+
+    dbCursor.execute(aggregateRidership_SQL, [watermark])
+    dbCursor.execute(
+        "INSERT OR REPLACE INTO RollupState VALUES ('Ridership', ?, ?, ?);",
+        version,
+    )
+    dbConn.commit()
+
+
+def ensureRollups(dbConn):
+    """
+    Make sure the rollup is fresh before it is read. The fingerprint is
+    only recomputed when the database has been written since the last check.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    None
+    """
+
+    counters = _changeCounters(dbConn)
+    if _verified.get(dbConn) == counters:
+        return
+
+    dbCursor = dbConn.cursor()
+    if rollupsAreStale(dbCursor) or _shadowsCurrentRollup(dbCursor):
+        refreshRollups(dbConn)
+        counters = _changeCounters(dbConn)
+
+    _verified[dbConn] = counters
+
+
+def lineRollupsAreStale(dbCursor) -> bool:
+    """
+    Check LineRollup against the fresh RidershipRollup and the current
+    stop topology. RidershipRollup must be up to date.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    bool: True if LineRollup is missing or out of date, False otherwise.
+    """
+
+    if not _tableExists(dbCursor, "LineRollupState") or not _hasColumn(dbCursor, "LineRollupState", "Rewrites"):
+        return True
+
+    dbCursor.execute(
+        "SELECT Num_Rows, Max_Row, Rewrites, Topology FROM LineRollupState WHERE Name = 'Lines';"
+    )
+    state = dbCursor.fetchone()
+    dbCursor.execute("SELECT Num_Rows, Max_Row, Rewrites FROM RollupState WHERE Name = 'Ridership';")
+    ridership = dbCursor.fetchone()
+    dbCursor.execute(topology_SQL)
+    topology = dbCursor.fetchone()[0]
+
+    return state is None or tuple(state) != tuple(ridership) + (topology,)
+
+
+def refreshLineRollups(dbConn):
+    """
+    Rebuild LineRollup from RidershipRollup, which must be up to date.
+    The rebuild reads the rolled-up months rather than Ridership, so it
+    stays cheap however many days there are.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    None
+    """
+
+    schema = "temp" if database.isReadOnly(dbConn) else "main"
+
+    dbCursor = dbConn.cursor()
+    if schema == "main" and not dbConn.in_transaction:
+        dbCursor.execute("BEGIN IMMEDIATE;")
+
+    dbCursor.execute(createLineRollup_SQL.format(schema=schema))
+    if schema == "main" and _tableExists(dbCursor, "LineRollupState") and not _hasColumn(dbCursor, "LineRollupState", "Rewrites"):
+        dbCursor.execute(f"DROP TABLE {schema}.LineRollupState;")
+    dbCursor.execute(createLineRollupState_SQL.format(schema=schema))
+
+    dbCursor.execute("SELECT Num_Rows, Max_Row, Rewrites FROM RollupState WHERE Name = 'Ridership';")
+    version = dbCursor.fetchone()
+    dbCursor.execute(topology_SQL)
+    topology = dbCursor.fetchone()[0]
+
+    dbCursor.execute("DELETE FROM LineRollup;")
+    dbCursor.execute(aggregateLines_SQL)
+    dbCursor.execute(
+        "INSERT OR REPLACE INTO LineRollupState VALUES ('Lines', ?, ?, ?, ?);",
+        list(version) + [topology],
+    )
+    dbConn.commit()
+
+
+def ensureLineRollups(dbConn):
+    """
+    Make sure RidershipRollup and LineRollup are fresh before LineRollup
+    is read. As with ensureRollups(), the check only runs again after the
+    database has been written.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    None
+    """
+
+    ensureRollups(dbConn)
+
+    counters = _changeCounters(dbConn)
+    if _linesVerified.get(dbConn) == counters:
+        return
+
+    if lineRollupsAreStale(dbConn.cursor()):
+        refreshLineRollups(dbConn)
+        counters = _changeCounters(dbConn)
+
+    _linesVerified[dbConn] = counters
@@ -0,0 +1,550 @@
+"""
+Local HTTP/JSON query service for the CTA L analysis app.
+
+Serves the analyses of functions.py over HTTP so dashboards get the same
+answers as the console without starting main.py for every request:
+
+    python server.py --port 8080 --threads 4
+
+    GET /stats                                    general statistics
+    GET /stations?name=%25Kedzie%25               station search
+    GET /daytypes?station=Clark/Lake              day-type split
+    GET /weekdays                                 weekday ranking
+    GET /lines/stops?color=Red&direction=N        stops of a line
+    GET /lines/counts                             stops per line and direction
+    GET /lines/ridership[?year=2019&daytype=W&rule=split]
+                                                  ridership of every line
+    GET /lines/yearly?color=Red[&rule=split]      yearly series of a line
+    GET /lines/monthly?color=Red&year=2019[&rule=split]
+    GET /yearly?station=Howard                    yearly series
+    GET /monthly?station=Howard&year=2019         monthly series
+    GET /daily?station=Howard&year=2019           daily series
+    GET /compare?station1=Howard&station2=Jackson&year=2019
+    GET /trend?start=2015-01-01&end=2025-01-01[&granularity=monthly]
+              [&station=Howard | &line=Red]      trend with year-over-year changes
+    GET /anomalies[?station=Howard&start=2024-01-01&end=2025-01-01&kind=drop&limit=100]
+                                                  flagged days, newest first
+    GET /forecast?station=Howard[&days=14&daytype=W]
+                                                  forecast from the fitted models
+    GET /nearby?lat=41.8781&lon=-87.6298[&radius=1&limit=10]
+    GET /nearest?lat=41.8781&lon=-87.6298[&k=5]
+    GET /metrics                                  latency, cache and load counters
+
+Requests are handled on an asyncio event loop; the SQLite work runs on a
+bounded pool of threads, each with its own read-only connection. Station
+parameters take the same patterns as the console (wildcards _ and %)
+and must match exactly one station. Responses are kept in the shared
+result cache of cache.py, so every client benefits from what the others
+asked for, and the cache is dropped when Ridership changes.
+
+At most --max-concurrent requests run at once; up to --max-queued more
+wait, and further requests are turned away with 503 until load drops.
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import threading
+import time
+import urllib.parse
+
+import cache
+import database
+import functions
+import rollups
+import tracing
+
+# Longest request line plus headers accepted, in bytes
+maxHeaderBytes = 16384
+
+# Longest request body accepted (and discarded; every endpoint is a GET), in bytes
+maxBodyBytes = 65536
+
+statusText = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class RequestError(Exception):
+    """
+    A request that cannot be answered, with the HTTP status to reply with.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _param(params, name, default=None, convert=str):
+    """
+    Read one query parameter, converting it with convert.
+
+    Raises:
+    RequestError: 400 if the parameter is missing (and has no default) or
+                  does not convert.
+    """
+
+    values = params.get(name)
+    if not values:
+        if default is None:
+            raise RequestError(400, f"missing parameter: {name}")
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise RequestError(400, f"invalid {name}: {values[0]!r}") from None
+
+
+def _station(params, name="station"):
+    """
+    Resolve a station parameter the way the console does: it must match
+    exactly one station name.
+
+    Raises:
+    RequestError: 404 if no station matches, 400 if several do.
+    """
+
+    pattern = _param(params, name)
+    matches = functions.stationNameMatches(pattern)
+    if not matches:
+        raise RequestError(404, f"no station matches {pattern!r}")
+    if len(matches) > 1:
+        names = [match.stationName for match in matches[:10]]
+        raise RequestError(
+            400,
+            f"{len(matches)} stations match {pattern!r}: " + ", ".join(names) + (", ..." if len(matches) > 10 else ""),
+        )
+    return matches[0]
+
+
+def _found(value):
+    if value is None:
+        raise RequestError(404, "no data found")
+    return value
+
+
+def _lineStops(params):
+    color = _param(params, "color")
+    if not functions.checkIfLineExists(color):
+        raise RequestError(404, "no such line")
+    return functions.lineStops(color, _param(params, "direction"))
+
+
+def _lineSeries(params, series, *args):
+    color = _param(params, "color")
+    if not functions.checkIfLineExists(color):
+        raise RequestError(404, "no such line")
+    return _found(series(color, *args, rule=_param(params, "rule", "split")))
+
+
+def _trend(params):
+    line = params.get("line", [None])[0]
+    station = _station(params) if "station" in params else None
+    return _found(
+        functions.ridershipTrend(
+            _param(params, "start"),
+            _param(params, "end"),
+            _param(params, "granularity", "monthly"),
+            station,
+            line,
+        )
+    )
+
+
+def _anomalies(params):
+    station = _station(params) if "station" in params else None
+    return functions.ridershipAnomalies(
+        station,
+        params.get("start", [None])[0],
+        params.get("end", [None])[0],
+        params.get("kind", [None])[0],
+        _param(params, "limit", 100, int),
+    )
+
+
+def _compare(params):
+    station1, station2 = _station(params, "station1"), _station(params, "station2")
+    return functions.compareRidership(station1, station2, _param(params, "year"))
+
+
+# Path -> function of the query parameters returning the response data;
+# run on the thread pool
+endpoints = {
+    "/stats": lambda params: functions.generalStats(),
+    "/stations": lambda params: functions.findStations(_param(params, "name")),
+    "/daytypes": lambda params: _found(functions.findPercentageRiders(_station(params))),
+    "/weekdays": lambda params: functions.stationRidershipWeekdays(),
+    "/lines/stops": _lineStops,
+    "/lines/counts": lambda params: functions.numStopsEachLine(),
+    "/lines/ridership": lambda params: functions.lineRidership(
+        params.get("year", [None])[0],
+        params.get("daytype", [None])[0],
+        _param(params, "rule", "split"),
+    ),
+    "/lines/yearly": lambda params: _lineSeries(params, functions.lineYearlyRidership),
+    "/lines/monthly": lambda params: _lineSeries(params, functions.lineMonthlyRidership, _param(params, "year")),
+    "/yearly": lambda params: _found(functions.totalRidershipYear(_station(params))),
+    "/monthly": lambda params: functions.monthlyRidership(_station(params), _param(params, "year")),
+    "/daily": lambda params: _found(functions.dailyRidership(_station(params), _param(params, "year"))),
+    "/compare": _compare,
+    "/trend": _trend,
+    "/anomalies": _anomalies,
+    "/forecast": lambda params: _found(
+        functions.forecastRidership(
+            _station(params), _param(params, "days", 14, int), params.get("daytype", [None])[0]
+        )
+    ),
+    "/nearby": lambda params: functions.findNearbyStations(
+        _param(params, "lat", convert=float),
+        _param(params, "lon", convert=float),
+        _param(params, "radius", 1.0, float),
+        _param(params, "limit", 0, int) or None,
+    ),
+    "/nearest": lambda params: functions.findNearestStations(
+        _param(params, "lat", convert=float),
+        _param(params, "lon", convert=float),
+        _param(params, "k", 1, int),
+    ),
+}
+
+
+def toJson(value):
+    """
+    Turn result records, and lists of them, into plain data for json.
+    """
+
+    if hasattr(value, "asDict"):
+        return {name: toJson(field) for name, field in value.asDict().items()}
+    if isinstance(value, (list, tuple)):
+        return [toJson(item) for item in value]
+    return value
+
+
+def answer(path, params) -> tuple:
+    """
+    Run an endpoint and encode its response, serving it from the shared
+    result cache when the same request was answered on the current data.
+    Runs on the thread pool.
+
+    Args:
+    path (str): The endpoint.
+    params (dict): Query parameters, as from urllib.parse.parse_qs().
+
+    Returns:
+    tuple: (status, JSON body as bytes, True if served from the cache).
+    """
+
+    key = ("http", path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+    version = cache.dataVersion(functions.getConnection())
+
+    hit, response = cache.resultCache.get(key, version)
+    if hit:
+        return response + (True,)
+
+    try:
+        status, data = 200, toJson(endpoints[path](params))
+    except RequestError as error:
+        status, data = error.status, {"error": str(error)}
+    except ValueError as error:
+        status, data = 400, {"error": str(error)}
+
+    response = (status, json.dumps(data).encode())
+    if status in (200, 404):
+        cache.resultCache.put(key, version, response)
+    return response + (False,)
+
+
+class Metrics:
+    """
+    Request counters and latencies per endpoint. Only touched from the
+    event loop, so it needs no lock.
+    """
+
+    def __init__(self, maxSamples=10000):
+        self.maxSamples = maxSamples
+        self.started = time.time()
+        self.rejected = 0
+        self.inFlight = 0
+        self.queued = 0
+        # Endpoint -> {"count", "errors", "cacheHits", "times": deque of ms}
+        self.endpoints = {}
+
+    def record(self, path, status, milliseconds, cacheHit):
+        entry = self.endpoints.get(path)
+        if entry is None:
+            entry = self.endpoints[path] = {
+                "count": 0,
+                "errors": 0,
+                "cacheHits": 0,
+                "times": collections.deque(maxlen=self.maxSamples),
+            }
+        entry["count"] += 1
+        entry["errors"] += status >= 400
+        entry["cacheHits"] += cacheHit
+        entry["times"].append(milliseconds)
+
+    def snapshot(self) -> dict:
+        """
+        Return the counters, with p50/p90/p99/max latency in milliseconds
+        for each endpoint, and the result cache's counters.
+        """
+
+        endpoints = {}
+        for path, entry in sorted(self.endpoints.items()):
+            times = sorted(entry["times"])
+            endpoints[path] = {
+                "count": entry["count"],
+                "errors": entry["errors"],
+                "cacheHits": entry["cacheHits"],
+                "p50Ms": round(tracing.percentile(times, 0.50), 3),
+                "p90Ms": round(tracing.percentile(times, 0.90), 3),
+                "p99Ms": round(tracing.percentile(times, 0.99), 3),
+                "maxMs": round(times[-1], 3),
+            }
+
+        return {
+            "uptimeSeconds": round(time.time() - self.started, 1),
+            "inFlight": self.inFlight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "endpoints": endpoints,
+            "cache": cache.resultCache.stats(),
+        }
+
+
+class QueryServer:
+    """
+    The HTTP server: parses requests on the event loop and answers them
+    on a thread pool of read-only connections.
+    """
+
+    def __init__(self, threads=4, maxConcurrent=32, maxQueued=128):
+        """
+        Args:
+        threads (int): Worker threads, each with its own connection.
+        maxConcurrent (int): Requests answered at once.
+        maxQueued (int): Requests allowed to wait for a slot; more get 503.
+        """
+
+        self.threads = threads
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="cta-query"
+        )
+        self.maxConcurrent = maxConcurrent
+        self.maxQueued = maxQueued
+        self.metrics = Metrics()
+        self._slots = None
+
+    async def handle(self, method, target) -> tuple:
+        """
+        Answer one request.
+
+        Returns:
+        tuple: (status, JSON body as bytes).
+        """
+
+        url = urllib.parse.urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+
+        if method not in ("GET", "HEAD"):
+            return 405, json.dumps({"error": "only GET is supported"}).encode()
+        if path == "/metrics":
+            return 200, json.dumps(self.metrics.snapshot()).encode()
+        if path not in endpoints:
+            return 404, json.dumps({"error": f"no such endpoint: {path}"}).encode()
+
+        if self.metrics.queued >= self.maxQueued:
+            self.metrics.rejected += 1
+            return 503, json.dumps({"error": "server busy, try again"}).encode()
+
+        started = time.perf_counter()
+        self.metrics.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.metrics.queued -= 1
+
+        self.metrics.inFlight += 1
+        try:
+            params = urllib.parse.parse_qs(url.query)
+            loop = asyncio.get_running_loop()
+            try:
+                status, body, cacheHit = await loop.run_in_executor(self.executor, answer, path, params)
+            except Exception as error:
+                status, body, cacheHit = 500, json.dumps({"error": repr(error)}).encode(), False
+        finally:
+            self.metrics.inFlight -= 1
+            self._slots.release()
+
+        self.metrics.record(path, status, (time.perf_counter() - started) * 1000, cacheHit)
+        return status, body
+
+    async def serveClient(self, reader, writer):
+        """
+        Serve the requests of one client connection, keeping it open
+        between requests unless the client asks otherwise.
+        """
+
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.LimitOverrunError:
+                    await self._reply(writer, 413, b'{"error": "request too large"}', False)
+                    return
+                except asyncio.IncompleteReadError:
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                requestLine = lines[0].split()
+                if len(requestLine) != 3:
+                    await self._reply(writer, 400, b'{"error": "malformed request"}', False)
+                    return
+                method, target, version = requestLine
+
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+
+                keepAlive = headers.get("connection") != "close" and version == "HTTP/1.1"
+
+                # Skip any body, so it is not read as the next request
+                if "transfer-encoding" in headers:
+                    await self._reply(writer, 411, b'{"error": "request bodies need a Content-Length"}', False)
+                    return
+                length = headers.get("content-length", "0")
+                if not length.isdigit():
+                    await self._reply(writer, 400, b'{"error": "malformed Content-Length"}', False)
+                    return
+                if int(length) > maxBodyBytes:
+                    await self._reply(writer, 413, b'{"error": "request too large"}', False)
+                    return
+                try:
+                    await reader.readexactly(int(length))
+                except asyncio.IncompleteReadError:
+                    return
+
+                status, body = await self.handle(method, target)
+                await self._reply(writer, status, b"" if method == "HEAD" else body, keepAlive, len(body))
+                if not keepAlive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _reply(self, writer, status, body, keepAlive, length=None):
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {statusText.get(status, '')}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body) if length is None else length}\r\n"
+                f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n"
+                "\r\n"
+            ).encode()
+            + body
+        )
+        await writer.drain()
+
+    def openConnections(self):
+        """
+        Open every worker thread's connection and run its one-time
+        checks (Ridership fingerprint, rollup freshness) now, rather than
+        in the first requests each thread serves.
+        """
+
+        # Each task holds its thread until all have started, so every thread gets one
+        barrier = threading.Barrier(self.threads)
+
+        def openConnection():
+            barrier.wait()
+            dbConn = functions.getConnection()
+            cache.dataVersion(dbConn)
+            rollups.ensureLineRollups(dbConn)
+
+        for future in [self.executor.submit(openConnection) for _ in range(self.threads)]:
+            future.result()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        """
+        Accept connections until cancelled.
+
+        Args:
+        host (str): Address to listen on.
+        port (int): Port to listen on, 0 for any free one.
+        ready (function): Called with the bound (host, port) once listening.
+        """
+
+        self._slots = asyncio.Semaphore(self.maxConcurrent)
+        await asyncio.get_running_loop().run_in_executor(None, self.openConnections)
+        server = await asyncio.start_server(self.serveClient, host, port, limit=maxHeaderBytes)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def prepare(warm=False):
+    """
+    Bring the indexes and rollup up to date, then switch to read-only
+    connections for the worker threads.
+
+    Args:
+    warm (bool): Also load the station catalog and stop index and cache
+                 the whole-network answers before taking requests.
+    """
+
+    dbConn = functions.getConnection()
+    if not database.isReadOnly(dbConn):
+        rollups.ensureLineRollups(dbConn)
+
+    database.configure(read_only=True)
+    database.closeAll()
+
+    if warm:
+        for path in ("/stats", "/weekdays", "/lines/counts", "/lines/ridership"):
+            answer(path, {})
+        functions.findNearestStations(41.8781, -87.6298)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the CTA L analyses over HTTP as JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    parser.add_argument("--threads", type=int, default=4, help="query threads (default: 4)")
+    parser.add_argument("--max-concurrent", type=int, default=32, help="requests answered at once (default: 32)")
+    parser.add_argument("--max-queued", type=int, default=128, help="requests waiting before 503s (default: 128)")
+    parser.add_argument("--warm", action="store_true", help="fill the cache with the network-wide answers first")
+    parser.add_argument("--db", help="path of the ridership database")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        database.configure(path=args.db)
+
+    prepare(args.warm)
+    server = QueryServer(args.threads, args.max_concurrent, args.max_queued)
+
+    def ready(address):
+        print(f"Serving on http://{address[0]}:{address[1]}/ ({args.threads} query threads)")
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Spatial index over station stops for the CTA L analysis app.
+
+Stop coordinates are loaded once into NumPy arrays and bucketed into a
+uniform latitude/longitude grid. A search only looks at the grid cells
+that overlap the search circle's bounding box, then computes exact
+great-circle (haversine) distances for those candidates in one vectorized
+step. Radius searches and k-nearest searches both return stops sorted by
+distance. Call reloadStopIndex() after the Stops table changes.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+import database
+
+# Mean radius of the Earth in miles
+earthRadius = 3958.8
+
+# Miles per degree of latitude; a degree of longitude is this times cos(latitude)
+milesPerDegree = earthRadius * math.pi / 180
+
+# No two points on the Earth are further apart than half its circumference
+maxDistance = math.pi * earthRadius
+
+
+def haversine(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distance from one point to many, in miles.
+
+    Args:
+    latitude (float): Latitude of the origin, in degrees.
+    longitude (float): Longitude of the origin, in degrees.
+    latitudes (np.ndarray): Latitudes of the other points, in degrees.
+    longitudes (np.ndarray): Longitudes of the other points, in degrees.
+
+    Returns:
+    np.ndarray: Distance to each point, in miles.
+    """
+
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dLat = lat2 - lat1
+    dLon = np.radians(longitudes) - np.radians(longitude)
+
+    a = np.sin(dLat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dLon / 2) ** 2
+    return 2 * earthRadius * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class StopIndex:
+    """
+    Grid index over (name, latitude, longitude) points.
+    """
+
+    def __init__(self, names, latitudes, longitudes, cellSize=0.02):
+        """
+        Args:
+        names (list): Station name of each point.
+        latitudes (list): Latitude of each point, in degrees.
+        longitudes (list): Longitude of each point, in degrees.
+        cellSize (float): Grid cell size in degrees (0.02 is about 1.4 miles
+                          north-south in Chicago).
+        """
+
+        self.names = list(names)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.cellSize = cellSize
+
+        # Grid cell -> indices of the points inside it; points without
+        # finite coordinates go in no cell
+        located = np.flatnonzero(np.isfinite(self.latitudes) & np.isfinite(self.longitudes))
+        rows = np.floor(self.latitudes[located] / cellSize).astype(np.int64)
+        cols = np.floor(self.longitudes[located] / cellSize).astype(np.int64)
+        self.cells = {}
+        for index, cell in zip(located.tolist(), zip(rows.tolist(), cols.tolist())):
+            self.cells.setdefault(cell, []).append(index)
+        self.cells = {cell: np.array(indices) for cell, indices in self.cells.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _checkPoint(latitude, longitude):
+        """
+        Raise ValueError unless the search point is a finite coordinate.
+        """
+
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            raise ValueError(f"search point must be finite, not ({latitude}, {longitude})")
+
+    def _candidates(self, latitude, longitude, radius):
+        """
+        Indices of the points in grid cells overlapping the bounding box
+        of a circle around (latitude, longitude).
+        """
+
+        latDelta = radius / milesPerDegree
+        # Longitude degrees shrink towards the poles; widen the box to match
+        lonDelta = radius / (milesPerDegree * max(math.cos(math.radians(latitude)), 1e-6))
+
+        rowMin = math.floor((latitude - latDelta) / self.cellSize)
+        rowMax = math.floor((latitude + latDelta) / self.cellSize)
+        colMin = math.floor((longitude - lonDelta) / self.cellSize)
+        colMax = math.floor((longitude + lonDelta) / self.cellSize)
+
+        # A huge box would visit more empty cells than there are points
+        if (rowMax - rowMin + 1) * (colMax - colMin + 1) > len(self.cells):
+            return np.arange(len(self.names))
+
+        found = [
+            self.cells[(row, col)]
+            for row in range(rowMin, rowMax + 1)
+            for col in range(colMin, colMax + 1)
+            if (row, col) in self.cells
+        ]
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    def withinRadius(self, latitude, longitude, radius=1.0, limit=None):
+        """
+        Find the points within a radius, nearest first.
+
+        Args:
+        latitude (float): Latitude of the search point.
+        longitude (float): Longitude of the search point.
+        radius (float): Search radius in miles.
+        limit (int): Return at most this many points.
+
+        Returns:
+        list: (index, distance in miles) pairs sorted by distance.
+
+        Raises:
+        ValueError: If latitude or longitude is NaN or infinite.
+        """
+
+        self._checkPoint(latitude, longitude)
+        candidates = self._candidates(latitude, longitude, radius)
+        if len(candidates) == 0:
+            return []
+
+        distances = haversine(
+            latitude, longitude, self.latitudes[candidates], self.longitudes[candidates]
+        )
+        inside = distances <= radius
+        candidates = candidates[inside]
+        distances = distances[inside]
+
+        order = np.argsort(distances, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+
+        return list(zip(candidates[order].tolist(), distances[order].tolist()))
+
+    def nearest(self, latitude, longitude, k=1, maxRadius=None):
+        """
+        Find the k nearest points, growing the search circle until it
+        holds at least k points (or every point has been considered).
+
+        Args:
+        latitude (float): Latitude of the search point.
+        longitude (float): Longitude of the search point.
+        k (int): Number of points to return.
+        maxRadius (float): Ignore points further than this many miles.
+
+        Returns:
+        list: (index, distance in miles) pairs sorted by distance. Points
+        without finite coordinates are never found, so fewer than k
+        pairs may come back.
+
+        Raises:
+        ValueError: If latitude or longitude is NaN or infinite.
+        """
+
+        self._checkPoint(latitude, longitude)
+        k = min(k, len(self.names))
+        if k <= 0:
+            return []
+
+        radius = self.cellSize * milesPerDegree
+        while True:
+            if maxRadius is not None and radius >= maxRadius:
+                return self.withinRadius(latitude, longitude, maxRadius, k)
+
+            found = self.withinRadius(latitude, longitude, radius, k)
+            # Once the circle holds k points, nothing outside it can be
+            # closer; once it covers the globe, nothing is left to find
+            if len(found) >= k or radius >= maxDistance:
+                return found
+            radius = min(radius * 2, maxDistance)
+
+
+def loadStopIndex(dbConn) -> StopIndex:
+    """
+    Build a StopIndex over every distinct station stop location.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    StopIndex: The index.
+    """
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        """
+        SELECT Station_Name, Latitude, Longitude
+        FROM Stations JOIN Stops
+        ON Stations.Station_ID = Stops.Station_ID
+        GROUP BY Station_Name, Latitude, Longitude
+        ORDER BY Station_Name ASC, Latitude DESC
+        """
+    )
+    rows = dbCursor.fetchall()
+
+    return StopIndex(
+        [row[0] for row in rows],
+        [row[1] for row in rows],
+        [row[2] for row in rows],
+    )
+
+
+_stopIndex = None
+_stopIndexLock = threading.Lock()
+
+
+def getStopIndex() -> StopIndex:
+    """
+    Return the shared stop index, building it on first use.
+
+    Returns:
+    StopIndex: The index.
+    """
+
+    global _stopIndex
+
+    if _stopIndex is None:
+        with _stopIndexLock:
+            if _stopIndex is None:
+                _stopIndex = loadStopIndex(database.getConnection())
+
+    return _stopIndex
+
+
+def reloadStopIndex():
+    """
+    Drop the shared stop index so the next getStopIndex() rebuilds it.
+    """
+
+    global _stopIndex
+
+    with _stopIndexLock:
+        _stopIndex = None
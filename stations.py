@@ -0,0 +1,192 @@
+"""
+In-memory station catalog for the CTA L analysis app.
+
+The Stations table is small and rarely changes, so it is loaded once and
+station name patterns (SQL LIKE syntax, wildcards _ and %) are resolved to
+Station_IDs in memory. The ridership queries then filter on integer
+Station_IDs instead of joining Stations and matching names with LIKE.
+Call reloadCatalog() after the Stations table changes.
+"""
+
+import re
+import threading
+
+import database
+import results
+
+
+def likeToRegex(pattern):
+    """
+    Compile a SQL LIKE pattern into an equivalent regular expression.
+    Like SQLite's LIKE, matching ignores case for ASCII letters only.
+
+    Args:
+    pattern (str): The LIKE pattern, e.g. "Clark%".
+
+    Returns:
+    re.Pattern: A compiled pattern to use with fullmatch().
+    """
+
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+
+    return re.compile("".join(parts), re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+class StationCatalog:
+    """
+    Every station name with its Station_IDs. Several Station_IDs can share
+    one name, so name lookups resolve to results.ResolvedStation records.
+    """
+
+    def __init__(self, rows):
+        """
+        Args:
+        rows (list): (Station_ID, Station_Name) for every station.
+        """
+
+        self.stations = sorted(
+            (results.Station(stationId, stationName) for stationId, stationName in rows),
+            key=lambda station: (station.stationName, station.stationId),
+        )
+
+        # Station name -> sorted Station_IDs with that name
+        self.idsByName = {}
+        for station in self.stations:
+            self.idsByName.setdefault(station.stationName, []).append(station.stationId)
+
+        self.namesById = {station.stationId: station.stationName for station in self.stations}
+
+    def iterSearch(self, pattern):
+        """
+        Yield the stations whose names match a LIKE pattern, ordered by name.
+
+        Args:
+        pattern (str): The name pattern (wildcards _ and %).
+        """
+
+        regex = likeToRegex(pattern)
+        return (station for station in self.stations if regex.fullmatch(station.stationName))
+
+    def search(self, pattern) -> list:
+        """
+        Find the stations whose names match a LIKE pattern.
+
+        Args:
+        pattern (str): The name pattern (wildcards _ and %).
+
+        Returns:
+        list: results.Station for each match, ordered by name.
+        """
+
+        return list(self.iterSearch(pattern))
+
+    def resolve(self, pattern) -> list:
+        """
+        Resolve a LIKE pattern to the distinct station names it matches.
+
+        Args:
+        pattern (str): The name pattern (wildcards _ and %).
+
+        Returns:
+        list: results.ResolvedStation for each matching name, ordered by name.
+        """
+
+        regex = likeToRegex(pattern)
+        return [
+            results.ResolvedStation(stationName, tuple(stationIds))
+            for stationName, stationIds in self.idsByName.items()
+            if regex.fullmatch(stationName)
+        ]
+
+    def lookup(self, pattern):
+        """
+        Resolve a LIKE pattern to a single ResolvedStation covering every
+        station it matches, named after the first match.
+
+        Args:
+        pattern (str): The name pattern (wildcards _ and %).
+
+        Returns:
+        results.ResolvedStation: The combined match, or None if nothing matches.
+        """
+
+        matches = self.resolve(pattern)
+        if not matches:
+            return None
+
+        stationIds = sorted(
+            stationId for match in matches for stationId in match.stationIds
+        )
+        return results.ResolvedStation(matches[0].stationName, tuple(stationIds))
+
+    def exact(self, stationName):
+        """
+        Resolve an exact, case-sensitive station name.
+
+        Args:
+        stationName (str): The full station name.
+
+        Returns:
+        results.ResolvedStation: The station, or None if no station has that name.
+        """
+
+        stationIds = self.idsByName.get(stationName)
+        if stationIds is None:
+            return None
+        return results.ResolvedStation(stationName, tuple(stationIds))
+
+
+_catalog = None
+_catalogLock = threading.Lock()
+
+
+def loadCatalog(dbConn) -> StationCatalog:
+    """
+    Read the Stations table into a new catalog.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    StationCatalog: The catalog.
+    """
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute("SELECT Station_ID, Station_Name FROM Stations;")
+    return StationCatalog(dbCursor.fetchall())
+
+
+def getCatalog() -> StationCatalog:
+    """
+    Return the shared catalog, loading it on first use.
+
+    Returns:
+    StationCatalog: The catalog.
+    """
+
+    global _catalog
+
+    if _catalog is None:
+        with _catalogLock:
+            if _catalog is None:
+                _catalog = loadCatalog(database.getConnection())
+
+    return _catalog
+
+
+def reloadCatalog():
+    """
+    Drop the shared catalog so the next getCatalog() reads Stations again.
+    """
+
+    global _catalog
+
+    with _catalogLock:
+        _catalog = None
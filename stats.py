@@ -0,0 +1,197 @@
+"""
+General database statistics for the CTA L analysis app.
+
+The statistics shown at startup (station, stop and ride entry counts, the
+date range and the total ridership) are computed in a single pass over
+Ridership and saved in the GeneralStats table, keyed on a fingerprint of
+the data. Later launches against an unchanged database read them back
+instead of scanning Ridership again.
+"""
+
+import database
+import results
+import rollups
+
+# Cached statistics, one row per data fingerprint
+createStats_SQL = """
+                  CREATE TABLE IF NOT EXISTS GeneralStats (
+                      Fingerprint TEXT PRIMARY KEY,
+                      Num_Stations INTEGER NOT NULL,
+                      Num_Stops INTEGER NOT NULL,
+                      Num_Entries INTEGER NOT NULL,
+                      Earliest_Date TEXT,
+                      Latest_Date TEXT,
+                      Total_Riders INTEGER NOT NULL
+                  )
+                  """
+
+# Everything needed from Ridership, in one scan
+ridershipStats_SQL = """
+                     SELECT COUNT(*), Date(MIN(Ride_Date)), Date(MAX(Ride_Date)),
+                            IFNULL(SUM(Num_Riders), 0)
+                     FROM Ridership
+                     """
+
+statsColumns = results.GeneralStats.__slots__
+
+
+def dataFingerprint(dbCursor) -> str:
+    """
+    Build a fingerprint that changes whenever Stations or Stops gain or
+    lose rows, or Ridership rows are added, updated or deleted (see
+    rollups.ridershipVersion()).
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    str: The fingerprint, e.g. "147:302:1048576:1048576:0".
+    """
+
+    dbCursor.execute("SELECT (SELECT COUNT(*) FROM Stations), (SELECT COUNT(*) FROM Stops);")
+    numStations, numStops = dbCursor.fetchone()
+    numRows, maxRow, rewrites = rollups.ridershipVersion(dbCursor)
+
+    return f"{numStations}:{numStops}:{numRows}:{maxRow}:{rewrites}"
+
+
+def computeStats(dbCursor) -> results.GeneralStats:
+    """
+    Compute the general statistics directly from the base tables.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+
+    Returns:
+    results.GeneralStats: The statistics.
+    """
+
+    dbCursor.execute("SELECT (SELECT COUNT(*) FROM Stations), (SELECT COUNT(*) FROM Stops);")
+    counts = dbCursor.fetchone()
+
+    dbCursor.execute(ridershipStats_SQL)
+    ridership = dbCursor.fetchone()
+
+    return results.GeneralStats(*counts, *ridership)
+
+
+def generalStats(dbConn) -> results.GeneralStats:
+    """
+    Return the general statistics, from the GeneralStats table when it holds
+    an entry for the current data fingerprint, otherwise by computing them
+    and saving the result for next time.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+
+    Returns:
+    results.GeneralStats: The statistics.
+    """
+
+    readOnly = database.isReadOnly(dbConn)
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'GeneralStats';"
+    )
+    hasTable = dbCursor.fetchone() is not None
+
+    # A read-only database without the table can only compute the stats
+    if not hasTable and readOnly:
+        return computeStats(dbCursor)
+    if not dbConn.in_transaction:
+        rollups.ensureRewriteTracking(dbConn)
+    dbCursor.execute(createStats_SQL)
+
+    fingerprint = dataFingerprint(dbCursor)
+
+    dbCursor.execute(
+        """
+        SELECT Num_Stations, Num_Stops, Num_Entries, Earliest_Date, Latest_Date, Total_Riders
+        FROM GeneralStats
+        WHERE Fingerprint = ?
+        """,
+        [fingerprint],
+    )
+    row = dbCursor.fetchone()
+
+    if row is not None:
+        dbConn.commit()
+        return results.GeneralStats(*row)
+
+    stats = computeStats(dbCursor)
+    if readOnly:
+        return stats
+
+    # Only the entry for the current data is worth keeping
+    dbCursor.execute("DELETE FROM GeneralStats;")
+    dbCursor.execute(
+        "INSERT INTO GeneralStats VALUES (?, ?, ?, ?, ?, ?, ?);",
+        [fingerprint] + [getattr(stats, name) for name in statsColumns],
+    )
+    dbConn.commit()
+
+    return stats
+
+
+def appendStats(dbConn, oldFingerprint, added):
+    """
+    Carry the saved statistics forward after rows were appended to
+    Ridership, combining them with the statistics of the new rows instead
+    of scanning Ridership again. Runs inside the caller's transaction.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    oldFingerprint (str): dataFingerprint() from before the rows were added.
+    added (tuple): (count, earliest date, latest date, total riders) of the
+                   added rows, dates as 'YYYY-MM-DD'.
+
+    Returns:
+    results.GeneralStats: The new statistics, or None if none were saved
+    for oldFingerprint (generalStats() will compute them when asked).
+    """
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'GeneralStats';"
+    )
+    if dbCursor.fetchone() is None:
+        return None
+
+    dbCursor.execute(
+        """
+        SELECT Num_Stations, Num_Stops, Num_Entries, Earliest_Date, Latest_Date, Total_Riders
+        FROM GeneralStats
+        WHERE Fingerprint = ?
+        """,
+        [oldFingerprint],
+    )
+    row = dbCursor.fetchone()
+    if row is None:
+        return None
+
+    old = results.GeneralStats(*row)
+    numAdded, earliestAdded, latestAdded, ridersAdded = added
+
+    dbCursor.execute("SELECT (SELECT COUNT(*) FROM Stations), (SELECT COUNT(*) FROM Stops);")
+    numStations, numStops = dbCursor.fetchone()
+
+    earliestDates = [date for date in (old.earliestDate, earliestAdded) if date is not None]
+    latestDates = [date for date in (old.latestDate, latestAdded) if date is not None]
+
+    stats = results.GeneralStats(
+        numStations,
+        numStops,
+        old.numEntries + numAdded,
+        min(earliestDates, default=None),
+        max(latestDates, default=None),
+        old.totalRiders + ridersAdded,
+    )
+
+    dbCursor.execute("DELETE FROM GeneralStats;")
+    dbCursor.execute(
+        "INSERT INTO GeneralStats VALUES (?, ?, ?, ?, ?, ?, ?);",
+        [dataFingerprint(dbCursor)] + [getattr(stats, name) for name in statsColumns],
+    )
+
+    return stats
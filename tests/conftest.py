@@ -0,0 +1,48 @@
+"""
+Shared fixtures for the CTA L analysis app tests.
+
+Each test gets a small synthetic ridership database (benchmarks/syntheticdb.py)
+as the configured database, and the module-level caches are reset around it.
+"""
+
+import os
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, "benchmarks")]
+
+import cache  # noqa: E402
+import database  # noqa: E402
+import stations  # noqa: E402
+import syntheticdb  # noqa: E402
+
+
+@pytest.fixture
+def dbPath(tmp_path):
+    """
+    Path of a fresh synthetic database: 12 stations, two years of days.
+    """
+
+    path = str(tmp_path / "ridership.db")
+    syntheticdb.generate(path, stations=12, years=2, startYear=2020, seed=1)
+    return path
+
+
+@pytest.fixture
+def dbConn(dbPath):
+    """
+    Writable connection to the synthetic database, which is also the
+    configured database for the analysis functions.
+    """
+
+    database.configure(path=dbPath, read_only=False, column_store="")
+    cache.resultCache.clear()
+    stations.reloadCatalog()
+
+    yield database.getConnection()
+
+    database.closeAll()
+    cache.resultCache.clear()
+    stations.reloadCatalog()
@@ -0,0 +1,76 @@
+"""
+Tests for the anomaly scan in anomalies.py.
+"""
+
+import anomalies
+import indexes
+
+
+def flaggedDays(dbConn) -> list:
+    return dbConn.execute("SELECT * FROM Anomalies ORDER BY Station_ID, Ride_Date;").fetchall()
+
+
+def test_incremental_rows_plan(dbConn):
+    indexes.ensureIndexes(dbConn)
+    plan = [row[3] for row in dbConn.execute(
+        "EXPLAIN QUERY PLAN " + anomalies.incrementalRows_SQL, [0, anomalies.defaultWindow - 1]
+    )]
+
+    assert "MATERIALIZE Bounds" in plan
+    assert not [step for step in plan if step.startswith("SCAN Ridership")]
+
+
+def test_incremental_scan_matches_full_scan(dbConn):
+    # Hold back the last days, scan, then append them again
+    held = dbConn.execute(
+        "SELECT rowid, * FROM Ridership WHERE Ride_Date >= '2021-11-01' ORDER BY rowid;"
+    ).fetchall()
+    dbConn.execute("DELETE FROM Ridership WHERE Ride_Date >= '2021-11-01';")
+    dbConn.commit()
+
+    assert anomalies.scan(dbConn, threshold=3).mode == "full"
+    dbConn.executemany("INSERT INTO Ridership (rowid, Station_ID, Ride_Date, Type_of_Day, Num_Riders) "
+                       "VALUES (?, ?, ?, ?, ?);", held)
+    dbConn.commit()
+
+    assert anomalies.scan(dbConn, threshold=3).mode == "incremental"
+    incremental = flaggedDays(dbConn)
+    assert anomalies.scan(dbConn, full=True, threshold=3).mode == "full"
+    assert flaggedDays(dbConn) == incremental
+
+
+def test_update_forces_full_scan(dbConn):
+    anomalies.scan(dbConn)
+    assert anomalies.scan(dbConn).mode == "current"
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = 0 WHERE rowid = 100;")
+    dbConn.commit()
+
+    assert anomalies.scan(dbConn).mode == "full"
+
+
+def test_backfill_rescores_later_days(dbConn):
+    # Hold back three weeks of one station and triple a day after them,
+    # scan, then backfill the weeks tripled too: the day is no longer
+    # unusual against its window, and its old flag has to go
+    held = dbConn.execute(
+        "SELECT Station_ID, Ride_Date, Type_of_Day, Num_Riders * 3 FROM Ridership WHERE Station_ID = 40000 "
+        "AND Ride_Date >= '2021-06-01' AND Ride_Date < '2021-06-22' ORDER BY Ride_Date;"
+    ).fetchall()
+    dbConn.execute("DELETE FROM Ridership WHERE Station_ID = 40000 "
+                   "AND Ride_Date >= '2021-06-01' AND Ride_Date < '2021-06-22';")
+    dbConn.execute("UPDATE Ridership SET Num_Riders = Num_Riders * 3 WHERE Station_ID = 40000 "
+                   "AND Ride_Date LIKE '2021-06-23%';")
+    dbConn.commit()
+
+    anomalies.scan(dbConn, threshold=3)
+    assert (40000, "2021-06-23") in [day[:2] for day in flaggedDays(dbConn)]
+    dbConn.executemany("INSERT INTO Ridership (Station_ID, Ride_Date, Type_of_Day, Num_Riders) "
+                       "VALUES (?, ?, ?, ?);", held)
+    dbConn.commit()
+
+    assert anomalies.scan(dbConn, threshold=3).mode == "incremental"
+    incremental = flaggedDays(dbConn)
+    assert (40000, "2021-06-23") not in [day[:2] for day in incremental]
+    assert anomalies.scan(dbConn, full=True, threshold=3).mode == "full"
+    assert flaggedDays(dbConn) == incremental
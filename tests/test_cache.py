@@ -0,0 +1,35 @@
+"""
+Tests for the result cache's view of the ridership data in cache.py.
+"""
+
+import cache
+import functions
+
+
+def stationName(dbConn) -> str:
+    return dbConn.execute("SELECT Station_Name FROM Stations ORDER BY Station_ID LIMIT 1;").fetchone()[0]
+
+
+def test_update_changes_data_version(dbConn):
+    before = cache.dataVersion(dbConn)
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = Num_Riders + 1 WHERE rowid = 1;")
+    dbConn.commit()
+
+    assert cache.dataVersion(dbConn) != before
+
+
+def test_cached_result_follows_update(dbConn):
+    name = stationName(dbConn)
+    before = functions.totalRidershipYear(name)
+
+    dbConn.execute(
+        "UPDATE Ridership SET Num_Riders = Num_Riders + 1000 "
+        "WHERE rowid = (SELECT MIN(rowid) FROM Ridership WHERE Station_ID = "
+        "(SELECT Station_ID FROM Stations WHERE Station_Name = ?));",
+        [name],
+    )
+    dbConn.commit()
+
+    after = functions.totalRidershipYear(name)
+    assert sum(after.riders) == sum(before.riders) + 1000
@@ -0,0 +1,79 @@
+"""
+Tests for the columnar Ridership store in columnar.py.
+"""
+
+import cache
+import columnar
+import database
+import functions
+
+
+def stationTotals(dbConn, stationId) -> list:
+    return dbConn.execute(
+        """
+        SELECT CAST(strftime('%Y', Ride_Date) AS INTEGER) AS Year, SUM(Num_Riders)
+        FROM Ridership WHERE Station_ID = ? GROUP BY Year ORDER BY Year
+        """,
+        [stationId],
+    ).fetchall()
+
+
+def firstStation(dbConn) -> tuple:
+    return dbConn.execute("SELECT Station_ID, Station_Name FROM Stations ORDER BY Station_ID LIMIT 1;").fetchone()
+
+
+def test_export_matches_database(dbConn, tmp_path):
+    directory = str(tmp_path / "columns")
+    meta = columnar.exportStore(dbConn, directory)
+
+    store = columnar.openStore(dbConn, directory)
+    assert store is not None
+    assert meta["fingerprint"] == cache.dataVersion(dbConn)
+    assert len(store) == dbConn.execute("SELECT COUNT(*) FROM Ridership;").fetchone()[0]
+
+    stationId = firstStation(dbConn)[0]
+    assert store.yearlyTotals((stationId,)) == [tuple(row) for row in stationTotals(dbConn, stationId)]
+
+
+def test_store_is_used_by_the_query_functions(dbPath, tmp_path):
+    directory = str(tmp_path / "columns")
+    database.configure(path=dbPath, read_only=False, column_store=directory)
+    try:
+        dbConn = database.getConnection()
+        columnar.exportStore(dbConn, directory)
+
+        assert functions.columnStore(dbConn) is not None
+        stationId, name = firstStation(dbConn)
+        series = functions.totalRidershipYear(name)
+        assert list(zip(map(int, series.labels), series.riders)) == stationTotals(dbConn, stationId)
+    finally:
+        database.configure(column_store="")
+        database.closeAll()
+        cache.resultCache.clear()
+
+
+def test_store_goes_stale_and_merges_appended_rows(dbConn, tmp_path):
+    directory = str(tmp_path / "columns")
+    columnar.exportStore(dbConn, directory)
+    exported = len(columnar.openStore(dbConn, directory))
+
+    dbConn.execute("INSERT INTO Ridership SELECT Station_ID, '2022-01-01T00:00:00.000', 'U', 10 FROM Stations;")
+    dbConn.commit()
+    assert columnar.openStore(dbConn, directory) is None
+
+    meta = columnar.exportStore(dbConn, directory)
+    store = columnar.openStore(dbConn, directory)
+    assert len(store) == exported + 12
+    assert meta["rewrites"] == 0
+
+
+def test_update_makes_store_stale(dbConn, tmp_path):
+    directory = str(tmp_path / "columns")
+    columnar.exportStore(dbConn, directory)
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = Num_Riders + 1 WHERE rowid = 1;")
+    dbConn.commit()
+    assert columnar.openStore(dbConn, directory) is None
+
+    columnar.exportStore(dbConn, directory)
+    assert columnar.openStore(dbConn, directory) is not None
@@ -0,0 +1,54 @@
+"""
+Tests for connection management in database.py.
+"""
+
+import gc
+import os
+import weakref
+
+import database
+import rollups
+
+
+def test_read_only_connection_with_special_characters(tmp_path, dbPath):
+    path = tmp_path / "odd #name?.db"
+    os.rename(dbPath, path)
+
+    dbConn = database.connect(path=str(path), read_only=True)
+    try:
+        assert dbConn.execute("SELECT COUNT(*) FROM Stations;").fetchone()[0] == 12
+    finally:
+        dbConn.close()
+
+
+def test_relative_read_only_path(tmp_path, dbPath, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(dbPath))
+
+    dbConn = database.connect(path=os.path.basename(dbPath), read_only=True)
+    try:
+        assert database.isReadOnly(dbConn)
+        assert dbConn.execute("SELECT COUNT(*) FROM Stations;").fetchone()[0] == 12
+    finally:
+        dbConn.close()
+
+
+def test_closed_connections_are_released(dbPath):
+    dbConn = database.connect(path=dbPath)
+    rollups.ensureRollups(dbConn)
+    assert dbConn in rollups._verified
+
+    released = weakref.ref(dbConn)
+    dbConn.close()
+    del dbConn
+    gc.collect()
+
+    assert released() is None
+
+
+def test_close_all_forgets_pooled_connections(dbConn):
+    assert dbConn in database._connections
+
+    database.closeAll()
+
+    assert not len(database._connections)
+    assert database.getConnection() is not dbConn
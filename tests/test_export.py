@@ -0,0 +1,59 @@
+"""
+Tests for the CSV and JSON export in export.py.
+"""
+
+import csv
+import io
+import json
+
+import pytest
+
+import export
+import functions
+
+
+def test_weekdays_csv_matches_query(dbConn, tmp_path, capsys):
+    path = tmp_path / "weekdays.csv"
+
+    export.main(["weekdays", str(path), "--db", dbConn.path])
+
+    expected = functions.stationRidershipWeekdays()
+    with open(path, newline="") as exportFile:
+        rows = list(csv.reader(exportFile))
+    assert rows[0] == list(expected[0].__slots__)
+    assert rows[1:] == [[str(value) for value in record.asDict().values()] for record in expected]
+    assert capsys.readouterr().out == f"{len(expected):,} rows written to {path}\n"
+
+
+def test_stops_json_matches_query(dbConn, tmp_path):
+    color, direction = dbConn.execute(
+        "SELECT Color, Direction FROM Lines JOIN StopDetails ON Lines.Line_ID = StopDetails.Line_ID "
+        "JOIN Stops ON StopDetails.Stop_ID = Stops.Stop_ID LIMIT 1;"
+    ).fetchone()
+    path = tmp_path / "stops.json"
+
+    export.main(["stops", color, direction, str(path), "--db", dbConn.path])
+
+    with open(path) as exportFile:
+        assert json.load(exportFile) == [record.asDict() for record in functions.lineStops(color, direction)]
+
+
+def test_stations_to_stdout_as_json(dbConn, capsys):
+    export.main(["stations", "%", "-", "--format", "json", "--db", dbConn.path])
+
+    assert json.loads(capsys.readouterr().out) == [record.asDict() for record in functions.findStations("%")]
+
+
+def test_empty_results():
+    assert export.writeCsv([], io.StringIO()) == 0
+    output = io.StringIO()
+    assert export.writeJson([], output) == 0
+    assert json.loads(output.getvalue()) == []
+
+
+def test_unknown_extension_is_rejected(dbConn, tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        export.main(["stations", "%", str(tmp_path / "stations.xml"), "--db", dbConn.path])
+
+    assert "export format must be one of" in capsys.readouterr().err
+    assert not (tmp_path / "stations.xml").exists()
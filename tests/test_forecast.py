@@ -0,0 +1,54 @@
+"""
+Tests for the stored forecast models in forecast.py.
+"""
+
+import numpy as np
+
+import forecast
+
+
+def test_update_forces_full_fit(dbConn):
+    assert forecast.fit(dbConn, fitDays=365).mode == "full"
+    assert forecast.fit(dbConn, fitDays=365).mode == "current"
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = 0 WHERE rowid = (SELECT MAX(rowid) FROM Ridership);")
+    dbConn.commit()
+
+    assert forecast.fit(dbConn, fitDays=365).mode == "full"
+
+
+def addDays(dbConn, stationId, first, count):
+    dbConn.executemany(
+        "INSERT INTO Ridership VALUES (?, ?, 'W', ?);",
+        [
+            (stationId, forecast.isoDate(first + day) + "T00:00:00.000", 1000 + 37 * ((first + day) % 7) + day)
+            for day in range(count)
+        ],
+    )
+    dbConn.commit()
+
+
+def storedModel(dbConn, stationId):
+    return dbConn.execute(
+        "SELECT Num_Days, Coefficients FROM ForecastModels WHERE Station_ID = ?;", [stationId]
+    ).fetchone()
+
+
+def test_short_series_grows_into_the_same_model_as_a_full_fit(dbConn):
+    # 2021-12-01 onward: 10 days, too few to model, then 20 more
+    stationId, first = 49990, 18962
+    addDays(dbConn, stationId, first, 10)
+    assert forecast.fit(dbConn, fitDays=365).mode == "full"
+    assert storedModel(dbConn, stationId) is None
+
+    addDays(dbConn, stationId, first + 10, 20)
+    assert forecast.fit(dbConn, fitDays=365).mode == "incremental"
+    incremental = storedModel(dbConn, stationId)
+
+    forecast.fit(dbConn, full=True, fitDays=365)
+    full = storedModel(dbConn, stationId)
+
+    assert incremental[0] == full[0] == 30
+    assert np.allclose(
+        np.frombuffer(incremental[1], dtype=np.float32), np.frombuffer(full[1], dtype=np.float32), rtol=1e-4
+    )
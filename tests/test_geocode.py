@@ -0,0 +1,80 @@
+"""
+Tests for bulk nearest-station assignment in geocode.py.
+"""
+
+import csv
+
+import numpy as np
+import pytest
+
+import geocode
+import spatial
+
+
+def randomPoints(seed, count) -> tuple:
+    random = np.random.default_rng(seed)
+    return random.uniform(41.6, 42.1, count), random.uniform(-87.95, -87.5, count)
+
+
+@pytest.fixture
+def matcher() -> geocode.StopMatcher:
+    latitudes, longitudes = randomPoints(0, 200)
+    return geocode.StopMatcher(spatial.StopIndex([f"Stop {i}" for i in range(200)], latitudes, longitudes))
+
+
+def test_nearest_matches_stop_index(matcher):
+    latitudes, longitudes = randomPoints(1, 50)
+    latitudes[7] = np.nan
+    longitudes[9] = np.inf
+
+    stops, distances = matcher.nearest(latitudes, longitudes, k=3)
+
+    for point in range(50):
+        if point in (7, 9):
+            assert stops[point].tolist() == [-1, -1, -1]
+            assert np.isnan(distances[point]).all()
+            continue
+        expected = matcher.stopIndex.nearest(latitudes[point], longitudes[point], k=3)
+        assert stops[point].tolist() == [stop for stop, distance in expected]
+        np.testing.assert_allclose(distances[point], [distance for stop, distance in expected])
+
+
+def test_within_radius_matches_stop_index(matcher):
+    latitudes, longitudes = randomPoints(2, 50)
+
+    points, stops, distances = matcher.withinRadius(latitudes, longitudes, 0.75)
+
+    expected = [
+        (point, stop)
+        for point in range(50)
+        for stop, distance in matcher.stopIndex.withinRadius(latitudes[point], longitudes[point], 0.75)
+    ]
+    assert list(zip(points.tolist(), stops.tolist())) == expected
+    assert (distances <= 0.75).all()
+
+
+def test_assign_file_streams_chunks(dbConn, tmp_path, capsys):
+    stopIndex = spatial.loadStopIndex(dbConn)
+    inputPath, outputPath = tmp_path / "trips.csv", tmp_path / "assigned.csv"
+    inputPath.write_text(
+        "trip,lat,lon\n"
+        f"a,{stopIndex.latitudes[0]},{stopIndex.longitudes[0]}\n"
+        "b,,\n"
+        f"c,{stopIndex.latitudes[5]},{stopIndex.longitudes[5]}\n"
+    )
+
+    geocode.main([str(inputPath), str(outputPath), "--lat-col", "lat", "--lon-col", "lon",
+                  "--id-col", "trip", "--k", "2", "--chunk-size", "2", "--db", dbConn.path])
+
+    with open(outputPath, newline="") as outputFile:
+        rows = list(csv.reader(outputFile))
+    assert rows[0] == geocode.assignmentColumns
+    assert [row[:3] for row in rows[1:]] == [
+        ["a", "1", stopIndex.names[0]],
+        ["a", "2", rows[2][2]],
+        ["b", "", ""],
+        ["c", "1", stopIndex.names[5]],
+        ["c", "2", rows[5][2]],
+    ]
+    assert rows[1][5] == rows[4][5] == "0.0000"
+    assert capsys.readouterr().out.startswith("Assigned 3 points (5 rows)")
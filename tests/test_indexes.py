@@ -0,0 +1,29 @@
+"""
+Tests that the hot queries in indexes.planChecks() use the Ridership indexes.
+"""
+
+import pytest
+
+import indexes
+import rollups
+
+checks = indexes.planChecks()
+
+
+@pytest.mark.parametrize(
+    "description, sql, params, indexName", checks, ids=[check[0] for check in checks]
+)
+def test_query_uses_index(dbConn, description, sql, params, indexName):
+    indexes.ensureIndexes(dbConn)
+    rollups.ensureRollups(dbConn)
+    plan = indexes.queryPlan(dbConn.cursor(), sql, params)
+
+    assert any(f"INDEX {indexName}" in detail for detail in plan), plan
+    assert not [detail for detail in plan if detail.startswith("SCAN Ridership")], plan
+
+
+def test_ensure_indexes_creates_both(dbConn):
+    indexes.ensureIndexes(dbConn)
+    existing = {row[0] for row in dbConn.execute("SELECT name FROM sqlite_master WHERE type = 'index';")}
+
+    assert set(indexes.ridershipIndexes) <= existing
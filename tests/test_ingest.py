@@ -0,0 +1,33 @@
+"""
+Tests for loading extracts with ingest.py.
+"""
+
+import ingest
+
+
+def writeExtract(tmp_path, text) -> str:
+    path = tmp_path / "extract.csv"
+    path.write_text(text)
+    return str(path)
+
+
+def test_unknown_day_type_is_rejected_with_line_number(dbConn, tmp_path):
+    stationId = dbConn.execute("SELECT MIN(Station_ID) FROM Stations;").fetchone()[0]
+    path = writeExtract(tmp_path, (
+        "station_id,date,daytype,rides\n"
+        f"{stationId},01/04/2026,X,5\n"
+        f"{stationId},01/05/2026,W,7\n"
+    ))
+
+    report = ingest.ingest(dbConn, [path])
+
+    assert (report.rowsRead, report.rowsInserted, report.rowsRejected) == (2, 1, 1)
+    assert report.rejections == [f"{path}, line 2: unknown Type_of_Day 'X'"]
+
+
+def test_empty_extract_loads_nothing(dbConn, tmp_path, capsys):
+    path = writeExtract(tmp_path, "")
+
+    ingest.main(["--db", dbConn.path, path])
+
+    assert capsys.readouterr().out == f"No rows to load in {path}\n"
@@ -0,0 +1,58 @@
+"""
+Tests for batch mode in main.py.
+"""
+
+import io
+
+import pytest
+
+import main
+
+
+def stationNames(dbConn) -> list:
+    return [row[0] for row in dbConn.execute("SELECT Station_Name FROM Stations ORDER BY Station_ID LIMIT 2;")]
+
+
+def runLines(lines, tmp_path) -> int:
+    return main.runBatch(io.StringIO("".join(line + "\n" for line in lines)), str(tmp_path))
+
+
+def test_valid_commands_succeed(dbConn, tmp_path, capsys):
+    first, second = stationNames(dbConn)
+    lines = [
+        f'6 "{first}"',
+        f'7 "{first}" 2020 --plot=png',
+        f'8 2021 "{first}" "{second}"',
+        "9 41.88 -87.63 50",
+        "# comment",
+        "",
+    ]
+
+    assert runLines(lines, tmp_path) == 0
+    assert "commands failed" not in capsys.readouterr().out
+    assert (tmp_path / "0002-cmd7.png").exists()
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "--plot=png",
+        "42",
+        "6",
+        '6 "No Such Station"',
+        '2 "No Such Station"',
+        "1 %NoSuchStation%",
+        "4 Plaid N",
+        "7 {first} abc",
+        "7 {first} 1999",
+        "8 abc {first} {second}",
+        "9 10 10",
+        "9 41.88 10",
+        "9 north west",
+    ],
+)
+def test_bad_command_fails(dbConn, tmp_path, capsys, line):
+    first, second = stationNames(dbConn)
+
+    assert runLines([line.format(first=f'"{first}"', second=f'"{second}"')], tmp_path) == 1
+    assert capsys.readouterr().out.endswith("**1 of 1 commands failed\n")
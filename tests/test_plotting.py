@@ -0,0 +1,21 @@
+"""
+Tests for the chart rendering in plotting.py.
+"""
+
+import os
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import plotting  # noqa: E402
+
+
+def test_render_batch_creates_output_directory(tmp_path):
+    outputDir = tmp_path / "charts" / "2019"
+    charts = [("howard-yearly", plotting.plotYearlyRidership, (["2018", "2019"], [100, 120], "Howard"))]
+
+    written = plotting.renderBatch(charts, str(outputDir), ("png", "svg"))
+
+    assert written == [str(outputDir / "howard-yearly.png"), str(outputDir / "howard-yearly.svg")]
+    assert all(os.path.getsize(path) for path in written)
@@ -0,0 +1,55 @@
+"""
+Tests for the all-stations report in report.py.
+"""
+
+import csv
+import json
+import os
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+import functions  # noqa: E402
+import report  # noqa: E402
+import results  # noqa: E402
+import stations  # noqa: E402
+
+
+def test_file_stem():
+    assert report.fileStem(results.ResolvedStation("Clark/Lake", (40380, 40381))) == "40380-Clark-Lake"
+
+
+def test_station_pack_matches_functions(dbConn, tmp_path):
+    catalog = stations.getCatalog()
+    station = catalog.exact(sorted(catalog.idsByName)[0])
+
+    pack = report.stationPack(station, str(tmp_path), "svg")
+
+    yearly = functions.totalRidershipYear(station)
+    assert pack["dayTypes"] == functions.findPercentageRiders(station).asDict()
+    assert pack["yearly"] == dict(zip(yearly.labels, yearly.riders))
+    assert sum(pack["monthly"]["2021"].values()) == pack["yearly"]["2021"]
+    assert all(os.path.getsize(tmp_path / chart) for chart in pack["charts"])
+    with open(tmp_path / (report.fileStem(station) + ".json")) as packFile:
+        assert json.load(packFile) == pack
+
+
+def test_build_report_writes_every_station(dbConn, tmp_path):
+    packs = report.buildReport(str(tmp_path), workers=2, chartFormat=None)
+
+    names = sorted(stations.getCatalog().idsByName)
+    assert [pack["stationName"] for pack in packs] == names
+    with open(tmp_path / "index.csv", newline="") as indexFile:
+        rows = list(csv.DictReader(indexFile))
+    assert [row["station_name"] for row in rows] == names
+    breakdown = functions.findPercentageRiders(names[0])
+    assert int(rows[0]["total"]) == breakdown.total
+    assert (rows[0]["first_year"], rows[0]["last_year"]) == ("2020", "2021")
+    assert os.path.exists(tmp_path / rows[0]["pack"])
+
+
+def test_unknown_chart_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        report.buildReport(str(tmp_path), chartFormat="gif")
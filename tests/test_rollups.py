@@ -0,0 +1,111 @@
+"""
+Tests for the rollup freshness checks in rollups.py.
+"""
+
+import sqlite3
+
+import database
+import rollups
+
+
+def rollupTotals(dbConn) -> dict:
+    return dict(dbConn.execute(
+        "SELECT Station_ID, SUM(Num_Riders) FROM RidershipRollup GROUP BY Station_ID;"
+    ).fetchall())
+
+
+def ridershipTotals(dbConn) -> dict:
+    return dict(dbConn.execute(
+        "SELECT Station_ID, SUM(Num_Riders) FROM Ridership GROUP BY Station_ID;"
+    ).fetchall())
+
+
+def test_update_makes_rollup_stale(dbConn):
+    rollups.ensureRollups(dbConn)
+    assert not rollups.rollupsAreStale(dbConn.cursor())
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = Num_Riders + 1000 WHERE rowid = 5;")
+    dbConn.commit()
+
+    assert rollups.rollupsAreStale(dbConn.cursor())
+    rollups.ensureRollups(dbConn)
+    assert rollupTotals(dbConn) == ridershipTotals(dbConn)
+
+
+def test_delete_then_insert_reusing_rowid(dbConn):
+    rollups.ensureRollups(dbConn)
+    maxRow = rollups.ridershipFingerprint(dbConn.cursor())[1]
+
+    row = dbConn.execute(
+        "SELECT Station_ID, Ride_Date, Type_of_Day FROM Ridership WHERE rowid = ?;", [maxRow]
+    ).fetchone()
+    dbConn.execute("DELETE FROM Ridership WHERE rowid = ?;", [maxRow])
+    dbConn.execute("INSERT INTO Ridership (rowid, Station_ID, Ride_Date, Type_of_Day, Num_Riders) "
+                   "VALUES (?, ?, ?, ?, 123456);", [maxRow, *row])
+    dbConn.commit()
+
+    assert rollups.rollupsAreStale(dbConn.cursor())
+    rollups.ensureRollups(dbConn)
+    assert rollupTotals(dbConn) == ridershipTotals(dbConn)
+
+
+def test_appended_rows_refresh_incrementally(dbConn):
+    rollups.ensureRollups(dbConn)
+    dbConn.execute(
+        "INSERT INTO Ridership SELECT Station_ID, '2022-01-01T00:00:00.000', 'U', 10 "
+        "FROM Stations;"
+    )
+    dbConn.commit()
+
+    rollups.ensureRollups(dbConn)
+    assert rollupTotals(dbConn) == ridershipTotals(dbConn)
+
+
+def test_read_only_without_triggers_sees_update(dbPath):
+    # Never opened writable, so the rewrite triggers are not installed
+    dbConn = database.connect(path=dbPath, read_only=True)
+    try:
+        rollups.ensureRollups(dbConn)
+
+        writer = sqlite3.connect(dbPath)
+        writer.execute("UPDATE Ridership SET Num_Riders = Num_Riders + 1000 WHERE rowid = 5;")
+        writer.commit()
+        writer.close()
+
+        rollups.ensureRollups(dbConn)
+        assert rollupTotals(dbConn) == ridershipTotals(dbConn)
+    finally:
+        dbConn.close()
+
+
+def tempTables(dbConn) -> list:
+    return [row[0] for row in dbConn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table';")]
+
+
+def test_read_only_reuses_the_on_disk_rollup(dbConn, dbPath):
+    rollups.ensureLineRollups(dbConn)
+    # A marker row shows whether a temp rollup was seeded from the on-disk one
+    dbConn.execute("INSERT INTO RidershipRollup VALUES (1, 'W', 2020, 1, 7, 1);")
+    dbConn.commit()
+
+    reader = database.connect(path=dbPath, read_only=True)
+    try:
+        rollups.ensureLineRollups(reader)
+        assert tempTables(reader) == []
+
+        dbConn.execute(
+            "INSERT INTO Ridership SELECT Station_ID, '2022-01-01T00:00:00.000', 'U', 10 FROM Stations;"
+        )
+        dbConn.commit()
+        rollups.ensureRollups(reader)
+        assert "RidershipRollup" in tempTables(reader)
+        totals = rollupTotals(reader)
+        assert totals.pop(1) == 7
+        assert totals == ridershipTotals(reader)
+
+        # Once a writer catches the on-disk rollups up, the temp copies go
+        rollups.ensureLineRollups(dbConn)
+        rollups.ensureLineRollups(reader)
+        assert tempTables(reader) == []
+    finally:
+        reader.close()
@@ -0,0 +1,77 @@
+"""
+Tests for request handling in server.py.
+"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def address(dbConn):
+    server.prepare()
+    queryServer = server.QueryServer(threads=2)
+    bound = threading.Event()
+    state = {}
+
+    def ready(address):
+        state["address"] = address
+        bound.set()
+
+    def run():
+        loop = asyncio.new_event_loop()
+        state["loop"] = loop
+        state["task"] = loop.create_task(queryServer.serve(port=0, ready=ready))
+        try:
+            loop.run_until_complete(state["task"])
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert bound.wait(10)
+
+    yield state["address"]
+
+    state["loop"].call_soon_threadsafe(state["task"].cancel)
+    thread.join(10)
+
+
+def readResponse(stream) -> tuple:
+    """
+    Read one response from a socket file: (status, headers, body).
+    """
+
+    status = int(stream.readline().split()[1])
+    headers = {}
+    for line in iter(stream.readline, b"\r\n"):
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, headers, stream.read(int(headers["content-length"]))
+
+
+def test_body_is_skipped_before_next_request(address):
+    with socket.create_connection(address, timeout=10) as client:
+        client.sendall(
+            b"POST /stats HTTP/1.1\r\nContent-Length: 11\r\n\r\nGET /x HTTP"
+            b"GET /weekdays HTTP/1.1\r\nConnection: close\r\n\r\n"
+        )
+        stream = client.makefile("rb")
+
+        assert readResponse(stream)[0] == 405
+        assert readResponse(stream)[0] == 200
+
+
+def test_chunked_body_is_refused(address):
+    with socket.create_connection(address, timeout=10) as client:
+        client.sendall(b"POST /stats HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n")
+        status, headers, _ = readResponse(client.makefile("rb"))
+
+    assert status == 411
+    assert headers["connection"] == "close"
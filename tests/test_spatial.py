@@ -0,0 +1,70 @@
+"""
+Tests for the stop grid index in spatial.py.
+"""
+
+import numpy as np
+import pytest
+
+import spatial
+
+
+def randomIndex(seed=0, count=300) -> spatial.StopIndex:
+    random = np.random.default_rng(seed)
+    latitudes = random.uniform(41.6, 42.1, count)
+    longitudes = random.uniform(-87.95, -87.5, count)
+    return spatial.StopIndex([f"Stop {i}" for i in range(count)], latitudes, longitudes)
+
+
+def bruteForce(stopIndex, latitude, longitude) -> list:
+    distances = spatial.haversine(latitude, longitude, stopIndex.latitudes, stopIndex.longitudes)
+    order = np.argsort(distances, kind="stable")
+    return list(zip(order.tolist(), distances[order].tolist()))
+
+
+def test_haversine_known_distance():
+    # One degree of latitude along a meridian
+    assert spatial.haversine(41.0, -87.0, np.array([42.0]), np.array([-87.0]))[0] == pytest.approx(
+        spatial.milesPerDegree
+    )
+
+
+@pytest.mark.parametrize("latitude, longitude", [(41.8781, -87.6298), (41.6, -87.95), (45.0, -80.0)])
+def test_searches_match_brute_force(latitude, longitude):
+    stopIndex = randomIndex()
+    expected = bruteForce(stopIndex, latitude, longitude)
+
+    assert stopIndex.nearest(latitude, longitude, k=5) == expected[:5]
+    assert stopIndex.withinRadius(latitude, longitude, radius=2.0) == [
+        pair for pair in expected if pair[1] <= 2.0
+    ]
+    assert stopIndex.nearest(latitude, longitude, k=5, maxRadius=1.0) == [
+        pair for pair in expected[:5] if pair[1] <= 1.0
+    ]
+
+
+@pytest.mark.parametrize("latitude, longitude", [(float("nan"), -87.6), (41.8, float("inf"))])
+def test_non_finite_search_point_is_rejected(latitude, longitude):
+    with pytest.raises(ValueError):
+        randomIndex().nearest(latitude, longitude)
+
+
+def test_nearest_ends_when_points_cannot_be_found():
+    # The stop without coordinates is never found, and the antipode is the furthest point there is
+    stopIndex = spatial.StopIndex(
+        ["Here", "Unknown", "Antipode"], [41.9, np.nan, -41.9], [-87.7, np.nan, 92.3]
+    )
+
+    found = stopIndex.nearest(41.9, -87.7, k=3)
+
+    assert [index for index, distance in found] == [0, 2]
+    assert found[1][1] == pytest.approx(spatial.maxDistance)
+
+
+def test_stop_index_loads_every_stop(dbConn):
+    stopIndex = spatial.loadStopIndex(dbConn)
+
+    assert len(stopIndex) == dbConn.execute(
+        "SELECT COUNT(*) FROM (SELECT DISTINCT Station_ID, Latitude, Longitude FROM Stops);"
+    ).fetchone()[0]
+    index, distance = stopIndex.nearest(stopIndex.latitudes[3], stopIndex.longitudes[3])[0]
+    assert distance == 0
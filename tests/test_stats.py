@@ -0,0 +1,16 @@
+"""
+Tests for the saved general statistics in stats.py.
+"""
+
+import stats
+
+
+def test_update_recomputes_saved_stats(dbConn):
+    before = stats.generalStats(dbConn)
+
+    dbConn.execute("UPDATE Ridership SET Num_Riders = Num_Riders + 500 WHERE rowid = 1;")
+    dbConn.commit()
+
+    after = stats.generalStats(dbConn)
+    assert after.totalRiders == before.totalRiders + 500
+    assert after == stats.computeStats(dbConn.cursor())
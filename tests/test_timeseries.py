@@ -0,0 +1,71 @@
+"""
+Tests for the aligned station panels in timeseries.py.
+"""
+
+import numpy as np
+
+import results
+import timeseries
+
+
+def handPanel() -> timeseries.StationPanel:
+    # Two stations over five days; the first misses days 0 and 2, the second day 4
+    days = timeseries.calendar("2020-01-01", "2020-01-06")
+    observed = np.array([[False, True, False, True, True], [True, True, True, True, False]])
+    riders = np.array([[0, 10, 0, 30, 40], [5, 5, 5, 5, 0]], dtype=float)
+    riders[~observed] = np.nan
+    stations = [results.ResolvedStation("A", (1,)), results.ResolvedStation("B", (2,))]
+    return timeseries.StationPanel(stations, days, riders, observed)
+
+
+def test_load_panel_matches_ridership(dbConn):
+    stationIds = [row[0] for row in dbConn.execute("SELECT Station_ID FROM Stations ORDER BY Station_ID LIMIT 2;")]
+    stations = [results.ResolvedStation("Both", tuple(stationIds)), results.ResolvedStation("One", (stationIds[1],))]
+    dbConn.execute("DELETE FROM Ridership WHERE Station_ID = ? AND Ride_Date LIKE '2020-03-05%';", [stationIds[1]])
+
+    panel = timeseries.loadPanel(dbConn, stations, "2020-03-01", "2020-04-01")
+
+    assert panel.dates()[0] == "2020-03-01" and len(panel.dates()) == 31
+    for row, station in enumerate(stations):
+        expected = dbConn.execute(
+            f"SELECT Ride_Date, SUM(Num_Riders) FROM Ridership "
+            f"WHERE Station_ID IN ({', '.join('?' * len(station.stationIds))}) "
+            "AND Ride_Date >= '2020-03-01' AND Ride_Date < '2020-04-01' GROUP BY Ride_Date;",
+            station.stationIds,
+        ).fetchall()
+        dates, riders = panel.reported(row)
+        assert list(zip(dates, riders)) == [(date[:10], total) for date, total in expected]
+    assert "2020-03-05" not in panel.reported("One")[0]
+    assert np.isnan(panel.riders[1, 4])
+
+
+def test_fill_methods():
+    panel = handPanel()
+
+    np.testing.assert_array_equal(panel.fill("zero")[0], [0, 10, 0, 30, 40])
+    np.testing.assert_array_equal(panel.fill("previous")[0], [np.nan, 10, 10, 30, 40])
+    np.testing.assert_array_equal(panel.fill("interpolate")[0], [10, 10, 20, 30, 40])
+    np.testing.assert_array_equal(panel.difference("A", "B"), [-5, 5, -5, 25, 40])
+    np.testing.assert_array_equal(panel.ratio("A", "B"), [np.nan, 2, np.nan, 6, np.nan])
+
+
+def test_rolling_mean_skips_missing_days():
+    means = handPanel().rollingMean(window=2, minDays=2)
+
+    np.testing.assert_array_equal(means[0], [np.nan, np.nan, np.nan, np.nan, 35])
+    np.testing.assert_array_equal(means[1], [np.nan, 5, 5, 5, np.nan])
+
+
+def test_read_series_rows_sorts_into_series(dbConn):
+    data = timeseries.readSeriesRows(
+        dbConn.cursor(),
+        f"SELECT {timeseries.seriesColumns_SQL} FROM Ridership ORDER BY Num_Riders;",
+    )
+    boundaries = timeseries.seriesBoundaries(data)
+
+    assert len(data) == dbConn.execute("SELECT COUNT(*) FROM Ridership;").fetchone()[0]
+    series = np.cumsum(boundaries)
+    assert np.all(np.diff(data[:, 3])[series[1:] == series[:-1]] > 0)
+    assert series[-1] == dbConn.execute(
+        "SELECT COUNT(*) FROM (SELECT DISTINCT Station_ID, Type_of_Day FROM Ridership);"
+    ).fetchone()[0]
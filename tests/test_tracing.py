@@ -0,0 +1,36 @@
+"""
+Tests for statement tracing in tracing.py.
+"""
+
+import pytest
+
+import cache
+import tracing
+
+
+@pytest.fixture
+def tracer():
+    tracing.configure(enabled=True)
+    tracing.tracer.clear()
+    yield tracing.tracer
+    tracing.configure(enabled=False)
+    tracing.tracer.clear()
+
+
+def test_connection_execute_is_traced(dbConn, tracer):
+    cache.dataVersion(dbConn)
+
+    statements = {
+        statement["sql"]
+        for function in tracer.summary().values()
+        for statement in function["statements"]
+    }
+    assert "PRAGMA data_version;" in statements
+    assert "cache.dataVersion" in tracer.summary()
+
+
+def test_connection_executemany_is_traced(dbConn, tracer):
+    dbConn.executemany("INSERT INTO Lines VALUES (?, ?);", [(100, "Gray"), (101, "Silver")])
+
+    summary = tracer.summary()[f"{__name__}.test_connection_executemany_is_traced"]
+    assert summary["rows"] == 2
@@ -0,0 +1,73 @@
+"""
+Tests for the date-range ridership trends in trends.py.
+"""
+
+import pytest
+
+import rollups
+import trends
+
+
+def riders(dbConn, start, end, stationIds=None) -> int:
+    stationFilter = ""
+    if stationIds is not None:
+        stationFilter = f"AND Station_ID IN ({', '.join('?' * len(stationIds))})"
+    return dbConn.execute(
+        f"SELECT SUM(Num_Riders) FROM Ridership WHERE Ride_Date >= ? AND Ride_Date < ? {stationFilter};",
+        [start, end] + list(stationIds or ()),
+    ).fetchone()[0]
+
+
+def test_monthly_trend_from_rollup_matches_ridership(dbConn):
+    rollups.ensureRollups(dbConn)
+
+    trend = trends.loadTrend(dbConn, "System", None, "2021-01-01", "2021-04-01", "monthly")
+
+    assert trend.periods == ["2021-01", "2021-02", "2021-03"]
+    assert trend.riders[1] == riders(dbConn, "2021-02-01", "2021-03-01")
+    assert trend.yoyChange[1] == trend.riders[1] - riders(dbConn, "2020-02-01", "2020-03-01")
+    # The same months summed from a daily trend, which groups Ridership by day
+    daily = trends.loadTrend(dbConn, "System", None, "2021-01-01", "2021-04-01", "daily")
+    assert trend.riders == [
+        sum(count for day, count in zip(daily.periods, daily.riders) if day.startswith(month))
+        for month in trend.periods
+    ]
+
+
+def test_partial_periods_compare_the_same_span(dbConn):
+    rollups.ensureRollups(dbConn)
+    stationIds = (40000, 40010)
+
+    trend = trends.loadTrend(dbConn, "Two", stationIds, "2021-03-10", "2021-05-20", "monthly")
+
+    assert trend.periods == ["2021-03", "2021-04", "2021-05"]
+    assert trend.riders[0] == riders(dbConn, "2021-03-10", "2021-04-01", stationIds)
+    assert trend.yoyChange[2] == trend.riders[2] - riders(dbConn, "2020-05-01", "2020-05-20", stationIds)
+
+
+def test_weekly_trend_compares_52_weeks_earlier(dbConn):
+    # 2021-03-01 was a Monday
+    trend = trends.loadTrend(dbConn, "System", None, "2021-03-01", "2021-03-15", "weekly")
+
+    assert trend.periods == ["2021-03-01", "2021-03-08"]
+    assert trend.riders[1] == riders(dbConn, "2021-03-08", "2021-03-15")
+    assert trend.yoyChange[1] == trend.riders[1] - riders(dbConn, "2020-03-09", "2020-03-16")
+
+
+def test_periods_without_rows_are_none(dbConn):
+    trend = trends.loadTrend(dbConn, "System", None, "2021-12-30", "2022-01-02", "daily")
+
+    assert trend.periods == ["2021-12-30", "2021-12-31", "2022-01-01"]
+    assert trend.riders[2] is None
+    assert trend.yoyChange[2] is None and trend.yoyPercent[2] is None
+    assert trend.riders[0] is not None and trend.yoyPercent[0] is not None
+
+
+@pytest.mark.parametrize("start, end, granularity", [
+    ("2021-01-01", "2021-02-01", "hourly"),
+    ("2021-02-01", "2021-01-01", "daily"),
+    ("2021-13-01", "2022-01-01", "daily"),
+])
+def test_invalid_requests_raise(dbConn, start, end, granularity):
+    with pytest.raises(ValueError):
+        trends.loadTrend(dbConn, "System", None, start, end, granularity)
@@ -0,0 +1,368 @@
+"""
+Daily ridership time series for the CTA L analysis app.
+
+Loads the daily ridership of any number of stations in one query into a
+StationPanel: a stations x days NumPy array on a shared calendar, with a
+mask of the days each station actually reported. Days a station has no
+row for are never shifted onto other dates; they stay missing until
+filled explicitly with fill(). Comparisons (difference, ratio,
+correlation, rolling means) work on whole arrays at once.
+
+For scans over many stations (anomalies.py, forecast.py) there is also a
+long format: the Ridership rows as one integer array sorted into series,
+one series per station and day type.
+"""
+
+import itertools
+
+import numpy as np
+
+# How gaps can be filled
+fillMethods = ("nan", "zero", "previous", "interpolate")
+
+# Columns of readSeriesRows(), in order: rowid, Station_ID, the day type
+# as a number (unicode() of Type_of_Day), days since 1970-01-01, riders
+seriesColumns_SQL = """
+                    Ridership.rowid, Ridership.Station_ID, unicode(Ridership.Type_of_Day),
+                    CAST(julianday(date(Ridership.Ride_Date)) - 2440587.5 AS INTEGER),
+                    Ridership.Num_Riders
+                    """
+
+# Riders per station and day for loadPanel(), as days since the first
+# parameter. {ids} is replaced with the Station_ID placeholders.
+panelRows_SQL = """
+                SELECT Station_ID,
+                       CAST(round(julianday(Ride_Date) - julianday(?)) AS INTEGER) AS Day,
+                       SUM(Num_Riders)
+                FROM Ridership
+                WHERE Station_ID IN ({ids})
+                AND Ride_Date >= ? AND Ride_Date < ?
+                GROUP BY Station_ID, Day
+                """
+
+# Rows fetched from SQLite per fetchmany() by readSeriesRows()
+seriesFetchSize = 65536
+
+
+def calendar(start, end):
+    """
+    The days of a half-open date range.
+
+    Args:
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
+
+    Returns:
+    np.ndarray: datetime64[D] array of every day in [start, end).
+    """
+
+    return np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+
+
+class StationPanel:
+    """
+    Daily ridership of several stations aligned on one calendar.
+    """
+
+    def __init__(self, stations, days, riders, observed):
+        """
+        Args:
+        stations (list): results.ResolvedStation for each row.
+        days (np.ndarray): datetime64[D] calendar shared by all rows.
+        riders (np.ndarray): (stations, days) ridership; NaN where not observed.
+        observed (np.ndarray): (stations, days) bool mask of reported days.
+        """
+
+        self.stations = list(stations)
+        self.days = days
+        self.riders = riders
+        self.observed = observed
+
+    @property
+    def names(self) -> list:
+        """
+        Station name of each row.
+        """
+
+        return [station.stationName for station in self.stations]
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _row(self, station):
+        """
+        Row number of a station given by position or name.
+        """
+
+        if isinstance(station, str):
+            return self.names.index(station)
+        return station
+
+    def dates(self) -> list:
+        """
+        The calendar as 'YYYY-MM-DD' strings.
+        """
+
+        return np.datetime_as_string(self.days).tolist()
+
+    def reported(self, station) -> tuple:
+        """
+        The days one station reported and its ridership on them.
+
+        Args:
+        station: Row number or name of the station.
+
+        Returns:
+        tuple: ('YYYY-MM-DD' strings, rider counts) as lists.
+        """
+
+        observed = self.observed[self._row(station)]
+        return (
+            np.datetime_as_string(self.days[observed]).tolist(),
+            self.riders[self._row(station), observed].astype(np.int64).tolist(),
+        )
+
+    def hasData(self) -> np.ndarray:
+        """
+        Whether each station reported any day in the calendar.
+        """
+
+        return self.observed.any(axis=1)
+
+    def fill(self, method="zero"):
+        """
+        Return the ridership with the missing days filled in.
+
+        Args:
+        method (str): "nan" leaves gaps as NaN, "zero" counts them as no
+                      riders, "previous" repeats the last reported day and
+                      "interpolate" draws a straight line between the
+                      reported days around the gap. Days before a
+                      station's first report stay NaN with "previous",
+                      and days outside its reports take the nearest
+                      reported value with "interpolate".
+
+        Returns:
+        np.ndarray: A new (stations, days) float array.
+
+        Raises:
+        ValueError: If method is not one of fillMethods.
+        """
+
+        if method not in fillMethods:
+            raise ValueError(f"fill method must be one of {fillMethods}, not {method!r}")
+
+        riders = self.riders.copy()
+        if method == "nan":
+            return riders
+        if method == "zero":
+            riders[~self.observed] = 0
+            return riders
+
+        positions = np.arange(riders.shape[1])
+        if method == "previous":
+            # Index of the last reported day at or before each day
+            last = np.where(self.observed, positions, -1)
+            np.maximum.accumulate(last, axis=1, out=last)
+            filled = np.take_along_axis(riders, np.maximum(last, 0), axis=1)
+            filled[last < 0] = np.nan
+            return filled
+
+        for row in range(riders.shape[0]):
+            seen = self.observed[row]
+            if seen.any():
+                riders[row] = np.interp(positions, positions[seen], riders[row, seen])
+        return riders
+
+    def difference(self, first=0, second=1, method="zero") -> np.ndarray:
+        """
+        Day-by-day ridership of one station minus another's.
+
+        Args:
+        first: Row number or name of the first station.
+        second: Row number or name of the second station.
+        method (str): How gaps are filled first, as in fill().
+
+        Returns:
+        np.ndarray: The difference for each calendar day.
+        """
+
+        filled = self.fill(method)
+        return filled[self._row(first)] - filled[self._row(second)]
+
+    def ratio(self, first=0, second=1, method="nan") -> np.ndarray:
+        """
+        Day-by-day ridership of one station divided by another's.
+
+        Args:
+        first: Row number or name of the numerator station.
+        second: Row number or name of the denominator station.
+        method (str): How gaps are filled first, as in fill().
+
+        Returns:
+        np.ndarray: The ratio for each calendar day; NaN where the
+        denominator is zero or missing.
+        """
+
+        filled = self.fill(method)
+        numerator = filled[self._row(first)]
+        denominator = filled[self._row(second)]
+
+        ratio = np.full(len(self.days), np.nan)
+        np.divide(numerator, denominator, out=ratio, where=denominator != 0)
+        return ratio
+
+    def correlation(self) -> np.ndarray:
+        """
+        Pearson correlation of the daily ridership of every pair of
+        stations, over the days both stations reported.
+
+        Returns:
+        np.ndarray: (stations, stations) matrix; NaN for pairs with fewer
+        than two shared days or a constant series.
+        """
+
+        count = len(self.stations)
+        matrix = np.full((count, count), np.nan)
+        for first in range(count):
+            for second in range(first, count):
+                shared = self.observed[first] & self.observed[second]
+                if shared.sum() < 2:
+                    continue
+
+                x = self.riders[first, shared]
+                y = self.riders[second, shared]
+                x = x - x.mean()
+                y = y - y.mean()
+                scale = np.sqrt((x * x).sum() * (y * y).sum())
+                if scale > 0:
+                    matrix[first, second] = matrix[second, first] = (x * y).sum() / scale
+
+        return matrix
+
+    def rollingMean(self, window=7, minDays=1) -> np.ndarray:
+        """
+        Trailing rolling mean of each station's ridership. Missing days
+        are left out of the mean rather than counted as zero.
+
+        Args:
+        window (int): Days in the window, ending at each day.
+        minDays (int): Reported days a window needs to produce a value.
+
+        Returns:
+        np.ndarray: (stations, days) array; NaN where a window has fewer
+        than minDays reported days.
+        """
+
+        if window < 1:
+            raise ValueError(f"window must be at least 1, not {window}")
+
+        values = np.where(self.observed, self.riders, 0.0)
+        # Running sums with a leading zero column; window sums are differences
+        sums = np.zeros((values.shape[0], values.shape[1] + 1))
+        counts = np.zeros(sums.shape)
+        np.cumsum(values, axis=1, out=sums[:, 1:])
+        np.cumsum(self.observed, axis=1, out=counts[:, 1:])
+
+        ends = np.arange(1, values.shape[1] + 1)
+        starts = np.maximum(ends - window, 0)
+        windowSums = sums[:, ends] - sums[:, starts]
+        windowCounts = counts[:, ends] - counts[:, starts]
+
+        means = np.full(values.shape, np.nan)
+        np.divide(windowSums, windowCounts, out=means, where=windowCounts >= max(minDays, 1))
+        return means
+
+
+def loadPanel(dbConn, stations, start, end, store=None) -> StationPanel:
+    """
+    Load the daily ridership of several stations over a date range in one
+    query.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database.
+    stations (list): results.ResolvedStation for each station.
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
+    store (columnar.ColumnStore): Read the rows from this store instead of
+                                  querying Ridership.
+
+    Returns:
+    StationPanel: The aligned series.
+    """
+
+    days = calendar(start, end)
+    riders = np.zeros((len(stations), len(days)))
+    observed = np.zeros(riders.shape, dtype=bool)
+
+    # A Station_ID may belong to several requested rows
+    rowsById = {}
+    for row, station in enumerate(stations):
+        for stationId in station.stationIds:
+            rowsById.setdefault(stationId, []).append(row)
+
+    if store is not None and len(days):
+        for stationId, rows in rowsById.items():
+            dayNumbers, counts = store.dailyTotals(stationId, start, end)
+            positions = dayNumbers.astype(np.int64) - days[0].astype(np.int64)
+            for row in rows:
+                np.add.at(riders[row], positions, counts)
+                observed[row, positions] = True
+    elif rowsById and len(days):
+        dbCursor = dbConn.cursor()
+        dbCursor.execute(
+            panelRows_SQL.format(ids=", ".join("?" * len(rowsById))),
+            (start,) + tuple(rowsById) + (start, end),
+        )
+        data = np.array(dbCursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+
+        for stationId, rows in rowsById.items():
+            selected = data[data[:, 0] == stationId]
+            for row in rows:
+                np.add.at(riders[row], selected[:, 1], selected[:, 2])
+                observed[row, selected[:, 1]] = True
+
+    riders[~observed] = np.nan
+    return StationPanel(stations, days, riders, observed)
+
+
+def readSeriesRows(dbCursor, sql, parameters=()) -> np.ndarray:
+    """
+    Run a query selecting seriesColumns_SQL and return its rows sorted
+    into series: by station, day type and day.
+
+    Args:
+    dbCursor (sqlite3.Cursor): Cursor on the ridership database.
+    sql (str): The query.
+    parameters (list): Its parameters.
+
+    Returns:
+    np.ndarray: (rows, 5) int64 array of rowid, Station_ID, day type code,
+    day number and riders.
+    """
+
+    dbCursor.execute(sql, parameters)
+    parts = []
+    while True:
+        rows = dbCursor.fetchmany(seriesFetchSize)
+        if not rows:
+            break
+        parts.append(np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 5))
+
+    data = np.concatenate(parts).reshape(-1, 5) if parts else np.empty((0, 5), dtype=np.int64)
+    # Sorting in NumPy beats an ORDER BY over the whole table
+    order = np.lexsort((data[:, 3], data[:, 2], data[:, 1]))
+    return data[order]
+
+
+def seriesBoundaries(data) -> np.ndarray:
+    """
+    Mark where each series of readSeriesRows() rows starts.
+
+    Returns:
+    np.ndarray: bool mask, True on the first row of every series.
+    """
+
+    boundaries = np.ones(len(data), dtype=bool)
+    boundaries[1:] = (data[1:, 1] != data[:-1, 1]) | (data[1:, 2] != data[:-1, 2])
+    return boundaries
@@ -0,0 +1,363 @@
+"""
+SQL tracing for the CTA L analysis app.
+
+When tracing is on, every cursor handed out by a database.py connection
+is a TracingCursor, including the ones behind its execute() and
+executemany() shortcuts. For each statement it records the wall time (the
+execute call plus every fetch of its rows), the number of rows returned
+and the app function that ran it, and optionally the EXPLAIN QUERY PLAN
+output. Statements slower than a threshold are logged to the
+"cta.slowquery" logger; summary() and exportJson() give per-function
+percentiles of everything recorded.
+
+Tracing is switched on with CTA_TRACE=1 (or configure(enabled=True)).
+CTA_SLOW_QUERY_MS sets the slow-query threshold in milliseconds (default
+100) and CTA_TRACE_EXPLAIN=1 attaches query plans.
+"""
+
+import collections
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+slowLog = logging.getLogger("cta.slowquery")
+
+# Modules whose frames are skipped when looking for the calling function
+_ownFiles = {os.path.abspath(__file__)}
+
+
+def _parseBool(value) -> bool:
+    return str(value).strip().lower() in ("1", "yes", "true", "on")
+
+
+def normalizeSql(sql) -> str:
+    """
+    Collapse the whitespace of a statement so the same SQL written with
+    different indentation is counted as one statement.
+    """
+
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def percentile(sortedValues, fraction):
+    """
+    Nearest-rank percentile of an already sorted list, None if it is empty.
+    """
+
+    if not sortedValues:
+        return None
+    rank = max(1, int(-(-fraction * len(sortedValues) // 1)))
+    return sortedValues[min(rank, len(sortedValues)) - 1]
+
+
+class QueryTracer:
+    """
+    Collects statement timings from TracingCursors.
+    """
+
+    def __init__(self, enabled=False, slowMs=100.0, explain=False, maxSamples=10000):
+        """
+        Args:
+        enabled (bool): Whether new cursors are traced.
+        slowMs (float): Log statements that take longer, in milliseconds;
+                        None to log nothing.
+        explain (bool): Attach EXPLAIN QUERY PLAN output to each statement.
+        maxSamples (int): Timings kept per function and statement; the
+                          oldest are dropped beyond this.
+        """
+
+        self.enabled = enabled
+        self.slowMs = slowMs
+        self.explain = explain
+        self.maxSamples = maxSamples
+        self._lock = threading.Lock()
+        # (function, statement) -> {"times": deque of ms, "rows": int, "count": int}
+        self._stats = {}
+        # statement -> query plan lines
+        self._plans = {}
+
+    def clear(self):
+        """
+        Forget everything recorded so far.
+        """
+
+        with self._lock:
+            self._stats.clear()
+            self._plans.clear()
+
+    def plan(self, dbConn, sql, parameters):
+        """
+        Return the query plan of a normalized statement, computing it once
+        per statement. None for statements other than queries.
+        """
+
+        with self._lock:
+            if sql in self._plans:
+                return self._plans[sql]
+
+        plan = None
+        if re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+            try:
+                # A plain cursor, so the EXPLAIN itself is not traced
+                rows = sqlite3.Cursor(dbConn).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+                plan = [row[-1] for row in rows]
+            except sqlite3.Error:
+                plan = None
+
+        with self._lock:
+            self._plans[sql] = plan
+        return plan
+
+    def record(self, function, sql, milliseconds, rows, plan=None):
+        """
+        Record one finished statement, logging it if it was slow.
+
+        Args:
+        function (str): The calling function, "module.qualname".
+        sql (str): The normalized statement.
+        milliseconds (float): Wall time.
+        rows (int): Rows returned (for writes, rows changed).
+        plan (list): Query plan lines, if explained.
+        """
+
+        key = (function, sql)
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = {
+                    "times": collections.deque(maxlen=self.maxSamples),
+                    "rows": 0,
+                    "count": 0,
+                }
+            entry["times"].append(milliseconds)
+            entry["rows"] += rows
+            entry["count"] += 1
+
+        if self.slowMs is not None and milliseconds >= self.slowMs:
+            slowLog.warning(
+                "%.1f ms, %d rows, %s: %s%s",
+                milliseconds,
+                rows,
+                function,
+                sql,
+                "".join("\n    " + line for line in plan or []),
+            )
+
+    def summary(self) -> dict:
+        """
+        Per-function timing percentiles, with a breakdown by statement.
+
+        Returns:
+        dict: Function name to {"count", "rows", "totalMs", "p50Ms",
+              "p90Ms", "p99Ms", "maxMs", "statements": [...]}, where each
+              statement entry has the same fields plus "sql" and, if
+              explained, "plan". Statements are listed slowest in total first.
+        """
+
+        with self._lock:
+            entries = [
+                (function, sql, sorted(entry["times"]), entry["rows"], entry["count"])
+                for (function, sql), entry in self._stats.items()
+            ]
+            plans = dict(self._plans)
+
+        def rounded(value):
+            return None if value is None else round(value, 3)
+
+        def timings(times, rows, count):
+            return {
+                "count": count,
+                "rows": rows,
+                "totalMs": round(sum(times), 3),
+                "p50Ms": rounded(percentile(times, 0.50)),
+                "p90Ms": rounded(percentile(times, 0.90)),
+                "p99Ms": rounded(percentile(times, 0.99)),
+                "maxMs": rounded(times[-1] if times else None),
+            }
+
+        byFunction = collections.defaultdict(list)
+        for function, sql, times, rows, count in entries:
+            byFunction[function].append((sql, times, rows, count))
+
+        result = {}
+        for function, statements in sorted(byFunction.items()):
+            allTimes = sorted(time for _, times, _, _ in statements for time in times)
+            summary = timings(
+                allTimes,
+                sum(rows for _, _, rows, _ in statements),
+                sum(count for _, _, _, count in statements),
+            )
+            summary["statements"] = []
+            for sql, times, rows, count in sorted(statements, key=lambda item: -sum(item[1])):
+                statement = dict(timings(times, rows, count), sql=sql)
+                if plans.get(sql) is not None:
+                    statement["plan"] = plans[sql]
+                summary["statements"].append(statement)
+            result[function] = summary
+
+        return result
+
+    def exportJson(self, path):
+        """
+        Write summary() to a JSON file.
+
+        Args:
+        path (str): The file to write.
+        """
+
+        with open(path, "w") as jsonFile:
+            json.dump(self.summary(), jsonFile, indent=2)
+
+
+tracer = QueryTracer(
+    _parseBool(os.environ.get("CTA_TRACE", "no")),
+    float(os.environ.get("CTA_SLOW_QUERY_MS", 100)),
+    _parseBool(os.environ.get("CTA_TRACE_EXPLAIN", "no")),
+)
+
+
+def configure(enabled=None, slowMs=None, explain=None):
+    """
+    Change the tracer's settings. Tracing applies to cursors created after
+    it is switched on.
+
+    Args:
+    enabled (bool): Trace new cursors.
+    slowMs (float): Slow-query threshold in milliseconds.
+    explain (bool): Attach query plans.
+    """
+
+    if enabled is not None:
+        tracer.enabled = enabled
+    if slowMs is not None:
+        tracer.slowMs = slowMs
+    if explain is not None:
+        tracer.explain = explain
+
+
+def skipFramesOf(path):
+    """
+    Treat a module's frames like this one's when looking for the calling
+    function, for modules that wrap the traced cursor calls.
+
+    Args:
+    path (str): The module's __file__.
+    """
+
+    _ownFiles.add(os.path.abspath(path))
+
+
+def callingFunction() -> str:
+    """
+    Name of the innermost function outside this module and sqlite3 that is
+    on the stack, as "module.qualname".
+    """
+
+    frame = sys._getframe(1)
+    while frame is not None and os.path.abspath(frame.f_code.co_filename) in _ownFiles:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class TracingCursor(sqlite3.Cursor):
+    """
+    sqlite3.Cursor that reports each statement to the tracer. A statement
+    is timed from execute() until its last row is fetched, the cursor runs
+    another statement, or the cursor is closed.
+    """
+
+    _pending = None
+
+    def _finish(self):
+        pending = self._pending
+        if pending is None:
+            return
+        self._pending = None
+
+        function, sql, elapsed, rows, plan = pending
+        if rows == 0 and self.rowcount > 0:
+            # Writes return no rows; count the rows they changed instead
+            rows = self.rowcount
+        tracer.record(function, sql, elapsed * 1000, rows, plan)
+
+    def _start(self, sql, parameters, run):
+        self._finish()
+        statement = normalizeSql(sql)
+        plan = tracer.plan(self.connection, statement, parameters) if tracer.explain else None
+        started = time.perf_counter()
+        try:
+            run()
+        finally:
+            self._pending = [
+                callingFunction(),
+                statement,
+                time.perf_counter() - started,
+                0,
+                plan,
+            ]
+        if self.description is None:
+            # Nothing to fetch
+            self._finish()
+        return self
+
+    def _fetched(self, started, rows, done):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            self._pending[3] += rows
+            if done:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        return self._start(sql, parameters, lambda: super(TracingCursor, self).execute(sql, parameters))
+
+    def executemany(self, sql, seqOfParameters):
+        return self._start(sql, (), lambda: super(TracingCursor, self).executemany(sql, seqOfParameters))
+
+    def executescript(self, sqlScript):
+        return self._start(sqlScript, (), lambda: super(TracingCursor, self).executescript(sqlScript))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(started, 0, True)
+            raise
+        self._fetched(started, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
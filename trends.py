@@ -0,0 +1,268 @@
+"""
+Date-range ridership trends for the CTA L analysis app.
+
+Totals the ridership of a station, a set of stations (a line) or the
+whole system over any half-open [start, end) window, by day, week, month
+or year, with year-over-year changes. Each trend is answered in one
+grouped pass: the window is widened back by a year so the same query
+returns the comparison data, then the days are bucketed into periods and
+compared with NumPy.
+
+Year over year compares each period with the same span a year earlier:
+the same month or year for monthly and yearly trends, and the day or
+week 52 weeks (364 days) earlier for daily and weekly ones, so weekdays
+line up. A partial first or last period is compared with the same
+partial span. Periods with no ridership rows have None as their total.
+
+Monthly and yearly trends over whole months are summed from the
+RidershipRollup table; everything else groups Ridership by day.
+"""
+
+import datetime
+
+import numpy as np
+
+import results
+
+granularities = ("daily", "weekly", "monthly", "yearly")
+
+# Days back to the comparison period of a daily or weekly trend
+weeksBackDays = 364
+
+# Riders per day for _dailyRows(), as days since the first parameter.
+# {dateColumn} is Ride_Date, or +Ride_Date to keep the index out, and
+# {stationFilter} an optional Station_ID IN (...) clause.
+dailyRows_SQL = """
+                SELECT CAST(round(julianday(Ride_Date) - julianday(?)) AS INTEGER) AS Day,
+                       SUM(Num_Riders)
+                FROM Ridership
+                WHERE {dateColumn} >= ? AND {dateColumn} < ?
+                {stationFilter}
+                GROUP BY Day
+                """
+
+
+def parseRange(start, end) -> tuple:
+    """
+    Check a half-open date range.
+
+    Args:
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
+
+    Returns:
+    tuple: (start, end) as datetime.date.
+
+    Raises:
+    ValueError: If a date is not 'YYYY-MM-DD' or the range is empty.
+    """
+
+    startDate = datetime.date.fromisoformat(str(start))
+    endDate = datetime.date.fromisoformat(str(end))
+    if startDate >= endDate:
+        raise ValueError(f"start ({start}) must be before end ({end})")
+    return startDate, endDate
+
+
+def yearEarlier(date) -> datetime.date:
+    """
+    The same calendar date a year earlier; Feb 29 becomes Feb 28.
+    """
+
+    if date.month == 2 and date.day == 29:
+        return date.replace(year=date.year - 1, day=28)
+    return date.replace(year=date.year - 1)
+
+
+def periodKeys(days, granularity):
+    """
+    Integer key of the period each day falls in.
+
+    Args:
+    days (np.ndarray): datetime64[D] days.
+    granularity (str): One of granularities.
+
+    Returns:
+    np.ndarray: Days since 1970-01-01 for daily, of the Monday starting the
+    week for weekly; months since 1970-01 for monthly; years since 1970
+    for yearly.
+    """
+
+    if granularity == "monthly":
+        return days.astype("datetime64[M]").astype(np.int64)
+    if granularity == "yearly":
+        return days.astype("datetime64[Y]").astype(np.int64)
+
+    numbers = days.astype(np.int64)
+    if granularity == "weekly":
+        # 1970-01-01 was a Thursday, so Mondays are where (n + 3) % 7 == 0
+        return numbers - (numbers + 3) % 7
+    return numbers
+
+
+def periodLabels(keys, granularity) -> list:
+    """
+    Labels of period keys: 'YYYY-MM-DD' for days and weeks (the Monday),
+    'YYYY-MM' for months, 'YYYY' for years.
+    """
+
+    unit = {"monthly": "M", "yearly": "Y"}.get(granularity, "D")
+    return np.datetime_as_string(keys.astype(f"datetime64[{unit}]")).tolist()
+
+
+def _dailyRows(dbConn, stationIds, start, end, store):
+    """
+    Riders per day over [start, end), in one grouped query.
+
+    Returns:
+    tuple: (datetime64[D] days, riders) arrays of the days with rows.
+    """
+
+    if store is not None:
+        ids = list(store.ranges) if stationIds is None else stationIds
+        numbers, riders = [], []
+        for stationId in ids:
+            dayNumbers, counts = store.dailyTotals(stationId, start, end)
+            numbers.append(dayNumbers.astype(np.int64))
+            riders.append(counts.astype(np.int64))
+        if not numbers:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=np.int64)
+        numbers, riders = np.concatenate(numbers), np.concatenate(riders)
+        unique, inverse = np.unique(numbers, return_inverse=True)
+        return unique.astype("datetime64[D]"), np.bincount(inverse, weights=riders).astype(np.int64)
+
+    # Across all stations a plain table scan beats skip-scanning the
+    # (Station_ID, Ride_Date) index, so the unary + keeps the index out
+    dateColumn = "+Ride_Date"
+    stationFilter = ""
+    parameters = [start, start, end]
+    if stationIds is not None:
+        dateColumn = "Ride_Date"
+        stationFilter = f"AND Station_ID IN ({', '.join('?' * len(stationIds))})"
+        parameters += list(stationIds)
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        dailyRows_SQL.format(dateColumn=dateColumn, stationFilter=stationFilter),
+        parameters,
+    )
+    data = np.array(dbCursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return np.datetime64(start, "D") + data[:, 0], data[:, 1]
+
+
+def _monthlyRows(dbConn, stationIds, start, end):
+    """
+    Riders per month over [start, end), both first days of a month, in
+    one grouped query over the rollup.
+
+    Returns:
+    tuple: (datetime64[D] first day of each month with rows, riders) arrays.
+    """
+
+    firstMonth = (start.year - 1970) * 12 + start.month - 1
+    lastMonth = (end.year - 1970) * 12 + end.month - 1
+
+    stationFilter = ""
+    parameters = [firstMonth, lastMonth]
+    if stationIds is not None:
+        stationFilter = f"AND Station_ID IN ({', '.join('?' * len(stationIds))})"
+        parameters += list(stationIds)
+
+    dbCursor = dbConn.cursor()
+    dbCursor.execute(
+        f"""
+        SELECT (Year - 1970) * 12 + Month - 1 AS MonthNumber, SUM(Num_Riders)
+        FROM RidershipRollup
+        WHERE (Year - 1970) * 12 + Month - 1 >= ?
+        AND (Year - 1970) * 12 + Month - 1 < ?
+        {stationFilter}
+        GROUP BY MonthNumber
+        """,
+        parameters,
+    )
+    data = np.array(dbCursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    return data[:, 0].astype("datetime64[M]").astype("datetime64[D]"), data[:, 1]
+
+
+def _periodSums(periods, keys, riders) -> tuple:
+    """
+    Sum riders into the given sorted periods, ignoring keys outside them.
+
+    Returns:
+    tuple: (int64 totals, bool mask of periods with any rows).
+    """
+
+    index = np.searchsorted(periods, keys)
+    inside = index < len(periods)
+    inside[inside] = periods[index[inside]] == keys[inside]
+    totals = np.bincount(index[inside], weights=riders[inside], minlength=len(periods))
+    counts = np.bincount(index[inside], minlength=len(periods))
+    return totals.astype(np.int64), counts > 0
+
+
+def loadTrend(dbConn, scope, stationIds, start, end, granularity="monthly", store=None):
+    """
+    Total ridership per period over a date range, with year-over-year changes.
+
+    Args:
+    dbConn (sqlite3.Connection): Connection to the ridership database; the
+                                 rollup must be up to date.
+    scope (str): What the trend covers, e.g. a station name, "Red Line" or
+                 "System"; copied into the result.
+    stationIds (tuple): Station_IDs to total, or None for every station.
+    start (str): First day, 'YYYY-MM-DD'.
+    end (str): Day after the last day, 'YYYY-MM-DD'.
+    granularity (str): One of granularities.
+    store (columnar.ColumnStore): Read daily rows from this store instead
+                                  of querying Ridership.
+
+    Returns:
+    results.RidershipTrend: One entry per period in the range.
+
+    Raises:
+    ValueError: If the granularity is unknown, or the range invalid.
+    """
+
+    if granularity not in granularities:
+        raise ValueError(f"granularity must be one of {granularities}, not {granularity!r}")
+    startDate, endDate = parseRange(start, end)
+
+    if granularity in ("daily", "weekly"):
+        priorStart = startDate - datetime.timedelta(days=weeksBackDays)
+        priorEnd = endDate - datetime.timedelta(days=weeksBackDays)
+    else:
+        priorStart, priorEnd = yearEarlier(startDate), yearEarlier(endDate)
+
+    # One pass over the range widened back to the comparison year
+    wholeMonths = startDate.day == 1 and endDate.day == 1
+    if granularity in ("monthly", "yearly") and wholeMonths and store is None:
+        days, riders = _monthlyRows(dbConn, stationIds, priorStart, endDate)
+    else:
+        days, riders = _dailyRows(dbConn, stationIds, priorStart.isoformat(), endDate.isoformat(), store)
+
+    # Every period of the range, whether or not it has rows
+    periods = np.unique(periodKeys(np.arange(np.datetime64(startDate), np.datetime64(endDate)), granularity))
+
+    current = days >= np.datetime64(startDate)
+    totals, found = _periodSums(periods, periodKeys(days[current], granularity), riders[current])
+
+    # The comparison rows, moved onto the period a year later
+    prior = days < np.datetime64(priorEnd)
+    if granularity in ("daily", "weekly"):
+        priorKeys = periodKeys(days[prior] + weeksBackDays, granularity)
+    else:
+        priorKeys = periodKeys(days[prior], granularity) + (12 if granularity == "monthly" else 1)
+    priorTotals, priorFound = _periodSums(periods, priorKeys, riders[prior])
+
+    compared = found & priorFound & (priorTotals > 0)
+    change = totals - priorTotals
+    percent = np.divide(change * 100.0, priorTotals, out=np.zeros(len(periods)), where=compared)
+
+    return results.RidershipTrend(
+        scope,
+        granularity,
+        periodLabels(periods, granularity),
+        [int(total) if has else None for total, has in zip(totals.tolist(), found.tolist())],
+        [int(delta) if has else None for delta, has in zip(change.tolist(), compared.tolist())],
+        [round(value, 2) if has else None for value, has in zip(percent.tolist(), compared.tolist())],
+    )